@@ -0,0 +1,77 @@
+"""
+Measures how long importing the document_processing modules takes in a fresh interpreter, and which heavy
+dependencies each import loads.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --modules document_processing.factory --repeat 10 --output imports.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+DEFAULT_MODULES = [
+    "document_processing.factory",
+    "document_processing.chunking",
+    "document_processing.process_folder",
+    "document_processing.pdfs",
+    "document_processing.word_docs",
+]
+HEAVY_DEPENDENCIES = ["llama_index.core", "pymupdf", "pymupdf4llm", "docx", "langdetect", "numpy"]
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+@dataclass
+class ImportTime:
+    module: str
+    # median and fastest time of the imports, each in a new interpreter
+    seconds: float
+    best_seconds: float
+    loaded: List[str] = field(default_factory=list)
+
+
+def measure_import(module: str, repeat: int = 5) -> ImportTime:
+    timings = []
+    loaded: List[str] = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", MEASURE.format(module=module, heavy=HEAVY_DEPENDENCIES)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        loaded = result["loaded"]
+    return ImportTime(module, statistics.median(timings), min(timings), loaded)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = [measure_import(module, args.repeat) for module in args.modules]
+    for result in results:
+        print(f"{result.module:<40} {result.seconds * 1000:8.1f} ms  loads: {', '.join(result.loaded) or '-'}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([asdict(result) for result in results], f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
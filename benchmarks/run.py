@@ -0,0 +1,287 @@
+"""
+Benchmarks the extraction and chunking hot paths on synthetic documents and compares them against a stored baseline.
+
+    python -m benchmarks.run --pages 200 --output results.json
+    python -m benchmarks.run --pages 200 --baseline results.json --fail-on-regression
+
+Everything runs offline: documents are generated from a fixed seed, the semantic chunker uses `HashingEmbedding` and
+tokens are counted with an encoding built from the synthetic vocabulary. Pass a real `--chat-model` to count tokens
+with its tiktoken encoding instead, which is downloaded on first use.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from llama_index.core.schema import TextNode
+
+from benchmarks.synthetic import SyntheticConfig, local_encoding, write_docx, write_pdf
+from document_processing.chunk_store import ChunkStore
+from document_processing.chunking import (
+    ChunkMeta,
+    Chunks,
+    FunctionChunker,
+    SemanticChunker,
+)
+from document_processing.embeddings import TokenCounter
+from document_processing.language import LanguageDetector
+from document_processing.local_embeddings import HashingEmbedding
+from document_processing.pdfs import MIN_PAGES_FOR_PARALLEL, PdfProcessor
+from document_processing.word_docs import WordDocXFileProcessor
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+# counts tokens with the encoding of the synthetic vocabulary, which needs no download
+LOCAL_MODEL = "synthetic"
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    # median and fastest wall time of the timed runs
+    seconds: float
+    best_seconds: float
+    runs: int
+    # e.g. {"pages_per_second": ...}, computed from the median time
+    throughput: Dict[str, float] = field(default_factory=dict)
+    # peak Python memory allocated during one extra run, measured with tracemalloc
+    peak_memory_bytes: int = 0
+
+
+def split_sentences(text: str) -> List[TextNode]:
+    return [TextNode(text=sentence) for sentence in SENTENCE_END.split(text) if sentence]
+
+
+def measure(name: str, run: Callable[[Any], Any], setup: Callable[[], Any] = lambda: None, repeat: int = 5, **units: int) -> BenchmarkResult:
+    """
+    Times `run(setup())` `repeat` times, with a fresh setup every time which is not timed, then runs it once more
+    under tracemalloc for the peak memory. `units` are the amounts processed per run, e.g. `pages=200`.
+    """
+    timings = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - start)
+    state = setup()
+    tracemalloc.start()
+    try:
+        run(state)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    seconds = statistics.median(timings)
+    throughput = {f"{unit}_per_second": amount / seconds for unit, amount in units.items()} if seconds else {}
+    return BenchmarkResult(name, seconds, min(timings), repeat, throughput, peak_memory)
+
+
+def token_counter(chat_model: str) -> TokenCounter:
+    return TokenCounter(chat_model, encoding=local_encoding() if chat_model == LOCAL_MODEL else None)
+
+
+def run_benchmarks(
+    config: SyntheticConfig, directory: str, repeat: int, chat_model: str, stages: Optional[List[str]] = None
+) -> List[BenchmarkResult]:
+    pdf_path = os.path.join(directory, "synthetic.pdf")
+    docx_path = os.path.join(directory, "synthetic.docx")
+    write_pdf(pdf_path, config)
+    write_docx(docx_path, config)
+
+    def function_chunker(**kwargs) -> FunctionChunker:
+        # new token counter and language detector every run, so their caches do not carry over between runs
+        return FunctionChunker(
+            50, 400, split_sentences, token_counter=token_counter(chat_model), language_detector=LanguageDetector(), chat_model=chat_model, **kwargs
+        )
+
+    pdf = PdfProcessor(pdf_path, function_chunker())
+    word = WordDocXFileProcessor(docx_path, function_chunker())
+    text = pdf.extract_text()
+    nodes = function_chunker().chunk(text, 0)
+    n_pages, n_chars, n_chunks = config.pages, len(text), len(nodes)
+    # the pieces the chunks are combined from, so combining can be timed on its own: packing keeps chunks below the
+    # maximum and so makes more of them, which makes every later stage, e.g. language detection, take longer
+    pieces = [piece.text for piece in function_chunker().ensure_chunks_small_enough(split_sentences(text))]
+
+    def combine(**kwargs) -> Callable[[], Any]:
+        # the merge loop changes the nodes it is given, so every run gets new ones
+        return lambda: (function_chunker(**kwargs), [TextNode(text=piece) for piece in pieces])
+
+    # the chunks of the document, numbered in reverse so ordering them has work to do, and `--pages` sizes them
+    n_stored = n_chunks
+    stored = Chunks(
+        chunks=[node.text for node in nodes],
+        metas=[ChunkMeta(chunk_number=n_stored - i, length=len(node.text), lang="en") for i, node in enumerate(nodes)],
+    )
+    store = ChunkStore.from_chunks(os.path.join(directory, "chunk_store"), stored)
+
+    benchmarks: Dict[str, Callable[[], BenchmarkResult]] = {
+        "pdf_extract_text": lambda: measure("pdf_extract_text", lambda _: pdf.extract_text(), repeat=repeat, pages=n_pages, chars=n_chars),
+        "pdf_extract_text_parallel": lambda: measure(
+            "pdf_extract_text_parallel", lambda _: pdf.extract_text(parallel=True), repeat=repeat, pages=n_pages, chars=n_chars
+        ),
+        "docx_extract_text": lambda: measure("docx_extract_text", lambda _: word.extract_text(), repeat=repeat, pages=n_pages),
+        "docx_extract_text_python_docx": lambda: measure(
+            "docx_extract_text_python_docx", lambda _: word.extract_text_python_docx(), repeat=repeat, pages=n_pages
+        ),
+        "function_chunk": lambda: measure(
+            "function_chunk", lambda chunker: chunker.chunk(text, 10), function_chunker, repeat=repeat, chars=n_chars, chunks=n_chunks
+        ),
+        "function_chunk_spans": lambda: measure(
+            "function_chunk_spans",
+            lambda chunker: chunker.chunk(text, 10),
+            lambda: function_chunker(use_spans=True),
+            repeat=repeat,
+            chars=n_chars,
+            chunks=n_chunks,
+        ),
+        "function_chunk_packing": lambda: measure(
+            "function_chunk_packing",
+            lambda chunker: chunker.chunk(text, 10),
+            lambda: function_chunker(packing="greedy"),
+            repeat=repeat,
+            chars=n_chars,
+            chunks=n_chunks,
+        ),
+        "function_chunk_packing_optimal": lambda: measure(
+            "function_chunk_packing_optimal",
+            lambda chunker: chunker.chunk(text, 10),
+            lambda: function_chunker(packing="optimal"),
+            repeat=repeat,
+            chars=n_chars,
+            chunks=n_chunks,
+        ),
+        "combine_merge": lambda: measure(
+            "combine_merge", lambda state: state[0]._combine_chunks(state[1]), combine(), repeat=repeat, pieces=len(pieces)
+        ),
+        "combine_packing": lambda: measure(
+            "combine_packing", lambda state: state[0]._combine_chunks(state[1]), combine(packing="greedy"), repeat=repeat, pieces=len(pieces)
+        ),
+        "combine_packing_optimal": lambda: measure(
+            "combine_packing_optimal",
+            lambda state: state[0]._combine_chunks(state[1]),
+            combine(packing="optimal"),
+            repeat=repeat,
+            pieces=len(pieces),
+        ),
+        "add_context_words": lambda: measure(
+            "add_context_words", lambda chunker: chunker.add_context(nodes, 10), function_chunker, repeat=repeat, chunks=n_chunks
+        ),
+        "add_context_tokens": lambda: measure(
+            "add_context_tokens",
+            lambda chunker: chunker.add_context(nodes, 10),
+            lambda: function_chunker(overlap_mode="tokens"),
+            repeat=repeat,
+            chunks=n_chunks,
+        ),
+        # the order alone, then the texts in that order, which the store decodes from its blob
+        "chunks_order": lambda: measure("chunks_order", lambda _: stored.order(), repeat=repeat, chunks=n_stored),
+        "chunk_store_order": lambda: measure("chunk_store_order", lambda _: store.order(), repeat=repeat, chunks=n_stored),
+        "chunks_ordered_texts": lambda: measure("chunks_ordered_texts", lambda _: stored.order_chunks(), repeat=repeat, chunks=n_stored),
+        "chunk_store_ordered_texts": lambda: measure("chunk_store_ordered_texts", lambda _: store.ordered_texts(), repeat=repeat, chunks=n_stored),
+        "chunk_store_open": lambda: measure("chunk_store_open", lambda _: ChunkStore(store.directory).close(), repeat=repeat, chunks=n_stored),
+        "semantic_chunk": lambda: measure(
+            "semantic_chunk",
+            lambda chunker: chunker.chunk(text, 10),
+            lambda: SemanticChunker(HashingEmbedding(embed_dim=256), token_counter=token_counter(chat_model)),
+            repeat=repeat,
+            chars=n_chars,
+        ),
+    }
+    unknown = set(stages or []) - set(benchmarks)
+    if unknown:
+        raise ValueError(f"unknown stages {sorted(unknown)}, choose from {list(benchmarks)}")
+    if n_pages < MIN_PAGES_FOR_PARALLEL or (os.cpu_count() or 1) < 2:
+        # the extraction would fall back to the serial path and measure the same thing as pdf_extract_text
+        del benchmarks["pdf_extract_text_parallel"]
+        if not stages or "pdf_extract_text_parallel" in stages:
+            print(
+                f"Skipping pdf_extract_text_parallel: it needs at least {MIN_PAGES_FOR_PARALLEL} pages and 2 CPUs, "
+                f"got {n_pages} pages and {os.cpu_count()} CPUs",
+                file=sys.stderr,
+            )
+    try:
+        return [benchmark() for name, benchmark in benchmarks.items() if not stages or name in stages]
+    finally:
+        store.close()
+
+
+def compare(results: List[BenchmarkResult], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describes every benchmark which got slower or used more memory than the baseline by more than `tolerance`."""
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        if result.name not in baseline_results:
+            continue
+        previous = baseline_results[result.name]
+        for metric, current_value in (("seconds", result.seconds), ("peak_memory_bytes", result.peak_memory_bytes)):
+            previous_value = previous[metric]
+            if previous_value and current_value > previous_value * (1 + tolerance):
+                regressions.append(
+                    f"{result.name}: {metric} went from {previous_value:.4g} to {current_value:.4g} ({current_value / previous_value:.2f}x)"
+                )
+    return regressions
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    defaults = SyntheticConfig()
+    parser.add_argument("--pages", type=int, default=defaults.pages)
+    parser.add_argument("--paragraphs-per-page", type=int, default=defaults.paragraphs_per_page)
+    parser.add_argument("--words-per-paragraph", type=int, default=defaults.words_per_paragraph)
+    parser.add_argument("--tables", type=int, default=defaults.tables)
+    parser.add_argument("--table-rows", type=int, default=defaults.table_rows)
+    parser.add_argument("--table-columns", type=int, default=defaults.table_columns)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--chat-model", default=LOCAL_MODEL, help=f"model whose tokens are counted, '{LOCAL_MODEL}' needs no download")
+    parser.add_argument("--stages", nargs="*", help="only run these stages")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slow down against the baseline, 0.2 is 20%%")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    config = SyntheticConfig(
+        args.pages, args.paragraphs_per_page, args.words_per_paragraph, args.tables, args.table_rows, args.table_columns, args.seed
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        results = run_benchmarks(config, directory, args.repeat, args.chat_model, args.stages)
+
+    for result in results:
+        throughput = ", ".join(f"{value:,.0f} {unit}" for unit, value in result.throughput.items())
+        print(f"{result.name:<32} {result.seconds * 1000:10.1f} ms  {result.peak_memory_bytes / 1024**2:8.1f} MiB  {throughput}")
+
+    report = {"environment": environment(), "config": asdict(config), "results": [asdict(result) for result in results]}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
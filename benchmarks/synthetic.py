@@ -0,0 +1,131 @@
+"""
+Generates PDF and Word documents of a configurable size with deterministic text, and a tiktoken encoding for their
+vocabulary, so benchmarks need no real files and no downloads.
+"""
+
+import random
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List
+
+import docx  # type: ignore
+import pymupdf  # type: ignore
+import tiktoken
+
+VOCABULARY = (
+    "the of and to in is that for it with as was on be by this are from at or an which have not has but were their "
+    "document section results analysis method study patient trial data model report table value process system review "
+    "approval quality clinical safety dose response sample measure effect group control period protocol figure summary "
+    "assessment criteria population endpoint baseline treatment outcome evaluation procedure manufacturing specification"
+).split()
+
+
+@dataclass
+class SyntheticConfig:
+    # enough pages for the parallel PDF extraction to run, see MIN_PAGES_FOR_PARALLEL
+    pages: int = 100
+    paragraphs_per_page: int = 6
+    words_per_paragraph: int = 60
+    # one table after every `pages // tables` pages, in the lower half of the page in PDFs
+    tables: int = 10
+    table_rows: int = 8
+    table_columns: int = 4
+    seed: int = 0
+
+
+def make_paragraphs(config: SyntheticConfig) -> List[List[str]]:
+    """The paragraphs of every page, made of sentences of random words from a fixed vocabulary."""
+    rng = random.Random(config.seed)
+    pages = []
+    for _ in range(config.pages):
+        paragraphs = []
+        for _ in range(config.paragraphs_per_page):
+            words: List[str] = []
+            while len(words) < config.words_per_paragraph:
+                sentence = rng.choices(VOCABULARY, k=rng.randint(6, 18))
+                sentence[0] = sentence[0].capitalize()
+                sentence[-1] += "."
+                words.extend(sentence)
+            paragraphs.append(" ".join(words[: config.words_per_paragraph]))
+        pages.append(paragraphs)
+    return pages
+
+
+def write_pdf(path: str, config: SyntheticConfig):
+    rng = random.Random(config.seed)
+    doc = pymupdf.open()
+    n_tables = 0
+    for page_number, paragraphs in enumerate(make_paragraphs(config)):
+        page = doc.new_page()
+        text_area = page.rect + (50, 50, -50, -50)
+        if _has_table(page_number, n_tables, config):
+            table_area = pymupdf.Rect(text_area.x0, text_area.y0 + text_area.height / 2, text_area.x1, text_area.y1)
+            text_area.y1 = table_area.y0 - 10
+            _draw_table(page, table_area, rng, config)
+            n_tables += 1
+        # text which does not fit on the page is left out, so keep pages to a few hundred words
+        page.insert_textbox(text_area, "\n\n".join(paragraphs), fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def write_docx(path: str, config: SyntheticConfig):
+    rng = random.Random(config.seed)
+    document = docx.Document()
+    n_tables = 0
+    for page_number, paragraphs in enumerate(make_paragraphs(config)):
+        document.add_heading(f"Section {page_number + 1}", level=1)
+        for paragraph in paragraphs:
+            document.add_paragraph(paragraph)
+        if _has_table(page_number, n_tables, config):
+            _add_table(document, rng, config)
+            n_tables += 1
+        document.add_page_break()
+    document.save(path)
+
+
+def _add_table(document, rng: random.Random, config: SyntheticConfig):
+    table = document.add_table(rows=config.table_rows, cols=config.table_columns)
+    for row in table.rows:
+        for cell in row.cells:
+            cell.text = " ".join(rng.choices(VOCABULARY, k=rng.randint(1, 6)))
+    if config.table_rows > 2 and config.table_columns > 1:
+        # merged cells take a slower path through the extraction
+        table.cell(1, 0).merge(table.cell(1, 1))
+        table.cell(1, config.table_columns - 1).merge(table.cell(2, config.table_columns - 1))
+
+
+def _has_table(page_number: int, n_tables: int, config: SyntheticConfig) -> bool:
+    if not config.tables or n_tables >= config.tables:
+        return False
+    return (page_number + 1) % max(config.pages // config.tables, 1) == 0
+
+
+def _draw_table(page, area, rng: random.Random, config: SyntheticConfig):
+    """Draws a grid with a few words in every cell, which pymupdf's table detection finds from the ruling lines."""
+    width, height = area.width / config.table_columns, min(area.height / config.table_rows, 20)
+    for row in range(config.table_rows):
+        for column in range(config.table_columns):
+            cell = pymupdf.Rect(area.x0 + column * width, area.y0 + row * height, area.x0 + (column + 1) * width, area.y0 + (row + 1) * height)
+            page.draw_rect(cell, color=(0, 0, 0), width=0.5)
+            page.insert_textbox(cell + (2, 2, -2, -2), " ".join(rng.choices(VOCABULARY, k=rng.randint(1, 3))), fontsize=6)
+
+
+@lru_cache(maxsize=None)
+def local_encoding() -> tiktoken.Encoding:
+    """
+    A tiktoken encoding which needs no download. Text is split into pieces like the GPT-4 encodings do, and every word of
+    the vocabulary, with and without a leading space or capital, is a single token built up one byte at a time.
+    """
+    ranks: Dict[bytes, int] = {bytes([i]): i for i in range(256)}
+    for word in VOCABULARY:
+        for form in (word, f" {word}", word.capitalize(), f" {word.capitalize()}"):
+            encoded = form.encode()
+            for end in range(2, len(encoded) + 1):
+                ranks.setdefault(encoded[:end], len(ranks))
+    return tiktoken.Encoding(
+        "synthetic",
+        pat_str=r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]++[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+""",
+        mergeable_ranks=ranks,
+        special_tokens={},
+    )
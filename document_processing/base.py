@@ -1,10 +1,55 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import types
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from document_processing.cache import DiskCache, hash_content, hash_text, make_key
+from document_processing.embeddings import TokenCounter
+from document_processing.instrumentation import NULL_OBSERVER, Observer, timed
+from document_processing.nodes import text_node
+from document_processing.sources import DocumentSource, as_buffer, is_path
+from document_processing.spans import (
+    OVERLAP_MODES,
+    ChunkSpans,
+    TokenOffsets,
+    words_end,
+    words_start,
+)
+
+if TYPE_CHECKING:
+    from llama_index.core.schema import TextNode
+
+# how much text `chunk_stream` collects before chunking it
+DEFAULT_STREAM_WINDOW_CHARS = 20_000
 
-from llama_index.core.schema import TextNode
+# a finished chunk of a stream: its offsets in the document and its text
+_StreamChunk = Tuple[int, int, str]
 
 
 class BaseChunker(ABC):
+    # with "tokens" the overlap added from neighbouring chunks is `num_words_overlap` tokens counted with `token_counter`
+    overlap_mode: str = "words"
+    token_counter: Optional[TokenCounter] = None
+    # receives the timing spans and counters of the chunker's stages
+    observer: Observer = NULL_OBSERVER
+    # names the settings `cache_config` cannot identify, e.g. a lambda as splitting function, so chunks can still be cached
+    cache_identity: Optional[str] = None
+    # attributes which do not change the chunks, left out of `cache_config`
+    cache_ignore: Tuple[str, ...] = ("observer", "max_concurrency", "regex_cache")
+
     @abstractmethod
     def chunk(self, text, num_words_overlap: int) -> List[TextNode]:
         pass
@@ -13,8 +58,106 @@ class BaseChunker(ABC):
     def achunk(self, text: str, num_words_overlap: int):
         pass
 
+    async def achunk_many(self, texts: List[str], num_words_overlap: int, max_concurrency: int = 4) -> List[List[TextNode]]:
+        """Chunks several documents concurrently on the running event loop, at most `max_concurrency` at a time."""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def achunk(text: str) -> List[TextNode]:
+            async with semaphore:
+                return await self.achunk(text, num_words_overlap)
+
+        return await asyncio.gather(*[achunk(text) for text in texts])
+
+    def chunk_spans(self, text: str) -> ChunkSpans:
+        """Chunks text into spans of the text, without overlap. Needed by `chunk_stream`."""
+        raise NotImplementedError(f"{type(self).__name__} does not chunk text into spans")
+
+    def chunk_stream(
+        self,
+        segments: Iterable[str],
+        num_words_overlap: int,
+        window_chars: int = DEFAULT_STREAM_WINDOW_CHARS,
+        lookahead_chunks: int = 2,
+    ) -> Iterator[TextNode]:
+        """
+        Chunks a document given as consecutive segments, e.g. the pages of a processor's `iter_units`, yielding each
+        chunk as soon as it is finished. Segments are collected until there are `window_chars` characters, which are
+        chunked with `chunk_spans`. The last `lookahead_chunks` chunks of the window might still change with the text
+        which follows, so their text is chunked again with the next window and the others are finished. A finished
+        chunk is yielded, with the overlap of its neighbours and its offsets in the document, once the chunk after it
+        is finished too. Only the current window and a couple of chunks are held in memory. A window which finishes no
+        chunk is not chunked again until its text has doubled, so a document without breaks is chunked in linear time.
+
+        The chunks are the same as those of `chunk` when a chunk only depends on the text up to the chunks after it,
+        as with the greedy packing of a `FunctionChunker` (`packing="greedy"`). Merging short chunks, the default, and
+        optimal packing depend on the whole document, e.g. merging runs again over all chunks as long as any of them
+        is short, so their streamed chunks are only close to those of `chunk`: every chunk but the last is still long
+        enough, but the boundaries can differ.
+        """
+        buffer = ""
+        # how long the buffer has to be before it is chunked
+        chunk_at = window_chars
+        # offset of the buffer in the document
+        buffer_start = 0
+        # the last yielded chunk, for the overlap of the next one, and the finished chunks not yielded yet
+        previous: Optional[_StreamChunk] = None
+        finished: List[_StreamChunk] = []
+        n_yielded = 0
+        for segment in segments:
+            buffer += segment
+            if len(buffer) < chunk_at:
+                continue
+            spans = self.chunk_spans(buffer)
+            n_finished = len(spans) - lookahead_chunks
+            if n_finished <= 0:
+                # the window holds too few chunks to finish any, so it grows until its text has doubled
+                chunk_at = 2 * len(buffer)
+                continue
+            chunk_at = window_chars
+            finished.extend((buffer_start + start, buffer_start + end, buffer[start:end]) for start, end in list(spans)[:n_finished])
+            cut = spans.starts[n_finished]
+            buffer, buffer_start = buffer[cut:], buffer_start + cut
+            if len(finished) < 2:
+                continue
+            nodes = self._stream_nodes(previous, finished[:-1], finished[-1], num_words_overlap)
+            previous, finished = finished[-2], finished[-1:]
+            yield from self._finish_stream_nodes(nodes, n_yielded)
+            n_yielded += len(nodes)
+        if buffer:
+            finished.extend((buffer_start + start, buffer_start + end, buffer[start:end]) for start, end in self.chunk_spans(buffer))
+        if finished:
+            yield from self._finish_stream_nodes(self._stream_nodes(previous, finished, None, num_words_overlap), n_yielded)
+
+    def _stream_nodes(
+        self, previous: Optional[_StreamChunk], chunks: List[_StreamChunk], following: Optional[_StreamChunk], num_words_overlap: int
+    ) -> List[TextNode]:
+        """Nodes of the chunks, with the overlap taken from the chunks around them."""
+        neighbours = ([previous] if previous is not None else []) + chunks + ([following] if following is not None else [])
+        texts = [text for _, _, text in neighbours]
+        spans = ChunkSpans.from_pieces("".join(texts), texts, [(i, i + 1) for i in range(len(texts))])
+        token_offsets = self.token_offsets(spans.text) if num_words_overlap else None
+        first = 0 if previous is None else 1
+        return [
+            text_node(text=spans.text_with_context(first + i, num_words_overlap, token_offsets), start_char_idx=start, end_char_idx=end)
+            for i, (start, end, _) in enumerate(chunks)
+        ]
+
+    def _finish_stream_nodes(self, nodes: List[TextNode], first_chunk_number: int) -> List[TextNode]:
+        """Finishes the nodes yielded by `chunk_stream`, e.g. adding metadata, given the number of chunks before them."""
+        return nodes
+
     def add_context(self, nodes: List[TextNode], num_words_overlap: int) -> List[TextNode]:
         """Takes some overlapping text from the previous and next chunks and adds it to the current chunk."""
+        with self.observer.span("add_context"):
+            return self._add_context_to_nodes(nodes, num_words_overlap)
+
+    def _add_context_to_nodes(self, nodes: List[TextNode], num_words_overlap: int) -> List[TextNode]:
+        if num_words_overlap and self.overlap_mode != "words":
+            # the token offsets are found once for all the chunks joined together rather than per neighbour
+            texts = [node.text for node in nodes]
+            spans = ChunkSpans.from_pieces("".join(texts), texts, [(i, i + 1) for i in range(len(texts))])
+            token_offsets = self.token_offsets(spans.text)
+            return [text_node(text=spans.text_with_context(i, num_words_overlap, token_offsets)) for i in range(len(spans))]
         new_nodes = []
         for i, node in enumerate(nodes):
             if num_words_overlap:
@@ -24,22 +167,31 @@ class BaseChunker(ABC):
                     previous_node = nodes[i - 1]
                 if i < len(nodes) - 1:
                     next_node = nodes[i + 1]
-                new_node = TextNode(text=self._add_context(node, previous_node, next_node, num_words_overlap))
+                new_node = text_node(text=self._add_context(node, previous_node, next_node, num_words_overlap))
             else:
-                new_node = TextNode(text=node.text)
+                new_node = text_node(text=node.text)
             new_nodes.append(new_node)
         return new_nodes
 
+    def token_offsets(self, text: str) -> Optional[TokenOffsets]:
+        """The token offsets of a document when the overlap is measured in tokens, otherwise None."""
+        if self.overlap_mode not in OVERLAP_MODES:
+            raise ValueError(f"overlap_mode must be one of {OVERLAP_MODES}, got '{self.overlap_mode}'")
+        if self.overlap_mode == "words":
+            return None
+        if self.token_counter is None:
+            raise ValueError(f"{type(self).__name__} needs a token_counter to measure the overlap in tokens")
+        return TokenOffsets(text, self.token_counter.encoding)
+
     def extract_context_from_chunk(self, text: str, num_spaces: int, from_start: bool = False):
         """Extracts text from a chunk, either from the start or the end. Used to get some overlapping
-        text from the surrounding chunks. Breaks the original text up at each space in the sentence
-        and then joins the words back together based on the number of spaces requested.
+        text from the surrounding chunks. Takes the words up to the requested number of spaces from the
+        start or the end of the text, scanning only as far into the text as it needs to.
         """
-        words = text.split(" ")
         if from_start:
-            return " ".join(words[: num_spaces + 1])
+            return text[: words_end(text, 0, len(text), num_spaces + 1)]
         else:
-            return " ".join(words[-num_spaces - 1 :])
+            return text[words_start(text, 0, len(text), num_spaces + 1) :]
 
     def _add_context(self, node: TextNode, previous_node: Optional[TextNode], next_node: Optional[TextNode], n_words: int) -> str:
         """Adds some overlapping text from the previous and next chunks to the current chunk."""
@@ -54,18 +206,120 @@ class BaseChunker(ABC):
 
         return text
 
+    def cache_config(self) -> Optional[Dict[str, Any]]:
+        """
+        The settings of the chunker which change its output, used to key cached chunks. If a setting cannot be
+        identified, e.g. a lambda or a bound method as splitting function, this is None and the chunks are not
+        cached, unless the chunker has a `cache_identity` standing in for those settings.
+        """
+        config: Dict[str, Any] = {"class": f"{type(self).__module__}.{type(self).__qualname__}"}
+        unidentified = []
+        for name, value in vars(self).items():
+            # private attributes are state such as locks and memos, not settings
+            if name.startswith("_") or name in self.cache_ignore or name == "cache_identity":
+                continue
+            identity = _setting_identity(value)
+            if identity is _UNIDENTIFIED:
+                unidentified.append(name)
+            else:
+                config[name] = identity
+        if unidentified:
+            if self.cache_identity is None:
+                return None
+            config["cache_identity"] = self.cache_identity
+        return config
+
+
+# marks a setting which cannot be told apart from another one of the same kind
+_UNIDENTIFIED = object()
+
+
+def _setting_identity(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        items = [_setting_identity(item) for item in value]
+        return _UNIDENTIFIED if any(item is _UNIDENTIFIED for item in items) else items
+    if isinstance(value, dict):
+        items = {str(key): _setting_identity(item) for key, item in value.items()}
+        return _UNIDENTIFIED if any(item is _UNIDENTIFIED for item in items.values()) else items
+    if isinstance(value, (types.FunctionType, types.BuiltinFunctionType, type)):
+        # lambdas and functions defined inside other functions share their name with every other one
+        if "<" in value.__qualname__:
+            return _UNIDENTIFIED
+        return f"{value.__module__}.{value.__qualname__}"
+    if hasattr(value, "model_name") and not callable(value):
+        return f"{type(value).__qualname__}:{value.model_name}"
+    return _UNIDENTIFIED
+
 
 class BaseFileProcessor:
-    def __init__(self, file_name: str, chunker: BaseChunker):
+    def __init__(self, file_name: DocumentSource, chunker: BaseChunker, cache: Optional[DiskCache] = None, observer: Optional[Observer] = None):
+        # a path, or the document itself as bytes, a buffer or a binary file-like object
         self.file_name = file_name
         self.chunker = chunker
+        self.cache = cache
+        self.observer = observer if observer is not None else NULL_OBSERVER
+        self._content_hash: Optional[str] = None
+        self._content: Optional[Union[bytes, memoryview]] = None
+
+    def content(self) -> Union[bytes, memoryview]:
+        """The contents of a document given in memory, as a view of its buffer where possible. File-like objects are read once."""
+        if self._content is None:
+            self._content = as_buffer(self.file_name)
+        return self._content
+
+    def content_hash(self) -> str:
+        if self._content_hash is None:
+            self._content_hash = hash_content(self.file_name if is_path(self.file_name) else self.content())  # type: ignore[arg-type]
+        return self._content_hash
+
+    def document_name(self) -> str:
+        """Names the document in timing spans and counters."""
+        if is_path(self.file_name):
+            return os.fspath(self.file_name)  # type: ignore[arg-type]
+        return f"content:{self.content_hash()}"
 
     @abstractmethod
     def extract_text(self) -> str:
         raise NotImplementedError
 
+    def iter_units(self) -> Iterator[str]:
+        """
+        Yields the text of the document in units, e.g. pages, which join into the text of `extract_text`. Incremental
+        processing compares documents unit by unit. By default the whole document is a single unit.
+        """
+        yield self.extract_text()
+
+    @timed("chunk")
     def chunk(self, text: str, num_words_overlap: int) -> List[TextNode]:
-        return self.chunker.chunk(text, num_words_overlap)
+        config = self.chunker.cache_config() if self.cache is not None else None
+        if config is None:
+            if self.cache is not None:
+                self.observer.count("chunk_cache_unidentified")
+            return self.chunker.chunk(text, num_words_overlap)
+        key = make_key("chunk", hash_text(text), config, num_words_overlap)
+        cached = self.cache.get_json(key)
+        if cached is not None:
+            self.observer.count("chunk_cache_hits")
+            return [
+                text_node(
+                    text=node["text"], metadata=node["metadata"], start_char_idx=node.get("start_char_idx"), end_char_idx=node.get("end_char_idx")
+                )
+                for node in cached
+            ]
+        chunks = self.chunker.chunk(text, num_words_overlap)
+        self.cache.set_json(
+            key,
+            [
+                {"text": node.text, "metadata": node.metadata, "start_char_idx": node.start_char_idx, "end_char_idx": node.end_char_idx}
+                for node in chunks
+            ],
+        )
+        return chunks
 
-    def achunk(self, text: str, num_words_overlap: int):
-        return self.chunker.achunk(text, num_words_overlap)
+    async def achunk(self, text: str, num_words_overlap: int) -> List[TextNode]:
+        if not self.observer.enabled:
+            return await self.chunker.achunk(text, num_words_overlap)
+        with self.observer.document(self.document_name()), self.observer.span("chunk"):
+            return await self.chunker.achunk(text, num_words_overlap)
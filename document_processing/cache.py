@@ -0,0 +1,201 @@
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import time
+from typing import Any, Callable, Iterable, List, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows, where each process keeps its own size estimate
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE_BYTES = 1024**3
+# a lock file older than this is assumed to be left behind by a process which died while evicting
+STALE_LOCK_SECONDS = 60
+HASH_CHUNK_SIZE = 1024**2
+# holds the total size of the entries, shared by every process using the directory
+SIZE_FILE = ".size"
+
+
+def hash_content(content: Union[str, bytes, bytearray, memoryview, os.PathLike]) -> str:
+    """Hashes file contents, either given as a buffer or as a path which is read in chunks."""
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        digest.update(content)
+    else:
+        with open(content, "rb") as f:
+            for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=20).hexdigest()
+
+
+def make_key(*parts: Any) -> str:
+    """Builds a cache key from json serializable parts."""
+    return hash_text(json.dumps(parts, sort_keys=True, default=str))
+
+
+class DiskCache:
+    """
+    A content addressed cache stored in a local directory, one file per entry. Entries are written to a
+    temporary file and moved into place so readers never see partial writes, which makes it safe to share
+    the directory between processes. Once the directory grows past `max_size_bytes` the least recently used
+    entries (by modification time, refreshed on every hit) are removed. The total size is kept in a file locked
+    on every write, so processes sharing the directory evict based on what all of them wrote.
+    """
+
+    def __init__(self, directory: Union[str, os.PathLike], max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES):
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self._approximate_size = self._entries_size() if fcntl is None else self._update_size(0)
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.directory / key[:2] / f"{key}.bin"
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return value
+
+    def set(self, key: str, value: bytes):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(temp_path, path)
+        except BaseException:
+            pathlib.Path(temp_path).unlink(missing_ok=True)
+            raise
+        self._approximate_size = self._update_size(len(value))
+        if self._approximate_size > self.max_size_bytes:
+            self.evict()
+
+    def get_json(self, key: str) -> Any:
+        value = self.get(key)
+        return None if value is None else json.loads(value)
+
+    def set_json(self, key: str, value: Any):
+        self.set(key, json.dumps(value).encode("utf-8"))
+
+    def __contains__(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in `max_size_bytes`."""
+        lock_path = self.directory / ".evict.lock"
+        if not self._acquire_lock(lock_path):
+            # another process is already evicting
+            return
+        try:
+            entries = sorted(self._entries(), key=lambda entry: entry[1])
+            total_size = sum(size for _, _, size in entries)
+            for path, _, size in entries:
+                if total_size <= self.max_size_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total_size -= size
+            # the directory was just listed, which also corrects any drift of the shared size, e.g. from overwritten entries
+            self._approximate_size = self._update_size(0, total=total_size)
+        finally:
+            lock_path.unlink(missing_ok=True)
+
+    def clear(self):
+        for path, _, _ in self._entries():
+            path.unlink(missing_ok=True)
+        self._approximate_size = self._update_size(0, total=0)
+
+    def _update_size(self, added: int, total: Optional[int] = None) -> int:
+        """Adds to the total size shared through the size file, or sets it to `total`, and returns the new total."""
+        if fcntl is None:
+            return total if total is not None else self._approximate_size + added
+        with open(self.directory / SIZE_FILE, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                stored = f.read().strip()
+                if total is None:
+                    # the first process to use the directory counts what is already in it
+                    total = (int(stored) if stored else self._entries_size()) + added
+                f.seek(0)
+                f.truncate()
+                f.write(str(total))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return total
+
+    def _acquire_lock(self, lock_path: pathlib.Path) -> bool:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - lock_path.stat().st_mtime > STALE_LOCK_SECONDS:
+                    lock_path.unlink(missing_ok=True)
+                    return self._acquire_lock(lock_path)
+            except FileNotFoundError:
+                return self._acquire_lock(lock_path)
+            return False
+
+    def _entries(self) -> List[Tuple[pathlib.Path, float, int]]:
+        entries = []
+        for path in self.directory.glob("*/*.bin"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _entries_size(self) -> int:
+        return sum(size for _, _, size in self._entries())
+
+
+def cached_extraction(ignore: Iterable[str] = ()):
+    """
+    Caches the result of a file processor's text extraction method in the processor's `cache`. The key is made
+    from the file contents, the processor class, the method and its arguments except the ones in `ignore`,
+    which are arguments that do not change the output (e.g. how many workers to use).
+    """
+    ignore = set(ignore)
+
+    def decorator(method: Callable[..., str]) -> Callable[..., str]:
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs) -> str:
+            if self.cache is None:
+                return method(self, *args, **kwargs)
+            arguments = signature.bind(self, *args, **kwargs)
+            arguments.apply_defaults()
+            config = {name: value for name, value in arguments.arguments.items() if name != "self" and name not in ignore}
+            key = make_key("extract", type(self).__qualname__, method.__name__, self.content_hash(), config)
+            cached = self.cache.get_json(key)
+            if cached is not None:
+                self.observer.count("extract_cache_hits")
+                return cached
+            text = method(self, *args, **kwargs)
+            self.cache.set_json(key, text)
+            return text
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,237 @@
+"""
+A compact on-disk store for the chunks of many documents, as an alternative to holding them in `Chunks` lists. A store
+is a directory with the text of all chunks concatenated into one UTF-8 blob, plus one binary column per field: where
+each chunk ends in the blob, its chunk number, its length and its language. The files are memory-mapped, so opening a
+store reads nothing but its small header, any chunk is read in O(1) by slicing the blob, and ordering the chunks
+sorts the chunk number column without building a Python object per chunk.
+
+Chunks are appended by writing to the end of every file, a batch of chunks at a time, and then replacing the header,
+which holds the number of chunks. A reader never sees a partly written chunk, and bytes left behind by an append which
+did not finish are dropped by the next one. Only one process should append to a store at a time.
+"""
+
+import contextlib
+import json
+import mmap
+import os
+import pathlib
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from document_processing.chunking import ChunkMeta, Chunks
+
+STORE_VERSION = 1
+HEADER_FILE = "header.json"
+TEXT_FILE = "text.bin"
+# the byte offset where each chunk ends in the text blob, it starts where the previous one ends
+COLUMNS: Dict[str, np.dtype] = {
+    "ends": np.dtype("<i8"),
+    "chunk_number": np.dtype("<i8"),
+    "length": np.dtype("<i8"),
+    # index into the languages in the header
+    "lang": np.dtype("<u2"),
+}
+# how many chunks `extend` encodes and writes at a time, so appending many chunks holds only a batch of them encoded
+EXTEND_BATCH_CHUNKS = 10_000
+
+
+class ChunkStore:
+    """
+    The chunks stored in a directory. A directory without a store raises a `FileNotFoundError`, unless `create` is set,
+    in which case an empty store is created in it. Indexing the store gives the text and metadata of the chunks in the
+    order they were appended, and `iter_ordered` goes through them by chunk number. Close the store, or use it as a
+    context manager, to release the memory maps.
+    """
+
+    def __init__(self, directory: Union[str, os.PathLike], create: bool = False):
+        self.directory = pathlib.Path(directory)
+        if not (self.directory / HEADER_FILE).exists():
+            if not create:
+                raise FileNotFoundError(f"no chunk store in {self.directory}, pass create=True to create one")
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._write_header({"version": STORE_VERSION, "count": 0, "text_bytes": 0, "languages": []})
+        self._lock = threading.Lock()
+        self._maps: List[mmap.mmap] = []
+        self._text: Optional[mmap.mmap] = None
+        self._columns: Dict[str, np.ndarray] = {}
+        self._header = self._read_header()
+        self._map()
+
+    @classmethod
+    def from_chunks(cls, directory: Union[str, os.PathLike], chunks: Chunks) -> "ChunkStore":
+        """A new store holding exactly the chunks. Raises a `FileExistsError` if the directory holds a store already."""
+        if (pathlib.Path(directory) / HEADER_FILE).exists():
+            raise FileExistsError(f"{directory} already holds a chunk store, open it with ChunkStore to append to it")
+        store = cls(directory, create=True)
+        store.extend(chunks.chunks, chunks.metas)
+        return store
+
+    def to_chunks(self, ordered: bool = False) -> Chunks:
+        """The chunks as a `Chunks` model, by chunk number if `ordered`, otherwise in the order they were appended."""
+        indices = self.order().tolist() if ordered else range(len(self))
+        columns = {name: self._columns[name].tolist() for name in ("chunk_number", "length", "lang")}
+        languages = self._header["languages"]
+        metas = [ChunkMeta(chunk_number=columns["chunk_number"][i], length=columns["length"][i], lang=languages[columns["lang"][i]]) for i in indices]
+        return Chunks(chunks=self._texts(indices), metas=metas)
+
+    def __len__(self) -> int:
+        return self._header["count"]
+
+    def __getitem__(self, i: int) -> Tuple[str, ChunkMeta]:
+        return self.text(i), self.meta(i)
+
+    def __iter__(self) -> Iterator[Tuple[str, ChunkMeta]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def text(self, i: int) -> str:
+        i = self._index(i)
+        ends = self._columns["ends"]
+        start, end = int(ends[i - 1]) if i else 0, int(ends[i])
+        if start == end:
+            # the text blob is not mapped while it is empty
+            return ""
+        return self._text[start:end].decode("utf-8", "surrogatepass")  # type: ignore[index]
+
+    def meta(self, i: int) -> ChunkMeta:
+        i = self._index(i)
+        columns = self._columns
+        return ChunkMeta(
+            chunk_number=int(columns["chunk_number"][i]), length=int(columns["length"][i]), lang=self._header["languages"][columns["lang"][i]]
+        )
+
+    def order(self) -> np.ndarray:
+        """Indices of the chunks sorted by chunk number. Chunks with the same number keep the order they were appended in."""
+        return np.argsort(self._columns["chunk_number"], kind="stable")
+
+    def iter_ordered(self) -> Iterator[Tuple[str, ChunkMeta]]:
+        for i in self.order():
+            yield self[int(i)]
+
+    def ordered_texts(self) -> List[str]:
+        """The text of every chunk by chunk number, the same as `Chunks.order_chunks`."""
+        return self._texts(self.order().tolist())
+
+    def append(self, text: str, meta: ChunkMeta):
+        self.extend([text], [meta])
+
+    def extend(self, texts: Sequence[str], metas: Sequence[ChunkMeta]):
+        """Appends chunks and their metadata, opening each file once and writing the chunks in batches."""
+        if len(texts) != len(metas):
+            raise ValueError(f"got {len(texts)} chunks but {len(metas)} metas")
+        with self._lock:
+            header = dict(self._header)
+            languages = list(header["languages"])
+            language_index = {lang: i for i, lang in enumerate(languages)}
+            for meta in metas:
+                if meta.lang not in language_index:
+                    language_index[meta.lang] = len(languages)
+                    languages.append(meta.lang)
+            if len(languages) > np.iinfo(COLUMNS["lang"]).max + 1:
+                raise ValueError(f"a chunk store holds at most {np.iinfo(COLUMNS['lang']).max + 1} languages")
+
+            # the maps cannot stay open while the files they map are truncated
+            self._unmap()
+            try:
+                self._truncate(header)
+                text_bytes = header["text_bytes"]
+                with contextlib.ExitStack() as stack:
+                    text_file = stack.enter_context(open(self.directory / TEXT_FILE, "ab"))
+                    column_files = {name: stack.enter_context(open(self.directory / f"{name}.bin", "ab")) for name in COLUMNS}
+                    for batch_start in range(0, len(texts), EXTEND_BATCH_CHUNKS):
+                        batch_end = batch_start + EXTEND_BATCH_CHUNKS
+                        encoded = [text.encode("utf-8", "surrogatepass") for text in texts[batch_start:batch_end]]
+                        batch_metas = metas[batch_start:batch_end]
+                        values = {
+                            "ends": text_bytes + np.cumsum([len(text) for text in encoded], dtype=np.int64),
+                            "chunk_number": [meta.chunk_number for meta in batch_metas],
+                            "length": [meta.length for meta in batch_metas],
+                            "lang": [language_index[meta.lang] for meta in batch_metas],
+                        }
+                        text_file.write(b"".join(encoded))
+                        for name, dtype in COLUMNS.items():
+                            column_files[name].write(np.asarray(values[name], dtype=dtype).tobytes())
+                        text_bytes += sum(map(len, encoded))
+                header.update(count=header["count"] + len(texts), text_bytes=text_bytes, languages=languages)
+                self._write_header(header)
+                self._header = header
+            finally:
+                self._map()
+
+    def close(self):
+        with self._lock:
+            self._unmap()
+
+    def __enter__(self) -> "ChunkStore":
+        return self
+
+    def __exit__(self, *exc_info: Any):
+        self.close()
+
+    def _texts(self, indices: Iterable[int]) -> List[str]:
+        # converts the offsets to Python ints once instead of once per chunk
+        ends = self._columns["ends"].tolist()
+        starts = [0, *ends[:-1]]
+        text = self._text if self._text is not None else b""
+        return [text[starts[i] : ends[i]].decode("utf-8", "surrogatepass") for i in indices]
+
+    def _index(self, i: int) -> int:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"chunk {i} out of range for a store of {len(self)} chunks")
+        return i
+
+    def _map(self):
+        count, text_bytes = self._header["count"], self._header["text_bytes"]
+        self._text = self._open_map(TEXT_FILE, text_bytes)
+        self._columns = {}
+        for name, dtype in COLUMNS.items():
+            column_map = self._open_map(f"{name}.bin", count * dtype.itemsize)
+            self._columns[name] = np.frombuffer(column_map, dtype=dtype, count=count) if column_map is not None else np.empty(0, dtype=dtype)
+
+    def _open_map(self, file_name: str, size: int) -> Optional[mmap.mmap]:
+        # an empty file cannot be mapped
+        if not size:
+            return None
+        with open(self.directory / file_name, "rb") as f:
+            file_map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        self._maps.append(file_map)
+        return file_map
+
+    def _unmap(self):
+        # the arrays over the maps have to go first, a map cannot be closed while they point into it
+        self._columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._text = None
+        for file_map in self._maps:
+            file_map.close()
+        self._maps = []
+
+    def _truncate(self, header: Dict[str, Any]):
+        """Drops whatever an append which did not finish left after the chunks in the header."""
+        sizes = {TEXT_FILE: header["text_bytes"], **{f"{name}.bin": header["count"] * dtype.itemsize for name, dtype in COLUMNS.items()}}
+        for file_name, size in sizes.items():
+            path = self.directory / file_name
+            if path.exists() and path.stat().st_size > size:
+                os.truncate(path, size)
+
+    def _read_header(self) -> Dict[str, Any]:
+        with open(self.directory / HEADER_FILE) as f:
+            header = json.load(f)
+        if header.get("version") != STORE_VERSION:
+            raise ValueError(f"unsupported chunk store version {header.get('version')}, expected {STORE_VERSION}")
+        return header
+
+    def _write_header(self, header: Dict[str, Any]):
+        # written to a temporary file and moved into place, so the header always describes complete chunks
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(header, f)
+            os.replace(temp_path, self.directory / HEADER_FILE)
+        except BaseException:
+            pathlib.Path(temp_path).unlink(missing_ok=True)
+            raise
@@ -1,48 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
 import logging
-from typing import Awaitable, Callable, List, Union, cast
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional, Union
 
-import langdetect  # type: ignore
-from llama_index.core.node_parser import SemanticSplitterNodeParser
-from llama_index.core.schema import Document, TextNode
-from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding  # type: ignore
+import numpy as np
 from pydantic import BaseModel  # type: ignore
 
 from document_processing.base import BaseChunker
-from document_processing.embeddings import check_n_embeddings
+from document_processing.embeddings import TokenCounter, get_token_counter
+from document_processing.instrumentation import NULL_OBSERVER, Observer
+from document_processing.language import LanguageDetector, get_language_detector
+from document_processing.nodes import is_llama_index_embedding, text_node
+from document_processing.packing import PACKING_MODES, Packing, pack
+from document_processing.semantic import (
+    Embedder,
+    build_sentence_groups,
+    semantic_ranges,
+    split_long_sentences,
+    split_sentences,
+)
+from document_processing.spans import ChunkSpans
+
+if TYPE_CHECKING:
+    from llama_index.core.base.embeddings.base import BaseEmbedding
+    from llama_index.core.schema import TextNode
+
+logger = logging.getLogger(__name__)
 
 
 class SemanticChunker(BaseChunker):
-    """A chunker that uses semantic splitting to split the text into chunks."""
+    """
+    A chunker that uses semantic splitting to split the text into chunks. The text is split into sentences, each
+    sentence is embedded together with the `buffer_size` sentences around it, and a new chunk starts wherever the
+    cosine distance between neighbouring groups is above the `breakpoint_percentile_threshold` percentile. If
+    `max_length_tokens` is given, chunks above it are split again at their largest distance. The embedding model
+    can be a llama_index embedding model or any function mapping a list of texts to a list of embeddings. With
+    `overlap_mode="tokens"` the overlap added from neighbouring chunks is counted in tokens instead of words.
+    """
 
     def __init__(
         self,
-        embed_model: AzureOpenAIEmbedding,
+        embed_model: Union[BaseEmbedding, Embedder],
         buffer_size: int = 2,
         breakpoint_percentile_threshold: int = 95,
+        max_concurrency: int = 8,
+        max_length_tokens: Optional[int] = None,
+        chat_model: str = "gpt-4o",
+        token_counter: Optional[TokenCounter] = None,
+        overlap_mode: str = "words",
+        observer: Optional[Observer] = None,
     ):
         self.embed_model = embed_model
-        self.semantic_splitter = SemanticSplitterNodeParser(
-            buffer_size=buffer_size,
-            breakpoint_percentile_threshold=breakpoint_percentile_threshold,
-            embed_model=embed_model,
-        )
+        self.buffer_size = buffer_size
+        self.breakpoint_percentile_threshold = breakpoint_percentile_threshold
+        self.max_concurrency = max_concurrency
+        self.max_length_tokens = max_length_tokens
+        self.chat_model = chat_model
+        self.token_counter = token_counter if token_counter is not None else get_token_counter(chat_model)
+        self.overlap_mode = overlap_mode
+        self.observer = observer if observer is not None else NULL_OBSERVER
 
     def chunk(self, text: str, num_words_overlap: int) -> List[TextNode]:
         """Chunks text into overlapping chunks."""
+        sentences = self._split_sentences(text)
+        with self.observer.span("embed"):
+            embeddings = self._embed(build_sentence_groups(sentences, self.buffer_size))
+        return self._to_nodes(text, sentences, embeddings, num_words_overlap)
+
+    async def achunk(self, text: str, num_words_overlap: int) -> List[TextNode]:
+        """Chunks text into overlapping chunks, embedding the sentence groups in concurrent batches."""
+        sentences = self._split_sentences(text)
+        with self.observer.span("embed"):
+            embeddings = await self._aembed(build_sentence_groups(sentences, self.buffer_size))
+        return self._to_nodes(text, sentences, embeddings, num_words_overlap)
 
-        text_document = Document(text=text)
-        nodes = cast(List[TextNode], self.semantic_splitter.get_nodes_from_documents([text_document]))
+    def chunk_spans(self, text: str) -> ChunkSpans:
+        """Chunks text into spans of the text, without overlap."""
+        sentences = self._split_sentences(text)
+        with self.observer.span("embed"):
+            embeddings = self._embed(build_sentence_groups(sentences, self.buffer_size))
+        with self.observer.span("find_breakpoints"):
+            return self._build_spans(text, sentences, embeddings)
 
-        return self.add_context(nodes, num_words_overlap)
+    def _split_sentences(self, text: str) -> List[str]:
+        with self.observer.span("split_sentences"):
+            sentences = split_sentences(text)
+            if self.max_length_tokens is not None:
+                sentences = split_long_sentences(sentences, self.token_counter.count, self.max_length_tokens)
+        self.observer.count("sentences", len(sentences))
+        return sentences
 
-    def achunk(self, text: str, num_words_overlap: int):
-        raise NotImplementedError("SemanticChunker does not support async, please use the sync version `.chunk(text, num_words_overlap)` instead.")
+    def _to_nodes(self, text: str, sentences: List[str], embeddings: np.ndarray, num_words_overlap: int) -> List[TextNode]:
+        with self.observer.span("find_breakpoints"):
+            spans = self._build_spans(text, sentences, embeddings)
+        with self.observer.span("add_context"):
+            token_offsets = self.token_offsets(text) if num_words_overlap else None
+            nodes = spans.to_nodes(num_words_overlap, token_offsets)
+        self.observer.count("chunks", len(nodes))
+        return nodes
+
+    def _build_spans(self, text: str, sentences: List[str], embeddings: np.ndarray) -> ChunkSpans:
+        # the sentences join back together into the text, so each chunk is a slice of the text
+        ranges = semantic_ranges(sentences, embeddings, self.breakpoint_percentile_threshold, self.token_counter.count, self.max_length_tokens)
+        return ChunkSpans.from_pieces(text, sentences, ranges)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if is_llama_index_embedding(self.embed_model):
+            embeddings = self.embed_model.get_text_embedding_batch(texts)
+        else:
+            embeddings = self.embed_model(texts)
+        return np.asarray(embeddings, dtype=float)
+
+    async def _aembed(self, texts: List[str]) -> np.ndarray:
+        """Embeds texts in batches of the embedding model's batch size, running at most `max_concurrency` batches at once."""
+        if not is_llama_index_embedding(self.embed_model):
+            embeddings = self.embed_model(texts)
+            if inspect.isawaitable(embeddings):
+                embeddings = await embeddings
+            return np.asarray(embeddings, dtype=float)
+
+        embed_model = self.embed_model
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        batch_size = embed_model.embed_batch_size
+
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await embed_model.aget_text_embedding_batch(batch)
+
+        batches = await asyncio.gather(*[embed_batch(texts[i : i + batch_size]) for i in range(0, len(texts), batch_size)])
+        return np.asarray([embedding for batch in batches for embedding in batch], dtype=float)
 
 
 class FunctionChunker(BaseChunker):
     """
     A chunker that uses any user defined function to split the text into chunks.
     Function should return a list of TextNodes.
+
+    With `use_spans=True` the chunks are kept as offsets into the text (see `ChunkSpans`) rather than as copies,
+    and the returned nodes carry the offsets of their chunk. The text of every node returned by the splitting
+    function must then appear in the text it was given, and short chunks are combined with the text between them.
+    With `overlap_mode="tokens"` the overlap added from neighbouring chunks is counted in tokens instead of words.
+
+    With `packing="greedy"` or `packing="optimal"` the pieces left after splitting long chunks are packed into chunks
+    in a single pass over their token counts (see `document_processing.packing`) instead of combining short chunks
+    until none are left. Pieces which are still above `max_length_tokens` are kept whole and logged.
     """
 
     def __init__(
@@ -51,26 +154,78 @@ class FunctionChunker(BaseChunker):
         max_length_tokens: int,
         splitting_function: Union[Awaitable[List[TextNode]], Callable[[str], List[TextNode]]],
         chat_model="gpt-4o",
+        token_counter: Optional[TokenCounter] = None,
+        max_concurrency: int = 8,
+        use_spans: bool = False,
+        overlap_mode: str = "words",
+        language_detector: Optional[LanguageDetector] = None,
+        observer: Optional[Observer] = None,
+        packing: Optional[str] = None,
     ):
+        if packing is not None and packing not in PACKING_MODES:
+            raise ValueError(f"unknown packing mode {packing!r}, choose from {PACKING_MODES}")
         self.min_length = min_length_tokens
         self.max_length = max_length_tokens
         self.splitting_function = splitting_function
         self.chat_model = chat_model
+        # maximum number of async splitting calls awaited at the same time
+        self.max_concurrency = max_concurrency
+        # shared per model by default so token counts are reused across chunkers and documents
+        self.token_counter = token_counter if token_counter is not None else get_token_counter(chat_model)
+        self.use_spans = use_spans
+        self.overlap_mode = overlap_mode
+        self.language_detector = language_detector if language_detector is not None else get_language_detector()
+        self.observer = observer if observer is not None else NULL_OBSERVER
+        self.packing = packing
+
+    def count_tokens(self, text: str) -> int:
+        n_tokens = self.token_counter.count(text)
+        self.observer.count("tokens_counted", n_tokens)
+        return n_tokens
 
     def chunk(self, text: str, num_words_overlap: int) -> List[TextNode]:
-        chunks = self.splitting_function(text)
-        chunks = self.ensure_chunks_small_enough(chunks)
-        chunks = self.ensure_chunks_large_enough(chunks)
+        if self.use_spans:
+            spans = self.chunk_spans(text)
+            with self.observer.span("add_context"):
+                token_offsets = self.token_offsets(text) if num_words_overlap else None
+                nodes = spans.to_nodes(num_words_overlap, token_offsets)
+            return self._add_metadata(nodes)
+        with self.observer.span("split"):
+            chunks = self.split(text)
+        with self.observer.span("ensure_chunks_small_enough"):
+            chunks = self.ensure_chunks_small_enough(chunks)
+        chunks = self._combine_chunks(chunks)
         chunks = self.add_context(chunks, num_words_overlap)
         return self._add_metadata(chunks)
 
+    def _combine_chunks(self, chunks: List[TextNode]) -> List[TextNode]:
+        if self.packing is not None:
+            with self.observer.span("pack"):
+                return self.pack_chunks(chunks)
+        with self.observer.span("ensure_chunks_large_enough"):
+            return self.ensure_chunks_large_enough(chunks)
+
+    def pack_chunks(self, chunks: List[TextNode]) -> List[TextNode]:
+        """Packs the chunks into chunks within the length limits, joining the text of the chunks packed together."""
+        packing = self._pack([self.count_tokens(chunk.text) for chunk in chunks])
+        return [text_node(text="".join(chunk.text for chunk in chunks[first:last])) for first, last in packing.ranges]
+
+    def split(self, text: str) -> List[TextNode]:
+        """Splits the whole text into its first pieces. Chunks which are too long are split again with `splitting_function`."""
+        return self.splitting_function(text)  # type: ignore
+
+    async def asplit(self, text: str) -> List[TextNode]:
+        return await self.splitting_function(text)  # type: ignore
+
     def ensure_chunks_large_enough(self, chunks: List[TextNode]) -> List[TextNode]:
         all_chunks_above_min = False
         while True:
-            all_chunks_above_min = all(check_n_embeddings(chunk.text, self.chat_model) >= self.min_length for chunk in chunks)
-            if all_chunks_above_min:
+            all_chunks_above_min = all(self.count_tokens(chunk.text) >= self.min_length for chunk in chunks)
+            # a single chunk cannot be combined any further
+            if all_chunks_above_min or len(chunks) < 2:
                 break
             chunks = self.combine_short_chunks(chunks)
+            self.observer.count("merge_iterations")
         return chunks
 
     def ensure_chunks_small_enough(self, chunks, max_attempts_to_split: int = 6):
@@ -78,10 +233,11 @@ class FunctionChunker(BaseChunker):
         all_chunks_below_max = False
         n_attempts = 0
         while True:
-            all_chunks_below_max = all(check_n_embeddings(chunk.text, self.chat_model) <= self.max_length for chunk in chunks)
+            all_chunks_below_max = all(self.count_tokens(chunk.text) <= self.max_length for chunk in chunks)
             if all_chunks_below_max:
                 break
             chunks = self.split_large_chunks_down(chunks)
+            self.observer.count("split_iterations")
             n_attempts += 1
             if n_attempts >= max_attempts_to_split:
                 break
@@ -91,12 +247,16 @@ class FunctionChunker(BaseChunker):
         """Combines chunks that are too short into the previous chunk."""
         result: List[TextNode] = []
         buffer = ""
+        # the buffer keeps growing, so its token count is kept up to date instead of re-encoding it
+        buffer_tokens = self.token_counter.incremental()
         for node in nodes:
             string = node.text
-            if check_n_embeddings(string, self.chat_model) < self.min_length:
+            if self.count_tokens(string) < self.min_length:
                 buffer += string
-            elif check_n_embeddings(buffer, self.chat_model) < self.min_length:
+                buffer_tokens.append(string)
+            elif buffer_tokens.count < self.min_length:
                 buffer += string
+                buffer_tokens.append(string)
             else:
                 # Append buffer to the result if it exists
                 if buffer:
@@ -105,10 +265,11 @@ class FunctionChunker(BaseChunker):
                         last_node.text += buffer
                         result[-1] = last_node
                     else:
-                        result.append(TextNode(text=buffer))
+                        result.append(text_node(text=buffer))
                     buffer = ""
+                    buffer_tokens = self.token_counter.incremental()
                 # Append the current string to the result
-                result.append(TextNode(text=string))
+                result.append(text_node(text=string))
         # Append any remaining buffer to the last string in the result
         if buffer:
             if result:
@@ -116,7 +277,7 @@ class FunctionChunker(BaseChunker):
                 last_node.text += buffer
                 result[-1] = last_node
             else:
-                result.append(TextNode(text=buffer))
+                result.append(text_node(text=buffer))
         return result
 
     def split_large_chunks_down(self, nodes: List[TextNode]) -> List[TextNode]:
@@ -126,48 +287,200 @@ class FunctionChunker(BaseChunker):
         new_nodes: List[TextNode] = []
         for node in nodes:
             text = node.text
-            if check_n_embeddings(text, self.chat_model) > self.max_length:
+            if self.count_tokens(text) > self.max_length:
                 split_parts: List[TextNode] = self.splitting_function(text)
                 new_nodes.extend(split_parts)
             else:
-                new_nodes.append(TextNode(text=text))
+                new_nodes.append(text_node(text=text))
         return new_nodes
 
     async def achunk(self, text: str, num_words_overlap: int):
-        print(f"Processing {text[:40]}")
-        chunks = await self.splitting_function(text)  # type: ignore
-        chunks = await self.async_ensure_chunks_small_enough(chunks)
-        chunks = self.ensure_chunks_large_enough(chunks)
+        if self.use_spans:
+            spans = await self.achunk_spans(text)
+            with self.observer.span("add_context"):
+                token_offsets = self.token_offsets(text) if num_words_overlap else None
+                nodes = spans.to_nodes(num_words_overlap, token_offsets)
+            return self._add_metadata(nodes)
+        with self.observer.span("split"):
+            chunks = await self.asplit(text)
+        with self.observer.span("ensure_chunks_small_enough"):
+            chunks = await self.async_ensure_chunks_small_enough(chunks)
+        chunks = self._combine_chunks(chunks)
         chunks = self.add_context(chunks, num_words_overlap)
         return self._add_metadata(chunks)
 
-    async def async_ensure_chunks_small_enough(self, chunks):
+    async def async_ensure_chunks_small_enough(self, chunks, max_attempts_to_split: int = 6):
+        """Some splitting functions could get caught in an infinite loop so we need to set max_n attempts"""
         all_chunks_below_max = False
+        n_attempts = 0
         while True:
-            all_chunks_below_max = all(check_n_embeddings(chunk.text, self.chat_model) <= self.max_length for chunk in chunks)
+            all_chunks_below_max = all(self.count_tokens(chunk.text) <= self.max_length for chunk in chunks)
             if all_chunks_below_max:
                 break
             chunks = await self.async_split_large_chunks_down(chunks)
+            self.observer.count("split_iterations")
+            n_attempts += 1
+            if n_attempts >= max_attempts_to_split:
+                break
         return chunks
 
     async def async_split_large_chunks_down(self, nodes: List[TextNode]):
         """
-        Splits chunks that are too long into smaller chunks using the provided splitting function.
+        Splits chunks that are too long into smaller chunks using the provided splitting function. The chunks
+        which are too long are split concurrently, with at most `max_concurrency` splits running at once.
         """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def split(text: str) -> List[TextNode]:
+            async with semaphore:
+                return await self.splitting_function(text)  # type: ignore
+
+        texts = [node.text for node in nodes]
+        too_long = [self.count_tokens(text) > self.max_length for text in texts]
+        split_parts = iter(await asyncio.gather(*[split(text) for text, is_too_long in zip(texts, too_long) if is_too_long]))
         new_nodes = []
-        for node in nodes:
-            text = node.text
-            if check_n_embeddings(text, self.chat_model) > self.max_length:
-                split_parts = await self.splitting_function(text)  # type: ignore
-                new_nodes.extend(split_parts)
+        for text, is_too_long in zip(texts, too_long):
+            if is_too_long:
+                new_nodes.extend(next(split_parts))
             else:
-                new_nodes.append(TextNode(text=text))
+                new_nodes.append(text_node(text=text))
         return new_nodes
 
-    def _add_metadata(self, chunks: List[TextNode]) -> List[TextNode]:
+    def chunk_spans(self, text: str) -> ChunkSpans:
+        """Chunks text into spans of the text, without overlap."""
+        with self.observer.span("split"):
+            spans = ChunkSpans.from_nodes(text, self.split(text))
+        with self.observer.span("ensure_chunks_small_enough"):
+            spans = self.ensure_spans_small_enough(spans)
+        return self._combine_spans(spans)
+
+    async def achunk_spans(self, text: str) -> ChunkSpans:
+        with self.observer.span("split"):
+            spans = ChunkSpans.from_nodes(text, await self.asplit(text))
+        with self.observer.span("ensure_chunks_small_enough"):
+            spans = await self.async_ensure_spans_small_enough(spans)
+        return self._combine_spans(spans)
+
+    def ensure_spans_small_enough(self, spans: ChunkSpans, max_attempts_to_split: int = 6) -> ChunkSpans:
+        for _ in range(max_attempts_to_split):
+            too_long = self._find_long_spans(spans)
+            if not any(too_long):
+                break
+            split_parts = [self.splitting_function(spans.chunk_text(i)) for i, is_too_long in enumerate(too_long) if is_too_long]
+            spans = self._replace_long_spans(spans, too_long, split_parts)
+            self.observer.count("split_iterations")
+        return spans
+
+    async def async_ensure_spans_small_enough(self, spans: ChunkSpans, max_attempts_to_split: int = 6) -> ChunkSpans:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def split(text: str) -> List[TextNode]:
+            async with semaphore:
+                return await self.splitting_function(text)  # type: ignore
+
+        for _ in range(max_attempts_to_split):
+            too_long = self._find_long_spans(spans)
+            if not any(too_long):
+                break
+            split_parts = await asyncio.gather(*[split(spans.chunk_text(i)) for i, is_too_long in enumerate(too_long) if is_too_long])
+            spans = self._replace_long_spans(spans, too_long, split_parts)
+            self.observer.count("split_iterations")
+        return spans
+
+    def _find_long_spans(self, spans: ChunkSpans) -> List[bool]:
+        return [self.count_tokens(text) > self.max_length for text in spans.texts()]
+
+    def _replace_long_spans(self, spans: ChunkSpans, too_long: List[bool], split_parts: List[List[TextNode]]) -> ChunkSpans:
+        """Replaces every span which is too long by the spans of the nodes it was split into."""
+        new_spans = ChunkSpans(spans.text)
+        parts = iter(split_parts)
+        for (start, end), is_too_long in zip(spans, too_long):
+            if is_too_long:
+                new_spans.extend(ChunkSpans.from_nodes(spans.text, next(parts), start, end))
+            else:
+                new_spans.append(start, end)
+        return new_spans
+
+    def _combine_spans(self, spans: ChunkSpans) -> ChunkSpans:
+        if self.packing is not None:
+            with self.observer.span("pack"):
+                return self.pack_spans(spans)
+        with self.observer.span("ensure_chunks_large_enough"):
+            return self.ensure_spans_large_enough(spans)
+
+    def pack_spans(self, spans: ChunkSpans) -> ChunkSpans:
+        """
+        Packs the spans into spans within the length limits. A packed span runs from the start of its first span to
+        the end of its last one, so each span is counted together with the text up to the next span.
+        """
+        next_starts = list(spans.starts[1:]) + [spans.ends[-1]] if len(spans) else []
+        packing = self._pack([self.count_tokens(spans.text[start:next_start]) for start, next_start in zip(spans.starts, next_starts)])
+        return ChunkSpans(spans.text, [spans.starts[first] for first, _ in packing.ranges], [spans.ends[last - 1] for _, last in packing.ranges])
+
+    def _pack(self, token_counts: List[int]) -> Packing:
+        packing = pack(token_counts, self.min_length, self.max_length, self.packing or "greedy")
+        if packing.oversized:
+            logger.warning(
+                "%d pieces are above %d tokens and could not be split further: %s",
+                len(packing.oversized),
+                self.max_length,
+                [token_counts[i] for i in packing.oversized],
+            )
+        self.observer.count("oversized_pieces", len(packing.oversized))
+        self.observer.count("undersized_chunks", len(packing.undersized))
+        return packing
+
+    def ensure_spans_large_enough(self, spans: ChunkSpans) -> ChunkSpans:
+        while len(spans) > 1 and any(self.count_tokens(text) < self.min_length for text in spans.texts()):
+            spans = self.combine_short_spans(spans)
+            self.observer.count("merge_iterations")
+        return spans
+
+    def combine_short_spans(self, spans: ChunkSpans) -> ChunkSpans:
+        """
+        Combines spans that are too short into the previous span, in the same way as `combine_short_chunks`. A
+        combined span runs from the start of its first span to the end of its last one.
+        """
+        result = ChunkSpans(spans.text)
+        buffer_start = buffer_end = -1
+        buffer_tokens = self.token_counter.incremental()
+        for start, end in spans:
+            if self.count_tokens(spans.text[start:end]) < self.min_length or buffer_tokens.count < self.min_length:
+                # the buffer grows by the text between the spans as well as the span itself
+                buffer_tokens.append(spans.text[start if buffer_start == -1 else buffer_end : end])
+                buffer_start = start if buffer_start == -1 else buffer_start
+                buffer_end = end
+                continue
+            if buffer_start != -1:
+                if len(result):
+                    result.ends[-1] = buffer_end
+                else:
+                    result.append(buffer_start, buffer_end)
+                buffer_start = buffer_end = -1
+                buffer_tokens = self.token_counter.incremental()
+            result.append(start, end)
+        if buffer_start != -1:
+            if len(result):
+                result.ends[-1] = buffer_end
+            else:
+                result.append(buffer_start, buffer_end)
+        return result
+
+    def _finish_stream_nodes(self, nodes: List[TextNode], first_chunk_number: int) -> List[TextNode]:
+        return self._add_metadata(nodes, first_chunk_number)
+
+    def _add_metadata(self, chunks: List[TextNode], first_chunk_number: int = 0) -> List[TextNode]:
+        with self.observer.span("language_detection"):
+            languages = self.language_detector.detect_many([chunk.text for chunk in chunks])
+        self.observer.count("chunks", len(chunks))
         return [
-            TextNode(text=chunk.text, metadata=ChunkMeta(chunk_number=i, length=len(chunk.text), lang=langdetect.detect(chunk.text)).model_dump())
-            for i, chunk in enumerate(chunks)
+            text_node(
+                text=chunk.text,
+                metadata=ChunkMeta(chunk_number=i, length=len(chunk.text), lang=lang).model_dump(),
+                start_char_idx=chunk.start_char_idx,
+                end_char_idx=chunk.end_char_idx,
+            )
+            for i, (chunk, lang) in enumerate(zip(chunks, languages), first_chunk_number)
         ]
 
 
@@ -181,14 +494,14 @@ class Chunks(BaseModel):
     chunks: List[str]
     metas: List[ChunkMeta]
 
+    def order(self) -> List[int]:
+        """Indices of the chunks sorted by chunk number."""
+        # sorted is stable, so chunks with the same number keep their order
+        return sorted(range(len(self.chunks)), key=lambda i: self.metas[i].chunk_number)
+
     def order_chunks(self):
         """Orders chunks based on their chunk number metadata."""
-        combined_meta_and_chunk = [{meta.chunk_number: chunk} for meta, chunk in zip(self.metas, self.chunks)]
-        # sort the dictionaries based on the chunk number key
-        sorted_meta_and_chunk = sorted(combined_meta_and_chunk, key=lambda x: next(iter(x)))
-        # get the chuynk strings out of the sorted dictionaries
-        ordered_chunks = [list(entry.values())[0] for entry in sorted_meta_and_chunk]
-        return ordered_chunks
+        return [self.chunks[i] for i in self.order()]
 
     def join_chunks(self, chunks: List[str]) -> str:
         return "\n\n\n\n".join([f"[...] {chunk} [...]" for chunk in chunks])
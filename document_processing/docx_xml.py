@@ -0,0 +1,167 @@
+"""
+Extracts text from a .docx file by stream parsing `word/document.xml` in a single pass, instead of building the
+python-docx object model. Each top level paragraph or table is turned into text as soon as it has been parsed
+and then dropped, so memory is bounded by the largest single block rather than the document. The output is the
+same as `WordDocXFileProcessor`'s python-docx based extraction.
+"""
+
+import zipfile
+from typing import IO, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from lxml import etree
+
+W_NAMESPACE = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+W_BODY = f"{{{W_NAMESPACE}}}body"
+W_P = f"{{{W_NAMESPACE}}}p"
+W_TBL = f"{{{W_NAMESPACE}}}tbl"
+W_TR = f"{{{W_NAMESPACE}}}tr"
+W_TC = f"{{{W_NAMESPACE}}}tc"
+W_R = f"{{{W_NAMESPACE}}}r"
+W_HYPERLINK = f"{{{W_NAMESPACE}}}hyperlink"
+W_T = f"{{{W_NAMESPACE}}}t"
+W_TAB = f"{{{W_NAMESPACE}}}tab"
+W_PTAB = f"{{{W_NAMESPACE}}}ptab"
+W_BR = f"{{{W_NAMESPACE}}}br"
+W_CR = f"{{{W_NAMESPACE}}}cr"
+W_NO_BREAK_HYPHEN = f"{{{W_NAMESPACE}}}noBreakHyphen"
+W_TC_PR = f"{{{W_NAMESPACE}}}tcPr"
+W_TR_PR = f"{{{W_NAMESPACE}}}trPr"
+W_GRID_SPAN = f"{{{W_NAMESPACE}}}gridSpan"
+W_GRID_BEFORE = f"{{{W_NAMESPACE}}}gridBefore"
+W_V_MERGE = f"{{{W_NAMESPACE}}}vMerge"
+W_VAL = f"{{{W_NAMESPACE}}}val"
+W_TYPE = f"{{{W_NAMESPACE}}}type"
+
+DOCUMENT_PART = "word/document.xml"
+
+# text equivalents of the run content elements, matching python-docx
+RUN_CONTENT_TEXT = {W_TAB: "\t", W_PTAB: "\t", W_CR: "\n", W_NO_BREAK_HYPHEN: "-"}
+
+
+class DocxBlock(NamedTuple):
+    kind: str  # "paragraph" or "table"
+    text: str
+
+
+# the text of a cell and how many grid columns it fills in its row
+_RowCell = Tuple[str, int]
+
+
+def iter_docx_blocks(source: Union[str, IO[bytes]], target_column: Optional[int] = None) -> Iterator[DocxBlock]:
+    """Yields the text of each paragraph and table directly in the document body, in document order."""
+    with zipfile.ZipFile(source) as package:
+        with package.open(DOCUMENT_PART) as document_xml:
+            depth = 0
+            in_body = False
+            for event, element in etree.iterparse(document_xml, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 2 and element.tag == W_BODY:
+                        in_body = True
+                    continue
+                depth -= 1
+                if depth != 2 or not in_body:
+                    continue
+                if element.tag == W_P:
+                    yield DocxBlock("paragraph", paragraph_text(element))
+                elif element.tag == W_TBL:
+                    yield DocxBlock("table", table_text(element, target_column))
+                # the block is done with, drop it and everything before it so the parsed tree does not grow
+                element.clear()
+                parent = element.getparent()
+                while element.getprevious() is not None:
+                    del parent[0]
+
+
+def extract_docx_text(source: Union[str, IO[bytes]], target_column: Optional[int] = None) -> str:
+    return "".join("\n" + block.text for block in iter_docx_blocks(source, target_column))
+
+
+def run_text(run) -> str:
+    parts = []
+    for child in run:
+        if child.tag == W_T:
+            parts.append(child.text or "")
+        elif child.tag == W_BR:
+            parts.append("\n" if child.get(W_TYPE, "textWrapping") == "textWrapping" else "")
+        else:
+            parts.append(RUN_CONTENT_TEXT.get(child.tag, ""))
+    return "".join(parts)
+
+
+def paragraph_text(paragraph) -> str:
+    parts = []
+    for child in paragraph:
+        if child.tag == W_R:
+            parts.append(run_text(child))
+        elif child.tag == W_HYPERLINK:
+            parts.extend(run_text(run) for run in child if run.tag == W_R)
+    return "".join(parts)
+
+
+def table_text(table, target_column: Optional[int] = None) -> str:
+    rows = table_rows(table)
+    if target_column is not None:
+        return _specific_column(rows, target_column)
+    return _markdown(rows)
+
+
+def table_rows(table) -> List[List[str]]:
+    """
+    The cell texts of every row in the table, with a cell repeated once for every grid column it spans and vertically
+    merged cells taking the text of the cell they continue, like python-docx's `_Row.cells`.
+    """
+    rows: List[List[str]] = []
+    previous_row: Optional[Dict[int, _RowCell]] = None
+    for row in table:
+        if row.tag != W_TR:
+            continue
+        cells_by_offset: Dict[int, _RowCell] = {}
+        grid_offset = _grid_before(row)
+        cells: List[str] = []
+        for cell in row:
+            if cell.tag != W_TC:
+                continue
+            properties = cell.find(W_TC_PR)
+            grid_span = _int_val(properties.find(W_GRID_SPAN) if properties is not None else None, 1)
+            v_merge = properties.find(W_V_MERGE) if properties is not None else None
+            if v_merge is not None and v_merge.get(W_VAL, "continue") == "continue":
+                if previous_row is None:
+                    raise ValueError("no tr above topmost tr in w:tbl")
+                if grid_offset not in previous_row:
+                    raise ValueError(f"no `tc` element at grid_offset={grid_offset}")
+                row_cell = previous_row[grid_offset]
+            else:
+                row_cell = ("\n".join(paragraph_text(paragraph) for paragraph in cell if paragraph.tag == W_P), grid_span)
+            cells_by_offset[grid_offset] = row_cell
+            cells.extend([row_cell[0]] * row_cell[1])
+            grid_offset += grid_span
+        rows.append(cells)
+        previous_row = cells_by_offset
+    return rows
+
+
+def _grid_before(row) -> int:
+    properties = row.find(W_TR_PR)
+    return _int_val(properties.find(W_GRID_BEFORE) if properties is not None else None, 0)
+
+
+def _int_val(element, default: int) -> int:
+    if element is None:
+        return default
+    return int(element.get(W_VAL, default))
+
+
+def _specific_column(rows: List[List[str]], target_column: int) -> str:
+    return "".join(cells[0] if len(cells) == 1 else cells[target_column] for cells in rows)
+
+
+def _markdown(rows: List[List[str]]) -> str:
+    lines = []
+    for i, cells in enumerate(rows):
+        if cells:
+            lines.append("".join(f"| {cell} " for cell in cells) + "|\n")
+        if i == 0:
+            lines.append("| --- " * len(cells) + "|\n")
+    return "".join(lines)
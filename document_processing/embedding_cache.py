@@ -0,0 +1,155 @@
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr, SerializeAsAny
+
+from document_processing.cache import DiskCache, hash_text, make_key
+
+
+@dataclass
+class EmbeddingCacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Wraps an embedding model and caches its embeddings by the hash of the text and the model name, first in
+    an in-memory LRU of `max_memory_entries` embeddings and then, if a `DiskCache` is given, on disk so they
+    survive across runs. Only the texts missing from both are sent to the wrapped model, `embed_batch_size`
+    texts at a time.
+    """
+
+    embed_model: SerializeAsAny[BaseEmbedding]
+    max_memory_entries: int = 10_000
+    _disk_cache: Optional[DiskCache] = PrivateAttr(default=None)
+    _memory_cache: "OrderedDict[str, List[float]]" = PrivateAttr(default_factory=OrderedDict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _stats: EmbeddingCacheStats = PrivateAttr(default_factory=EmbeddingCacheStats)
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        cache: Optional[DiskCache] = None,
+        embed_batch_size: Optional[int] = None,
+        max_memory_entries: int = 10_000,
+        **kwargs: Any,
+    ):
+        super().__init__(
+            embed_model=embed_model,
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_batch_size or embed_model.embed_batch_size,
+            max_memory_entries=max_memory_entries,
+            **kwargs,
+        )
+        self._disk_cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def __getstate__(self) -> Dict[Any, Any]:
+        # the lock cannot be pickled, e.g. when the chunker is sent to worker processes
+        state = super().__getstate__()
+        state["__pydantic_private__"] = {**state["__pydantic_private__"], "_lock": None, "_memory_cache": OrderedDict()}
+        return state
+
+    def __setstate__(self, state: Dict[Any, Any]):
+        super().__setstate__(state)
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> EmbeddingCacheStats:
+        with self._lock:
+            return EmbeddingCacheStats(self._stats.memory_hits, self._stats.disk_hits, self._stats.misses)
+
+    def _key(self, kind: str, text: str) -> str:
+        return make_key("embedding", kind, self.embed_model.model_name, getattr(self.embed_model, "dimensions", None), hash_text(text))
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            embedding = self._memory_cache.get(key)
+            if embedding is not None:
+                self._memory_cache.move_to_end(key)
+                self._stats.memory_hits += 1
+                return embedding
+        if self._disk_cache is not None:
+            value = self._disk_cache.get(key)
+            if value is not None:
+                embedding = array("d", value).tolist()
+                self._remember(key, embedding)
+                with self._lock:
+                    self._stats.disk_hits += 1
+                return embedding
+        with self._lock:
+            self._stats.misses += 1
+        return None
+
+    def _remember(self, key: str, embedding: List[float]):
+        with self._lock:
+            self._memory_cache[key] = embedding
+            self._memory_cache.move_to_end(key)
+            while len(self._memory_cache) > self.max_memory_entries:
+                self._memory_cache.popitem(last=False)
+
+    def _store(self, key: str, embedding: List[float]):
+        self._remember(key, embedding)
+        if self._disk_cache is not None:
+            self._disk_cache.set(key, array("d", embedding).tobytes())
+
+    def _find_missing(self, kind: str, texts: List[str]):
+        keys = [self._key(kind, text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+            embedding = self._lookup(key)
+            if embedding is None:
+                missing[key] = text
+            else:
+                found[key] = embedding
+        return keys, found, missing
+
+    def _embed_cached(self, kind: str, texts: List[str], embed: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        keys, found, missing = self._find_missing(kind, texts)
+        if missing:
+            for key, embedding in zip(missing, embed(list(missing.values()))):
+                self._store(key, embedding)
+                found[key] = embedding
+        return [found[key] for key in keys]
+
+    async def _aembed_cached(self, kind: str, texts: List[str], embed: Callable[[List[str]], Awaitable[List[List[float]]]]) -> List[List[float]]:
+        keys, found, missing = self._find_missing(kind, texts)
+        if missing:
+            for key, embedding in zip(missing, await embed(list(missing.values()))):
+                self._store(key, embedding)
+                found[key] = embedding
+        return [found[key] for key in keys]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        # called by get_text_embedding_batch with at most `embed_batch_size` texts
+        return self._embed_cached("text", texts, self.embed_model._get_text_embeddings)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self._aembed_cached("text", texts, self.embed_model._aget_text_embeddings)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed_cached("query", [query], lambda queries: [self.embed_model._get_query_embedding(queries[0])])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        async def embed(queries: List[str]) -> List[List[float]]:
+            return [await self.embed_model._aget_query_embedding(queries[0])]
+
+        return (await self._aembed_cached("query", [query], embed))[0]
@@ -1,7 +1,135 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional
+
 import tiktoken
 
 
-def check_n_embeddings(text: str, embedding_model_name: str) -> int:
-    encoding = tiktoken.encoding_for_model(embedding_model_name)
-    return len(encoding.encode(text))
+@lru_cache(maxsize=None)
+def get_encoding(model_name: str) -> tiktoken.Encoding:
+    """Returns the tiktoken encoding for a model. Loaded once per model and reused afterwards."""
+    return tiktoken.encoding_for_model(model_name)
+
+
+@dataclass
+class TokenCounterStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class TokenCounter:
+    """
+    Counts tokens for a model, memoizing the counts by text content. The memo is an LRU cache bounded
+    by `max_cache_size` entries so it can be shared across documents without growing forever.
+    """
+
+    def __init__(self, model_name: str, max_cache_size: int = 10_000, encoding: Optional[tiktoken.Encoding] = None):
+        self.model_name = model_name
+        self.max_cache_size = max_cache_size
+        self._encoding = encoding
+        self._cache: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = TokenCounterStats()
+
+    @property
+    def encoding(self) -> tiktoken.Encoding:
+        # loaded on first use, creating a counter should not require the encoding files
+        if self._encoding is None:
+            self._encoding = get_encoding(self.model_name)
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        with self._lock:
+            n_tokens = self._cache.get(text)
+            if n_tokens is not None:
+                self._cache.move_to_end(text)
+                self._stats.hits += 1
+                return n_tokens
+            self._stats.misses += 1
+
+        n_tokens = len(self.encoding.encode(text))
+
+        with self._lock:
+            self._cache[text] = n_tokens
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.max_cache_size:
+                self._cache.popitem(last=False)
+                self._stats.evictions += 1
+        return n_tokens
+
+    def incremental(self, text: str = "") -> "IncrementalTokenCount":
+        """Returns a running token count which can be appended to without re-encoding the whole text."""
+        return IncrementalTokenCount(self.encoding, text)
+
+    @property
+    def stats(self) -> TokenCounterStats:
+        with self._lock:
+            return TokenCounterStats(hits=self._stats.hits, misses=self._stats.misses, evictions=self._stats.evictions, size=len(self._cache))
 
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._stats = TokenCounterStats()
+
+
+class IncrementalTokenCount:
+    """
+    Keeps the token count of a growing string. tiktoken first splits text into pieces with a regex and then
+    encodes every piece on its own. In the patterns of the OpenAI encodings a space only ever starts a piece or
+    is part of a run of whitespace, so a space after any other character is a piece boundary which text appended
+    later cannot move. Everything before the last such boundary is counted once and never encoded again.
+    """
+
+    def __init__(self, encoding: tiktoken.Encoding, text: str = ""):
+        self.encoding = encoding
+        self._committed_text_length = 0
+        self._committed_count = 0
+        self._tail = ""
+        self._tail_count = 0
+        if text:
+            self.append(text)
+
+    def append(self, text: str) -> int:
+        self._tail += text
+        split_at = self._tail.rfind(" ")
+        # the prefix must end in a character which is not whitespace, or it would be split differently on its own
+        while split_at > 0 and self._tail[split_at - 1].isspace():
+            split_at = self._tail.rfind(" ", 0, split_at)
+        if split_at > 0:
+            self._committed_count += len(self.encoding.encode_ordinary(self._tail[:split_at]))
+            self._committed_text_length += split_at
+            self._tail = self._tail[split_at:]
+        self._tail_count = len(self.encoding.encode_ordinary(self._tail))
+        return self.count
+
+    @property
+    def count(self) -> int:
+        return self._committed_count + self._tail_count
+
+    def __len__(self) -> int:
+        return self._committed_text_length + len(self._tail)
+
+
+_token_counters: Dict[str, TokenCounter] = {}
+_token_counters_lock = threading.Lock()
+
+
+def get_token_counter(model_name: str) -> TokenCounter:
+    """Returns the token counter shared by everything counting tokens for this model."""
+    with _token_counters_lock:
+        if model_name not in _token_counters:
+            _token_counters[model_name] = TokenCounter(model_name)
+        return _token_counters[model_name]
+
+
+def check_n_embeddings(text: str, embedding_model_name: str) -> int:
+    return get_token_counter(embedding_model_name).count(text)
@@ -1,13 +1,109 @@
+"""
+Chooses the file processor for a file from its extension. Processors are registered by import path and only imported
+the first time a file of their type is processed, so importing the factory does not load pymupdf or python-docx.
+Other packages can add file types with `register_file_processor`, or through the `document_processing.file_processors`
+entry point group, named after the extension and pointing at the processor class. Documents given in memory, or paths
+with `sniff=True`, are matched by the magic bytes at the start of the document instead. Sniffing reads a stream which
+cannot seek, so `sniff_file_processor` returns its contents along with the processor.
+"""
+
+import importlib
+from importlib.metadata import entry_points
 from pathlib import Path
-from typing import Type
+from typing import TYPE_CHECKING, Dict, Iterator, Mapping, Optional, Tuple, Type, Union
+
+from document_processing.sources import (
+    DocumentSource,
+    is_path,
+    is_seekable,
+    sniff_file_type,
+)
+
+if TYPE_CHECKING:
+    from document_processing.base import BaseFileProcessor
+
+ENTRY_POINT_GROUP = "document_processing.file_processors"
+
+# a processor class, or the "module:Class" path to import it from
+ProcessorReference = Union[str, Type["BaseFileProcessor"]]
+
+
+class FileProcessorRegistry(Mapping[str, Type["BaseFileProcessor"]]):
+    """Maps file extensions (without the dot) to processor classes, importing each class on first lookup."""
+
+    def __init__(self):
+        self._processors: Dict[str, ProcessorReference] = {}
+        self._entry_points_loaded = False
+
+    def register(self, file_type: str, processor: ProcessorReference):
+        self._processors[_normalise(file_type)] = processor
+
+    def __getitem__(self, file_type: str) -> Type["BaseFileProcessor"]:
+        file_type = _normalise(file_type)
+        if file_type not in self._processors:
+            self._load_entry_points()
+        processor = self._processors[file_type]
+        if isinstance(processor, str):
+            module_name, _, class_name = processor.partition(":")
+            processor = getattr(importlib.import_module(module_name), class_name)
+            self._processors[file_type] = processor
+        return processor
+
+    def __iter__(self) -> Iterator[str]:
+        self._load_entry_points()
+        return iter(self._processors)
+
+    def __len__(self) -> int:
+        self._load_entry_points()
+        return len(self._processors)
+
+    def _load_entry_points(self):
+        if self._entry_points_loaded:
+            return
+        self._entry_points_loaded = True
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            # processors registered in code take precedence over installed plugins
+            self._processors.setdefault(_normalise(entry_point.name), entry_point.value)
+
+
+def _normalise(file_type: str) -> str:
+    return file_type.lower().lstrip(".")
+
+
+file_type_processors = FileProcessorRegistry()
+file_type_processors.register("pdf", "document_processing.pdfs:PdfProcessor")
+file_type_processors.register("docx", "document_processing.word_docs:WordDocXFileProcessor")
+
+
+def register_file_processor(file_type: str, processor: ProcessorReference):
+    """Registers a processor class, or its "module:Class" import path, for files with the extension."""
+    file_type_processors.register(file_type, processor)
+
+
+def file_processor_factory(file_path: DocumentSource, sniff: bool = False) -> Type["BaseFileProcessor"]:
+    """
+    The processor for a document. Paths are matched by their extension, unless `sniff` is set, and documents given in
+    memory, e.g. as bytes or a file-like object, by the magic bytes they start with.
+    """
+    if is_path(file_path) and not sniff:
+        return file_type_processors[Path(file_path).suffix[1:]]  # type: ignore[arg-type]
+    if not is_seekable(file_path):
+        raise ValueError("detecting the type of a stream which cannot seek would use it up, use sniff_file_processor instead")
+    return _processor_for_type(sniff_file_type(file_path)[0])
 
-from document_processing.base import BaseFileProcessor
-from document_processing.pdfs import PdfProcessor
-from document_processing.word_docs import WordDocXFileProcessor
 
-file_type_processors = {"pdf": PdfProcessor, "docx": WordDocXFileProcessor}
+def sniff_file_processor(file_path: DocumentSource, sniff: bool = False) -> Tuple[Type["BaseFileProcessor"], DocumentSource]:
+    """
+    The processor for a document like `file_processor_factory`, and the source to give it. A stream which cannot seek,
+    e.g. a network response, is read once to detect its type, so the processor has to be given the buffer it was read into.
+    """
+    if is_path(file_path) and not sniff:
+        return file_processor_factory(file_path), file_path
+    file_type, source = sniff_file_type(file_path)
+    return _processor_for_type(file_type), source
 
 
-def file_processor_factory(file_path: str) -> Type[BaseFileProcessor]:
-    file_type = Path(file_path).suffix[1:]
+def _processor_for_type(file_type: Optional[str]) -> Type["BaseFileProcessor"]:
+    if file_type is None or file_type not in file_type_processors:
+        raise ValueError(f"could not find a file processor for a document of type {file_type or 'unknown'}")
     return file_type_processors[file_type]
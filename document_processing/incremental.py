@@ -0,0 +1,252 @@
+"""
+Re-processes a new revision of a document against the manifest of the previous run. The document is compared unit by
+unit, pages for PDFs and paragraphs and tables for Word documents, by the hash of each unit. Chunks lying in unchanged
+units are kept as they are and only the text around the changed units is chunked again. The result says which chunks
+are unchanged, added or removed, so an index only has to embed and store the chunks which changed.
+
+The chunks are close to, but not always the same as, those of chunking the whole new revision. Each changed region
+is chunked with the kept chunks next to it and widened until those come out as they were kept, so the region starts
+and ends where a full run would, but combining short chunks and optimal packing look at the whole text and can still
+place a boundary inside the region differently. Greedy packing and combining short chunks rarely differ, optimal
+packing more often, as its target chunk size depends on the length of the whole text.
+
+Chunk ids are hashes of the chunk text, overlap included, so a chunk whose overlap changed because its neighbour did
+counts as removed and added again. The chunker must return chunks which are slices of the text, such as the
+`SemanticChunker` or a `FunctionChunker` with `use_spans=True`.
+"""
+
+import json
+import os
+from bisect import bisect_right
+from dataclasses import asdict, dataclass, field
+from difflib import SequenceMatcher
+from itertools import accumulate
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple, Union
+
+from document_processing.base import BaseFileProcessor
+from document_processing.cache import hash_text, make_key
+from document_processing.spans import ChunkSpans
+
+if TYPE_CHECKING:
+    from llama_index.core.schema import TextNode
+
+
+@dataclass
+class ChunkRecord:
+    chunk_id: str
+    # offsets of the chunk, without overlap, in the text of the document
+    start: int
+    end: int
+    # metadata set by the chunker, other than the chunk number and length
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Manifest:
+    # the chunker settings and overlap the chunks were made with
+    config_key: str
+    unit_hashes: List[str]
+    unit_lengths: List[int]
+    chunks: List[ChunkRecord]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Manifest":
+        return cls(data["config_key"], data["unit_hashes"], data["unit_lengths"], [ChunkRecord(**chunk) for chunk in data["chunks"]])
+
+    def save(self, path: Union[str, os.PathLike]):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: Union[str, os.PathLike]) -> "Manifest":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+@dataclass
+class ChunkDiff:
+    unchanged: List[str] = field(default_factory=list)
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+
+@dataclass
+class IncrementalResult:
+    # every chunk of the new revision, with the chunk id as node id
+    nodes: List["TextNode"]
+    manifest: Manifest
+    diff: ChunkDiff
+    # how many characters of the document were chunked again, counting every region chunked while widening it
+    rechunked_chars: int
+
+
+def process_incrementally(
+    processor: BaseFileProcessor, num_words_overlap: int, previous: Optional[Manifest] = None, context_chunks: int = 1
+) -> IncrementalResult:
+    """
+    Extracts and chunks the document of the processor, reusing the chunks of the `previous` manifest which lie in
+    unchanged units. The `context_chunks` kept chunks on either side of every changed region are chunked again with
+    it, so chunks at the edges of the region can be combined across it, and more are dropped while the chunks at the
+    edges of the region do not come out as kept. The result can still differ from chunking the whole document, see the
+    module docstring. Without a previous manifest, or when the chunker settings changed or cannot be identified (see
+    `BaseChunker.cache_config`), the whole document is chunked.
+    """
+    units = list(processor.iter_units())
+    text = "".join(units)
+    unit_starts = [0, *accumulate(len(unit) for unit in units)]
+    unit_hashes = [hash_text(unit) for unit in units]
+    config = processor.chunker.cache_config()
+    # without an identity for the chunker settings there is no telling whether they changed
+    config_key = make_key("incremental", config, num_words_overlap) if config is not None else ""
+
+    old_chunks: List[ChunkRecord] = []
+    # kept chunks and how far they moved, and the gaps between the previous chunks which are chunked again
+    kept: Dict[int, int] = {}
+    changed_gaps: Set[int] = {0}
+    if previous is not None and config_key and previous.config_key == config_key:
+        old_chunks = previous.chunks
+        kept, changed_gaps = _kept_chunks(previous, unit_hashes, unit_starts, context_chunks)
+
+    # regions chunked again so far, by their offsets, as a kept chunk next to a region can turn out to be wrong
+    chunked_regions: Dict[Tuple[int, int], List[ChunkRecord]] = {}
+    while True:
+        records = _stitch(processor, text, old_chunks, kept, changed_gaps, chunked_regions)
+        if records is not None:
+            break
+    rechunked_chars = sum(end - start for start, end in chunked_regions)
+
+    nodes = _to_nodes(processor, text, records, num_words_overlap)
+    manifest = Manifest(config_key, unit_hashes, [len(unit) for unit in units], records)
+    previous_ids = [record.chunk_id for record in previous.chunks] if previous is not None else []
+    return IncrementalResult(nodes, manifest, _diff(previous_ids, [record.chunk_id for record in records]), rechunked_chars)
+
+
+def _stitch(
+    processor: BaseFileProcessor,
+    text: str,
+    old_chunks: List[ChunkRecord],
+    kept: Dict[int, int],
+    changed_gaps: Set[int],
+    chunked_regions: Dict[Tuple[int, int], List[ChunkRecord]],
+) -> Optional[List[ChunkRecord]]:
+    """
+    The kept chunks and the chunks of the text between them which changed. Every changed region is chunked together
+    with the kept chunk on either side of it, and only used if those come out as they were kept, so the region
+    starts and ends where chunking the whole text would. Otherwise kept chunks on that side are dropped, doubling
+    the region, and None is returned to stitch the chunks again.
+    """
+    records: List[ChunkRecord] = []
+    # the kept chunks in order, between a chunk before the start and one after the end of the document
+    kept_order = [-1, *sorted(kept), len(old_chunks)]
+    for position, (before, after) in enumerate(zip(kept_order, kept_order[1:])):
+        first = _moved(old_chunks[before], kept[before]) if before != -1 else None
+        last = _moved(old_chunks[after], kept[after]) if after < len(old_chunks) else None
+        gap_start = first.end if first is not None else 0
+        gap_end = last.start if last is not None else len(text)
+        # gap i is between the previous chunks i - 1 and i
+        if (after == before + 1 and after not in changed_gaps) or not text[gap_start:gap_end].strip():
+            records.extend([first] if first is not None else [])
+            continue
+        region = (first.start if first is not None else 0, last.end if last is not None else len(text))
+        if region not in chunked_regions:
+            chunked_regions[region] = _chunk_region(processor, text, *region)
+        region_records = chunked_regions[region]
+        # as many kept chunks as the region spans are dropped, so a region which keeps growing doubles each time
+        width = max(after - before - 1, 1)
+        if first is not None and not _same_span(region_records[0], first):
+            for i in kept_order[max(position + 1 - width, 1) : position + 1]:
+                del kept[i]
+            return None
+        if last is not None and not _same_span(region_records[-1], last):
+            for i in kept_order[position + 1 : position + 1 + width]:
+                if i < len(old_chunks):
+                    del kept[i]
+            return None
+        # the kept chunks keep their metadata, e.g. the detected language, and `last` is added by the next gap
+        records.extend([first, *region_records[1:]] if first is not None else region_records)
+        if last is not None:
+            records.pop()
+    return records
+
+
+def _moved(record: ChunkRecord, shift: int) -> ChunkRecord:
+    return ChunkRecord("", record.start + shift, record.end + shift, record.metadata)
+
+
+def _same_span(record: ChunkRecord, other: ChunkRecord) -> bool:
+    return (record.start, record.end) == (other.start, other.end)
+
+
+def _kept_chunks(previous: Manifest, unit_hashes: List[str], unit_starts: List[int], context_chunks: int) -> Tuple[Dict[int, int], Set[int]]:
+    """
+    The previous chunks lying in unchanged units, mapped to how far they moved in the new text, and the gaps between
+    the previous chunks whose text changed.
+    """
+    old_starts = [0, *accumulate(previous.unit_lengths)]
+    matcher = SequenceMatcher(None, previous.unit_hashes, unit_hashes, autojunk=False)
+    # [start, end) of every run of unchanged units in the previous text, and how far it moved
+    blocks = [(old_starts[a], old_starts[a + size], unit_starts[b] - old_starts[a]) for a, b, size in matcher.get_matching_blocks() if size]
+    block_starts = [start for start, _, _ in blocks]
+
+    def shift(start: int, end: int) -> Optional[int]:
+        i = bisect_right(block_starts, start) - 1
+        if i >= 0 and end <= blocks[i][1]:
+            return blocks[i][2]
+        return None
+
+    shifts = [shift(chunk.start, chunk.end) for chunk in previous.chunks]
+    kept = {i: chunk_shift for i, chunk_shift in enumerate(shifts) if chunk_shift is not None}
+    # the text between two kept chunks may have changed too, e.g. when a page without chunks was removed
+    old_gaps = [(0, 0), *((chunk.start, chunk.end) for chunk in previous.chunks), (old_starts[-1], old_starts[-1])]
+    new_end = unit_starts[-1]
+    changed: Set[int] = set()
+    for i in range(len(previous.chunks) + 1):
+        gap_start, gap_end = old_gaps[i][1], old_gaps[i + 1][0]
+        gap_shift = shift(gap_start, gap_end)
+        before = 0 if i == 0 else kept.get(i - 1)
+        after = new_end - old_starts[-1] if i == len(previous.chunks) else kept.get(i)
+        if gap_shift is None or before != gap_shift or after != gap_shift:
+            changed.add(i)
+    dirty = {i for gap in changed for i in range(gap - context_chunks, gap + context_chunks)}
+    return {i: chunk_shift for i, chunk_shift in kept.items() if i not in dirty}, changed
+
+
+def _chunk_region(processor: BaseFileProcessor, text: str, start: int, end: int) -> List[ChunkRecord]:
+    nodes = processor.chunk(text[start:end], 0)
+    if all(node.start_char_idx is not None for node in nodes):
+        offsets: List[Tuple[int, int]] = [(node.start_char_idx, node.end_char_idx) for node in nodes]  # type: ignore
+    else:
+        offsets = list(ChunkSpans.from_nodes(text[start:end], nodes))
+    return [
+        ChunkRecord(
+            "", start + chunk_start, start + chunk_end, {key: value for key, value in node.metadata.items() if key not in ("chunk_number", "length")}
+        )
+        for node, (chunk_start, chunk_end) in zip(nodes, offsets)
+    ]
+
+
+def _to_nodes(processor: BaseFileProcessor, text: str, records: List[ChunkRecord], num_words_overlap: int) -> List["TextNode"]:
+    chunker = processor.chunker
+    spans = ChunkSpans(text, [record.start for record in records], [record.end for record in records])
+    nodes = spans.to_nodes(num_words_overlap, chunker.token_offsets(text) if num_words_overlap else None)
+    occurrences: Dict[str, int] = {}
+    for i, (node, record) in enumerate(zip(nodes, records)):
+        chunk_id = hash_text(node.text)
+        occurrences[chunk_id] = occurrences.get(chunk_id, 0) + 1
+        # the same text can appear more than once in a document
+        record.chunk_id = node.id_ = chunk_id if occurrences[chunk_id] == 1 else f"{chunk_id}-{occurrences[chunk_id]}"
+        if record.metadata:
+            node.metadata = {**record.metadata, "chunk_number": i, "length": len(node.text)}
+    return nodes
+
+
+def _diff(old_ids: List[str], new_ids: List[str]) -> ChunkDiff:
+    old, new = set(old_ids), set(new_ids)
+    return ChunkDiff(
+        unchanged=[chunk_id for chunk_id in new_ids if chunk_id in old],
+        added=[chunk_id for chunk_id in new_ids if chunk_id not in old],
+        removed=[chunk_id for chunk_id in old_ids if chunk_id not in new],
+    )
@@ -0,0 +1,206 @@
+"""
+Timing spans and counters emitted by the file processors and chunkers. By default they go to a no-op observer;
+set an `Observer` such as `MetricsAggregator` on a processor or chunker to collect them.
+"""
+
+import contextlib
+import functools
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+
+_current_document: ContextVar[Optional[str]] = ContextVar("current_document", default=None)
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+def current_document() -> Optional[str]:
+    """The document being processed in this thread or task, which spans and counters are attributed to."""
+    return _current_document.get()
+
+
+class Observer:
+    """
+    Receives the timing spans and counters of the pipeline. Subclasses set `enabled = True` and override `on_span`
+    and `on_count`. The base class is disabled, so `span` and `count` return straight away and cost next to nothing.
+    """
+
+    enabled: bool = False
+
+    def on_span(self, stage: str, seconds: float, document: Optional[str]):
+        pass
+
+    def on_count(self, counter: str, value: int, document: Optional[str]):
+        pass
+
+    def span(self, stage: str) -> ContextManager:
+        """Times the code run inside the context as the stage."""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Span(self, stage)
+
+    def count(self, counter: str, value: int = 1):
+        if self.enabled:
+            self.on_count(counter, value, _current_document.get())
+
+    def document(self, name: Optional[str]) -> ContextManager:
+        """Attributes the spans and counters emitted inside the context to the document."""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _DocumentContext(name)
+
+
+NULL_OBSERVER = Observer()
+
+
+class _Span:
+    __slots__ = ("observer", "stage", "start")
+
+    def __init__(self, observer: Observer, stage: str):
+        self.observer = observer
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.observer.on_span(self.stage, time.perf_counter() - self.start, _current_document.get())
+
+
+class _DocumentContext:
+    __slots__ = ("name", "token")
+
+    def __init__(self, name: Optional[str]):
+        self.name = name
+        self.token = None
+
+    def __enter__(self):
+        self.token = _current_document.set(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        _current_document.reset(self.token)
+
+
+def timed(stage: Optional[str] = None):
+    """Times every call of a file processor method as a span of the processor's document, named after the method by default."""
+
+    def decorator(method: Callable[..., Any]) -> Callable[..., Any]:
+        name = stage or method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            observer = self.observer
+            if not observer.enabled:
+                return method(self, *args, **kwargs)
+            with observer.document(self.document_name()), observer.span(name):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """The q-th percentile of sorted values, interpolating linearly between the closest ranks like NumPy does."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+@dataclass
+class TimingStats:
+    count: int
+    total: float
+    mean: float
+    p50: float
+    p90: float
+    p99: float
+    max: float
+
+    @classmethod
+    def from_values(cls, values: List[float]) -> "TimingStats":
+        values = sorted(values)
+        total = sum(values)
+        return cls(len(values), total, total / len(values), percentile(values, 50), percentile(values, 90), percentile(values, 99), values[-1])
+
+
+@dataclass
+class DocumentMetrics:
+    # total seconds spent in each stage
+    seconds: Dict[str, float] = field(default_factory=dict)
+    counters: Dict[str, int] = field(default_factory=dict)
+
+
+class MetricsAggregator(Observer):
+    """Collects every span and counter in memory and summarises them per stage and per document."""
+
+    enabled = True
+
+    def __init__(self):
+        self._spans: List[Tuple[str, float, Optional[str]]] = []
+        self._documents: Dict[Optional[str], DocumentMetrics] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the lock cannot be pickled, e.g. when the chunker is sent to worker processes
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def on_span(self, stage: str, seconds: float, document: Optional[str]):
+        with self._lock:
+            self._spans.append((stage, seconds, document))
+            metrics = self._documents.setdefault(document, DocumentMetrics())
+            metrics.seconds[stage] = metrics.seconds.get(stage, 0.0) + seconds
+
+    def on_count(self, counter: str, value: int, document: Optional[str]):
+        with self._lock:
+            metrics = self._documents.setdefault(document, DocumentMetrics())
+            metrics.counters[counter] = metrics.counters.get(counter, 0) + value
+
+    def stage_stats(self) -> Dict[str, TimingStats]:
+        """Statistics of the duration of every span of each stage."""
+        durations: Dict[str, List[float]] = {}
+        with self._lock:
+            for stage, seconds, _ in self._spans:
+                durations.setdefault(stage, []).append(seconds)
+        return {stage: TimingStats.from_values(values) for stage, values in durations.items()}
+
+    def document_stats(self) -> Dict[str, TimingStats]:
+        """Statistics over the documents of the total time each document spent in each stage."""
+        durations: Dict[str, List[float]] = {}
+        with self._lock:
+            for metrics in self._documents.values():
+                for stage, seconds in metrics.seconds.items():
+                    durations.setdefault(stage, []).append(seconds)
+        return {stage: TimingStats.from_values(values) for stage, values in durations.items()}
+
+    def documents(self) -> Dict[Optional[str], DocumentMetrics]:
+        with self._lock:
+            return {document: DocumentMetrics(dict(metrics.seconds), dict(metrics.counters)) for document, metrics in self._documents.items()}
+
+    def counters(self) -> Dict[str, int]:
+        """Every counter summed over all documents."""
+        totals: Dict[str, int] = {}
+        with self._lock:
+            for metrics in self._documents.values():
+                for counter, value in metrics.counters.items():
+                    totals[counter] = totals.get(counter, 0) + value
+        return totals
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+            self._documents.clear()
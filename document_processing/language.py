@@ -0,0 +1,172 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langdetect.detector_factory import (  # type: ignore
+    PROFILES_DIRECTORY,
+    DetectorFactory,
+)
+from langdetect.lang_detect_exception import LangDetectException  # type: ignore
+
+from document_processing.cache import hash_text
+
+UNKNOWN_LANGUAGE = "unknown"
+DEFAULT_SAMPLE_CHARS = 1000
+# fewer texts than this are always detected in this process, a process pool is not worth starting up
+MIN_TEXTS_FOR_PARALLEL = 64
+
+# (language, probability) pairs, most probable first
+LanguageProbabilities = List[Tuple[str, float]]
+
+
+class LanguageDetector:
+    """
+    Detects the language of texts with langdetect, looking only at the first `sample_chars` characters of each text.
+    Detection uses its own seeded langdetect factory, so the same text always gets the same language, and results
+    are cached by the hash of the sample in an LRU of `max_cache_size` entries.
+
+    With `per_document=True`, `detect_many` treats the texts as the chunks of one document: they get the language of
+    the whole document unless langdetect gives a chunk another language with at least `min_confidence` probability.
+    Chunks shorter than `min_chars_to_differ` always get the document language, langdetect is unreliable on them.
+    With `max_workers` above one, or None for one per CPU, large batches are detected in a process pool.
+    """
+
+    def __init__(
+        self,
+        sample_chars: int = DEFAULT_SAMPLE_CHARS,
+        seed: int = 0,
+        per_document: bool = False,
+        min_confidence: float = 0.9,
+        min_chars_to_differ: int = 50,
+        max_workers: Optional[int] = 1,
+        max_cache_size: int = 10_000,
+    ):
+        self.sample_chars = sample_chars
+        self.seed = seed
+        self.per_document = per_document
+        self.min_confidence = min_confidence
+        self.min_chars_to_differ = min_chars_to_differ
+        self.max_workers = max_workers
+        self.max_cache_size = max_cache_size
+        self._cache: "OrderedDict[str, LanguageProbabilities]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def model_name(self) -> str:
+        """Identifies the settings which change the detected languages, e.g. in the keys of cached chunks."""
+        mode = "document" if self.per_document else "chunk"
+        return f"langdetect-{mode}-seed{self.seed}-sample{self.sample_chars}-confidence{self.min_confidence}-chars{self.min_chars_to_differ}"
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the lock cannot be pickled, e.g. when the chunker is sent to worker processes
+        state = self.__dict__.copy()
+        state["_cache"] = OrderedDict()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def detect(self, text: str) -> str:
+        """The most probable language of the text, or "unknown" if it has no letters to go by."""
+        return _top_language(self.probabilities([text])[0])
+
+    def detect_many(self, texts: Sequence[str]) -> List[str]:
+        """The language of every text, in order."""
+        probabilities = self.probabilities(texts)
+        if not self.per_document:
+            return [_top_language(text_probabilities) for text_probabilities in probabilities]
+        document_language = self._document_language(texts)
+        languages = []
+        for text, text_probabilities in zip(texts, probabilities):
+            language = _top_language(text_probabilities)
+            if (
+                language not in (document_language, UNKNOWN_LANGUAGE)
+                and text_probabilities[0][1] >= self.min_confidence
+                and len(text.strip()) >= self.min_chars_to_differ
+            ):
+                languages.append(language)
+            else:
+                languages.append(document_language)
+        return languages
+
+    def probabilities(self, texts: Sequence[str]) -> List[LanguageProbabilities]:
+        """The (language, probability) pairs of every text, most probable first. Only uncached samples are detected."""
+        samples = [text[: self.sample_chars] for text in texts]
+        keys = [hash_text(sample) for sample in samples]
+        found: Dict[str, LanguageProbabilities] = {}
+        missing: Dict[str, str] = {}
+        with self._lock:
+            for key, sample in zip(keys, samples):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    found[key] = self._cache[key]
+                else:
+                    missing[key] = sample
+        if missing:
+            detected = self._detect_samples(list(missing.values()))
+            with self._lock:
+                for key, sample_probabilities in zip(missing, detected):
+                    found[key] = sample_probabilities
+                    self._cache[key] = sample_probabilities
+                while len(self._cache) > self.max_cache_size:
+                    self._cache.popitem(last=False)
+        return [found[key] for key in keys]
+
+    def _document_language(self, texts: Sequence[str]) -> str:
+        """Detects the language of a sample spread evenly over the document, at most `sample_chars` long in total."""
+        n_samples = min(len(texts), 8)
+        if not n_samples:
+            return UNKNOWN_LANGUAGE
+        step = len(texts) / n_samples
+        sample_chars = max(self.sample_chars // n_samples, 1)
+        sample = " ".join(texts[int(i * step)][:sample_chars] for i in range(n_samples))
+        return self.detect(sample)
+
+    def _detect_samples(self, samples: List[str]) -> List[LanguageProbabilities]:
+        n_workers = min(self.max_workers or os.cpu_count() or 1, len(samples) // MIN_TEXTS_FOR_PARALLEL)
+        if n_workers < 2:
+            return detect_probabilities(samples, self.seed)
+        batch_size = -(-len(samples) // n_workers)
+        batches = [samples[i : i + batch_size] for i in range(0, len(samples), batch_size)]
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = executor.map(detect_probabilities, batches, [self.seed] * len(batches))
+            return [sample_probabilities for batch in results for sample_probabilities in batch]
+
+
+def detect_probabilities(samples: List[str], seed: int) -> List[LanguageProbabilities]:
+    """The (language, probability) pairs of every sample, detected with the seeded factory of this process."""
+    factory = _get_factory(seed)
+    result = []
+    for sample in samples:
+        detector = factory.create()
+        detector.append(sample)
+        try:
+            result.append([(language.lang, language.prob) for language in detector.get_probabilities()])
+        except LangDetectException:
+            # no letters in the text, e.g. a chunk which only holds numbers
+            result.append([])
+    return result
+
+
+@lru_cache(maxsize=None)
+def _get_factory(seed: int) -> DetectorFactory:
+    # a private factory rather than langdetect's global one, so the seed does not change detection elsewhere
+    factory = DetectorFactory()
+    factory.load_profile(PROFILES_DIRECTORY)
+    factory.set_seed(seed)
+    return factory
+
+
+def _top_language(probabilities: LanguageProbabilities) -> str:
+    return probabilities[0][0] if probabilities else UNKNOWN_LANGUAGE
+
+
+@lru_cache(maxsize=None)
+def get_language_detector() -> LanguageDetector:
+    """A detector with the default settings shared by all chunkers, so cached languages are reused."""
+    return LanguageDetector()
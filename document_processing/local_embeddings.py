@@ -0,0 +1,48 @@
+import hashlib
+import math
+import re
+from typing import Any, List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbedding(BaseEmbedding):
+    """
+    A deterministic embedding model which runs locally, meant for tests and benchmarks in place of Azure.
+    Every word is hashed into one of `embed_dim` buckets, so texts sharing words get similar embeddings.
+    """
+
+    embed_dim: int = 256
+
+    def __init__(self, embed_dim: int = 256, **kwargs: Any):
+        kwargs.setdefault("model_name", f"hashing-{embed_dim}")
+        super().__init__(embed_dim=embed_dim, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashingEmbedding"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.embed_dim
+        for word in WORD_PATTERN.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.embed_dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector))
+        if norm:
+            vector = [value / norm for value in vector]
+        return vector
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
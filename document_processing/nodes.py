@@ -0,0 +1,26 @@
+"""
+llama_index takes over a second to import, so it is only imported the first time a node is made rather than when
+the document_processing modules are imported. Extraction on its own never loads it.
+"""
+
+import sys
+from typing import TYPE_CHECKING, Any, TypeGuard
+
+if TYPE_CHECKING:
+    from llama_index.core.base.embeddings.base import BaseEmbedding
+    from llama_index.core.schema import TextNode
+
+
+def text_node(**kwargs: Any) -> "TextNode":
+    from llama_index.core.schema import TextNode
+
+    return TextNode(**kwargs)
+
+
+def is_llama_index_embedding(embed_model: Any) -> TypeGuard["BaseEmbedding"]:
+    """Whether the model is a llama_index embedding model, without importing llama_index if it has not been yet."""
+    if "llama_index.core" not in sys.modules:
+        return False
+    from llama_index.core.base.embeddings.base import BaseEmbedding
+
+    return isinstance(embed_model, BaseEmbedding)
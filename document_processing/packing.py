@@ -0,0 +1,130 @@
+"""
+Packs the pieces produced by a splitting function into chunks of between `min_tokens` and `max_tokens` tokens from
+the token count of each piece, without counting any combined text again. A chunk is a run of consecutive pieces and
+its size is the sum of their counts; joining text can merge tokens across the boundary, so the joined text of a chunk
+usually counts the same or slightly fewer tokens.
+
+`pack_greedy` fills chunks up to `max_tokens` in one pass and then fixes chunks below `min_tokens` by merging them
+into or taking pieces from their neighbour. `pack_optimal` minimises the variance of the chunk sizes instead. Both
+are deterministic. A piece above `max_tokens` cannot fit in any chunk, so it is kept on its own and reported.
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Sequence, Tuple
+
+PACKING_MODES = ("greedy", "optimal")
+
+
+@dataclass
+class Packing:
+    # [first, last) piece indices of every chunk
+    ranges: List[Tuple[int, int]]
+    token_counts: List[int]
+    # pieces above max_tokens, each left as a chunk of its own
+    oversized: List[int] = field(default_factory=list)
+    # chunks below min_tokens which could not be combined without going above max_tokens
+    undersized: List[int] = field(default_factory=list)
+
+
+def pack(token_counts: Sequence[int], min_tokens: int, max_tokens: int, mode: str = "greedy") -> Packing:
+    if mode == "greedy":
+        return pack_greedy(token_counts, min_tokens, max_tokens)
+    if mode == "optimal":
+        return pack_optimal(token_counts, min_tokens, max_tokens)
+    raise ValueError(f"unknown packing mode {mode!r}, choose from {PACKING_MODES}")
+
+
+def pack_greedy(token_counts: Sequence[int], min_tokens: int, max_tokens: int) -> Packing:
+    """Packs the pieces into as few chunks as fit below `max_tokens`, then fixes the chunks below `min_tokens`."""
+    oversized = [i for i, n_tokens in enumerate(token_counts) if n_tokens > max_tokens]
+    # [first, last, size] of every chunk
+    chunks: List[List[int]] = []
+    first = size = 0
+    for i, n_tokens in enumerate(token_counts):
+        if first < i and (size + n_tokens > max_tokens or n_tokens > max_tokens or size > max_tokens):
+            chunks.append([first, i, size])
+            first, size = i, 0
+        size += n_tokens
+    if first < len(token_counts):
+        chunks.append([first, len(token_counts), size])
+
+    # only the last chunk, and chunks before a piece which did not fit, can be short
+    is_oversized = set(oversized)
+    fixed: List[List[int]] = []
+    for chunk in chunks:
+        previous = fixed[-1] if fixed else None
+        if chunk[2] >= min_tokens or previous is None or previous[0] in is_oversized or chunk[0] in is_oversized:
+            fixed.append(chunk)
+        elif previous[2] + chunk[2] <= max_tokens:
+            previous[1], previous[2] = chunk[1], previous[2] + chunk[2]
+        else:
+            # move pieces from the end of the previous chunk while it stays long enough
+            while chunk[2] < min_tokens and previous[1] - previous[0] > 1:
+                n_tokens = token_counts[previous[1] - 1]
+                if previous[2] - n_tokens < min_tokens or chunk[2] + n_tokens > max_tokens:
+                    break
+                previous[1] -= 1
+                previous[2] -= n_tokens
+                chunk[0] -= 1
+                chunk[2] += n_tokens
+            fixed.append(chunk)
+    # a short chunk followed by a chunk it fits into is merged forwards, e.g. the first chunk of the text
+    merged: List[List[int]] = []
+    for chunk in fixed:
+        previous = merged[-1] if merged else None
+        if (
+            previous is not None
+            and previous[2] < min_tokens
+            and previous[0] not in is_oversized
+            and chunk[0] not in is_oversized
+            and previous[2] + chunk[2] <= max_tokens
+        ):
+            previous[1], previous[2] = chunk[1], previous[2] + chunk[2]
+        else:
+            merged.append(chunk)
+    return _packing([(first, last) for first, last, _ in merged], token_counts, min_tokens, oversized)
+
+
+def pack_optimal(token_counts: Sequence[int], min_tokens: int, max_tokens: int) -> Packing:
+    """
+    Packs the pieces into chunks below `max_tokens` with as few chunks below `min_tokens` as possible and, among
+    those packings, the smallest sum of squared differences between each chunk size and the average chunk size of
+    the greedy packing. Runs in O(n * w), where w is the largest number of pieces which fit in a chunk.
+    """
+    n_pieces = len(token_counts)
+    if not n_pieces:
+        return Packing([], [])
+    oversized = [i for i, n_tokens in enumerate(token_counts) if n_tokens > max_tokens]
+    total = sum(token_counts)
+    # sizes are compared to total / n_chunks, scaled by n_chunks to stay in integers
+    n_chunks = len(pack_greedy(token_counts, min_tokens, max_tokens).ranges)
+
+    # best (number of short chunks, squared deviation) of packing the first j pieces, and where its last chunk starts
+    best: List[Tuple[int, int]] = [(0, 0)] + [(n_pieces + 1, 0)] * n_pieces
+    chunk_start = [0] * (n_pieces + 1)
+    for j in range(1, n_pieces + 1):
+        size = 0
+        for i in range(j - 1, -1, -1):
+            size += token_counts[i]
+            # a piece which does not fit is always a chunk of its own
+            if i < j - 1 and size > max_tokens:
+                break
+            cost = (best[i][0] + (size < min_tokens), best[i][1] + (size * n_chunks - total) ** 2)
+            if cost < best[j]:
+                best[j] = cost
+                chunk_start[j] = i
+            if token_counts[i] > max_tokens:
+                break
+
+    ranges = []
+    j = n_pieces
+    while j:
+        ranges.append((chunk_start[j], j))
+        j = chunk_start[j]
+    return _packing(ranges[::-1], token_counts, min_tokens, oversized)
+
+
+def _packing(ranges: List[Tuple[int, int]], token_counts: Sequence[int], min_tokens: int, oversized: List[int]) -> Packing:
+    sizes = [sum(token_counts[first:last]) for first, last in ranges]
+    undersized = [i for i, size in enumerate(sizes) if size < min_tokens]
+    return Packing(ranges, sizes, oversized, undersized)
@@ -1,35 +1,181 @@
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
 
 import pymupdf  # type: ignore
 import pymupdf4llm  # type: ignore
 
 from document_processing.base import BaseFileProcessor
+from document_processing.cache import cached_extraction, make_key
+from document_processing.instrumentation import timed
+from document_processing.sources import is_path
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_PAGES_PER_SHARD = 25
+# documents with fewer pages than this are always extracted serially, a process pool is not worth starting up
+MIN_PAGES_FOR_PARALLEL = 50
+
+
+class PageText(NamedTuple):
+    page_number: int
+    text: str
+    # character offsets of the page text within the extracted document text
+    start: int
+    end: int
+
+
+class _SharedPdfBuffer(NamedTuple):
+    """Reference to PDF bytes placed in shared memory so that workers do not each receive a pickled copy."""
+
+    name: str
+    size: int
+
 
 class PdfProcessor(BaseFileProcessor):
+    # known once the document has been opened, or read from the cache along with a cached extraction
+    _page_count: Optional[int] = None
 
     def _get_doc(self):
-        if isinstance(self.file_name, str):
-            return pymupdf.open(self.file_name)
-        elif isinstance(self.file_name, bytes):
-            return pymupdf.open(stream=self.file_name, type="pdf")
+        if is_path(self.file_name):
+            doc = pymupdf.open(os.fspath(self.file_name))  # type: ignore[arg-type]
         else:
-            raise ValueError(f"file_name must be a string or bytes, got '{type(self.file_name)}'")
+            doc = pymupdf.open(stream=self.content(), filetype="pdf")
+        if self._page_count is None:
+            self._page_count = doc.page_count
+            if self.cache is not None:
+                self.cache.set_json(self._page_count_key(), doc.page_count)
+        return doc
 
-    def extract_text(self) -> str:
+    def page_count(self) -> int:
+        """The number of pages, without opening the document again if it was opened before or is in the cache."""
+        if self._page_count is None and self.cache is not None:
+            self._page_count = self.cache.get_json(self._page_count_key())
+        if self._page_count is None:
+            with self._get_doc() as doc:
+                return doc.page_count
+        return self._page_count
+
+    def _page_count_key(self) -> str:
+        return make_key("page_count", type(self).__qualname__, self.content_hash())
+
+    def iter_pages(self, start_page: int = 0, end_page: Optional[int] = None) -> Iterator[PageText]:
+        """
+        Yields the text of each page in the range [start_page, end_page) one page at a time. The document
+        is closed as soon as the generator is exhausted or closed, so callers can stop early.
         """
-        Takes a PDF file and extracts the text from it to a string.
+        with self._get_doc() as doc:
+            if end_page is None or end_page > doc.page_count:
+                end_page = doc.page_count
+            offset = 0
+            for page_number in range(start_page, end_page):
+                text = doc.load_page(page_number).get_text()
+                self.observer.count("pages")
+                yield PageText(page_number, text, offset, offset + len(text))
+                offset += len(text)
+
+    def iter_text(self, start_page: int = 0, end_page: Optional[int] = None) -> Iterator[str]:
+        """Yields the text of each page in the range [start_page, end_page)."""
+        for page in self.iter_pages(start_page, end_page):
+            yield page.text
+
+    def iter_units(self) -> Iterator[str]:
+        return self.iter_text()
+
+    @timed()
+    @cached_extraction(ignore=("parallel", "max_workers", "pages_per_shard"))
+    def extract_text(
+        self,
+        start_page: int = 0,
+        end_page: Optional[int] = None,
+        parallel: bool = False,
+        max_workers: Optional[int] = None,
+        pages_per_shard: int = DEFAULT_PAGES_PER_SHARD,
+    ) -> str:
         """
-        doc = self._get_doc()
-        text_contents = ""
-        for page_num, page in enumerate(doc):
-            text = page.get_text()
-            text_contents += text
-        return text_contents
-
-    def extract_text_llm(self) -> str:
+        Takes a PDF file and extracts the text from it to a string. With `parallel=True` the page range is
+        split into shards of `pages_per_shard` pages which are extracted in a process pool.
+        """
+        if parallel:
+            return self._extract_parallel(False, start_page, end_page, max_workers, pages_per_shard)
+        return "".join(self.iter_text(start_page, end_page))
+
+    @timed()
+    @cached_extraction(ignore=("parallel", "max_workers", "pages_per_shard"))
+    def extract_text_llm(self, parallel: bool = False, max_workers: Optional[int] = None, pages_per_shard: int = DEFAULT_PAGES_PER_SHARD) -> str:
         """Uses an LLM in order to extract text from a PDF file and output it as markdown."""
-        md_text = pymupdf4llm.to_markdown(self.file_name)
+        if parallel:
+            return self._extract_parallel(True, 0, None, max_workers, pages_per_shard)
+        with self._get_doc() as doc:
+            md_text = pymupdf4llm.to_markdown(doc)
+            self.observer.count("pages", doc.page_count)
         return md_text
+
+    def _extract_parallel(self, markdown: bool, start_page: int, end_page: Optional[int], max_workers: Optional[int], pages_per_shard: int) -> str:
+        with self._get_doc() as doc:
+            if end_page is None or end_page > doc.page_count:
+                end_page = doc.page_count
+            self.observer.count("pages", end_page - start_page)
+            shards = _shard_pages(start_page, end_page, pages_per_shard)
+            n_workers = min(max_workers or os.cpu_count() or 1, len(shards))
+            if end_page - start_page < MIN_PAGES_FOR_PARALLEL or n_workers < 2:
+                logger.debug("Extracting %s pages serially", end_page - start_page)
+                return self._extract_serial(doc, markdown, start_page, end_page)
+            # header levels depend on the font sizes of the whole document, so they are found once up front
+            # and shared with every worker to get the same output as the serial extraction
+            hdr_info = pymupdf4llm.IdentifyHeaders(doc) if markdown else None
+
+        shared_buffer = None
+        source: Union[str, _SharedPdfBuffer]
+        if not is_path(self.file_name):
+            content = self.content()
+            shared_buffer = SharedMemory(create=True, size=len(content))
+            shared_buffer.buf[: len(content)] = content
+            source = _SharedPdfBuffer(shared_buffer.name, len(content))
+        else:
+            source = os.fspath(self.file_name)  # type: ignore[arg-type]
+
+        try:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                texts = executor.map(
+                    _extract_shard,
+                    [source] * len(shards),
+                    shards,
+                    [markdown] * len(shards),
+                    [hdr_info] * len(shards),
+                )
+                return "".join(texts)
+        finally:
+            if shared_buffer is not None:
+                shared_buffer.close()
+                shared_buffer.unlink()
+
+    def _extract_serial(self, doc, markdown: bool, start_page: int, end_page: int) -> str:
+        if markdown:
+            return pymupdf4llm.to_markdown(doc, pages=list(range(start_page, end_page)))
+        return "".join(doc.load_page(page_number).get_text() for page_number in range(start_page, end_page))
+
+
+def _shard_pages(start_page: int, end_page: int, pages_per_shard: int) -> List[Tuple[int, int]]:
+    return [(shard_start, min(shard_start + pages_per_shard, end_page)) for shard_start in range(start_page, end_page, pages_per_shard)]
+
+
+def _extract_shard(source: Union[str, _SharedPdfBuffer], shard: Tuple[int, int], markdown: bool, hdr_info) -> str:
+    """Runs in a worker process, opens the document itself and extracts the pages of one shard."""
+    shared_buffer = None
+    if isinstance(source, _SharedPdfBuffer):
+        shared_buffer = SharedMemory(name=source.name)
+        doc = pymupdf.open(stream=bytes(shared_buffer.buf[: source.size]), filetype="pdf")
+    else:
+        doc = pymupdf.open(source)
+    try:
+        start_page, end_page = shard
+        if markdown:
+            return pymupdf4llm.to_markdown(doc, pages=list(range(start_page, end_page)), hdr_info=hdr_info)
+        return "".join(doc.load_page(page_number).get_text() for page_number in range(start_page, end_page))
+    finally:
+        doc.close()
+        if shared_buffer is not None:
+            shared_buffer.close()
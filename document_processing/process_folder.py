@@ -1,5 +1,23 @@
+from __future__ import annotations
+
+import logging
+import os
 import pathlib
-from typing import List
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from document_processing.base import BaseChunker, BaseFileProcessor
+from document_processing.cache import DiskCache
+from document_processing.factory import file_processor_factory
+
+if TYPE_CHECKING:
+    from llama_index.core.schema import TextNode
+
+logger = logging.getLogger(__name__)
 
 
 class FolderProcessing:
@@ -12,3 +30,179 @@ class FolderProcessing:
         folder = pathlib.Path(self.folder_name)
         files = list(folder.glob(file_pattern))
         return files
+
+
+@dataclass
+class FileResult:
+    path: pathlib.Path
+    chunks: List[TextNode] = field(default_factory=list)
+    n_pages: int = 0
+    duration: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class ThroughputStats:
+    n_files: int = 0
+    n_failed: int = 0
+    n_pages: int = 0
+    n_chunks: int = 0
+    elapsed: float = 0.0
+
+    def add(self, result: FileResult):
+        self.n_files += 1
+        self.n_failed += not result.ok
+        self.n_pages += result.n_pages
+        self.n_chunks += len(result.chunks)
+
+    @property
+    def files_per_second(self) -> float:
+        return self.n_files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.n_pages / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.n_chunks / self.elapsed if self.elapsed else 0.0
+
+
+class BatchProcessing(FolderProcessing):
+    """
+    Extracts and chunks every file in a folder matching the file pattern using a process pool. Results are
+    yielded as soon as each file finishes, and at most `max_in_flight` files are queued at any time so that
+    finished results do not pile up faster than the caller consumes them. A file which fails only produces a
+    `FileResult` with an error, the rest of the batch carries on.
+    """
+
+    def __init__(
+        self,
+        folder_name: str,
+        file_pattern: str,
+        chunker: BaseChunker,
+        num_words_overlap: int = 0,
+        max_workers: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        cache: Optional[DiskCache] = None,
+    ):
+        super().__init__(folder_name, file_pattern)
+        self.chunker = chunker
+        self.num_words_overlap = num_words_overlap
+        self.cache = cache
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.max_workers
+        self.stats = ThroughputStats()
+
+    def run(self) -> Iterator[FileResult]:
+        self.stats = ThroughputStats()
+        start_time = time.perf_counter()
+        pending_files = iter(self.files)
+        retry_files: List[pathlib.Path] = []
+        in_flight: Dict[Future, pathlib.Path] = {}
+        # files retried on their own, each in a new pool with a single worker
+        isolated: Dict[Future, Tuple[pathlib.Path, ProcessPoolExecutor]] = {}
+        executor = self._create_executor()
+        try:
+            while True:
+                while retry_files and len(isolated) < self.max_workers:
+                    path = retry_files.pop()
+                    retry_executor = self._create_executor(max_workers=1)
+                    isolated[retry_executor.submit(_process_file, str(path))] = (path, retry_executor)
+                while len(in_flight) + len(isolated) < self.max_in_flight:
+                    path = next(pending_files, None)
+                    if path is None:
+                        break
+                    in_flight[executor.submit(_process_file, str(path))] = path
+                if not in_flight and not isolated:
+                    break
+
+                done, _ = wait([*in_flight, *isolated], return_when=FIRST_COMPLETED)
+                lost_files = []
+                for future in done:
+                    if future in isolated:
+                        path, retry_executor = isolated.pop(future)
+                        retry_executor.shutdown()
+                        try:
+                            result = future.result()
+                        except BrokenProcessPool:
+                            # the file crashed its worker on its own, so it is the one to blame
+                            result = FileResult(path=path, error="worker process terminated abruptly")
+                        yield self._record(result, start_time)
+                        continue
+                    path = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        lost_files.append(path)
+                        continue
+                    yield self._record(result, start_time)
+
+                if lost_files:
+                    # a worker died (e.g. a crash inside a parser) which takes down every file queued in the pool.
+                    # It is not known which file caused it, so each of them is retried on its own, where a crash
+                    # can only fail the file which caused it.
+                    lost_files.extend(in_flight.values())
+                    in_flight.clear()
+                    executor.shutdown(cancel_futures=True)
+                    executor = self._create_executor()
+                    retry_files.extend(lost_files)
+        finally:
+            executor.shutdown(cancel_futures=True)
+            for _, retry_executor in isolated.values():
+                retry_executor.shutdown(cancel_futures=True)
+            self.stats.elapsed = time.perf_counter() - start_time
+            logger.info(
+                "Processed %s files (%s failed) in %.1fs: %.2f files/s, %.2f pages/s, %.2f chunks/s",
+                self.stats.n_files,
+                self.stats.n_failed,
+                self.stats.elapsed,
+                self.stats.files_per_second,
+                self.stats.pages_per_second,
+                self.stats.chunks_per_second,
+            )
+
+    def _record(self, result: FileResult, start_time: float) -> FileResult:
+        self.stats.add(result)
+        self.stats.elapsed = time.perf_counter() - start_time
+        return result
+
+    def _create_executor(self, max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+        # the chunker is sent to each worker once, not with every file
+        return ProcessPoolExecutor(
+            max_workers=max_workers or self.max_workers, initializer=_init_worker, initargs=(self.chunker, self.num_words_overlap, self.cache)
+        )
+
+
+_worker_chunker: Optional[BaseChunker] = None
+_worker_num_words_overlap = 0
+_worker_cache: Optional[DiskCache] = None
+
+
+def _init_worker(chunker: BaseChunker, num_words_overlap: int, cache: Optional[DiskCache]):
+    global _worker_chunker, _worker_num_words_overlap, _worker_cache
+    _worker_chunker = chunker
+    _worker_num_words_overlap = num_words_overlap
+    _worker_cache = cache
+
+
+def _process_file(path: str) -> FileResult:
+    start_time = time.perf_counter()
+    try:
+        processor = file_processor_factory(path)(path, chunker=_worker_chunker, cache=_worker_cache)
+        text, n_pages = _extract(processor)
+        chunks = processor.chunk(text, _worker_num_words_overlap)
+    except Exception:
+        return FileResult(path=pathlib.Path(path), duration=time.perf_counter() - start_time, error=traceback.format_exc())
+    return FileResult(path=pathlib.Path(path), chunks=chunks, n_pages=n_pages, duration=time.perf_counter() - start_time)
+
+
+def _extract(processor: BaseFileProcessor) -> Tuple[str, int]:
+    """Extracts the text of a file, along with the number of pages where the format has pages."""
+    # only formats with pages, e.g. PDFs, have a page count, and their backend is only imported when one is processed
+    page_count = getattr(processor, "page_count", None)
+    return processor.extract_text(), page_count() if page_count is not None else 0
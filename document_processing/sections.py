@@ -0,0 +1,232 @@
+"""
+Splits documents into sections with a regex generated for each heading layout, e.g. by an LLM reading the first pages.
+Documents made from the same template share a layout, so the generated regex is cached by a fingerprint of the layout
+and only checked against each new document. The generator is only called when no regex is cached for the layout or the
+cached one does not split the document. Generated regexes are run with the `regex` package under a timeout, so one
+which backtracks catastrophically is rejected instead of hanging the chunker.
+"""
+
+import inspect
+import logging
+import re
+import threading
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Union
+
+import regex
+
+from document_processing.cache import DiskCache, make_key
+from document_processing.chunking import FunctionChunker
+from document_processing.nodes import text_node
+
+if TYPE_CHECKING:
+    from llama_index.core.schema import TextNode
+
+logger = logging.getLogger(__name__)
+
+# takes the first `sample_chars` characters of a document and returns a regex matching the start of its section titles,
+# generators returning an awaitable can only be used through `achunk` and `achunk_spans`
+RegexGenerator = Callable[[str], Union[str, Awaitable[str]]]
+# how long a generated regex may take to find the sections of a document
+DEFAULT_REGEX_TIMEOUT_SECONDS = 1.0
+
+# heading lines are short and do not end like a sentence
+MAX_HEADING_CHARS = 80
+HEADING_LINE = re.compile(rf"^[ \t]*(\S[^\n]{{0,{MAX_HEADING_CHARS - 1}}}?)[ \t]*$", re.MULTILINE)
+SHAPE_TOKEN = re.compile(r"\d+|[IVXLC]+\b|[A-Z]+\b|[A-Z][a-z]+|[a-z]+|\s+|.", re.ASCII)
+SHAPE_TOKENS = 3
+# numbers, roman numerals, upper case words, capitalised words and lower case words
+SHAPES = [(re.compile(r"\d+"), "9"), (re.compile(r"[IVXLC]+"), "R"), (re.compile(r"[A-Z]+"), "A"), (re.compile(r"[A-Z][a-z]+"), "Aa")]
+
+
+def line_shape(line: str) -> str:
+    """The shape of the first words of a line, e.g. "Chapter 12: Results of the study" becomes "Aa 9: Aa"."""
+    shape = []
+    for token in SHAPE_TOKEN.findall(line)[: SHAPE_TOKENS * 2]:
+        if token.isspace():
+            shape.append(" ")
+            continue
+        for pattern, symbol in SHAPES:
+            if pattern.fullmatch(token):
+                shape.append(symbol)
+                break
+        else:
+            shape.append("a" if token.isalpha() else token)
+    return "".join(shape).strip()
+
+
+def layout_fingerprint(text: str, max_shapes: int = 8, min_count: int = 2) -> str:
+    """
+    Fingerprints the heading layout of a document from the shapes of its short lines which do not end like a
+    sentence. The `max_shapes` most common shapes seen at least `min_count` times make up the layout.
+    """
+    shapes = Counter(line_shape(line) for line in HEADING_LINE.findall(text) if line[-1] not in ".,;")
+    common = sorted((shape for shape, count in shapes.items() if count >= min_count), key=lambda shape: (-shapes[shape], shape))
+    return make_key("layout", sorted(common[:max_shapes]))
+
+
+def section_starts(text: str, pattern: regex.Pattern, timeout: Optional[float] = None) -> List[int]:
+    """
+    Offsets where the sections start, the text before the first match being a section of its own. Raises a
+    `TimeoutError` if finding the matches takes longer than `timeout` seconds.
+    """
+    return sorted({0, *(match.start() for match in pattern.finditer(text, timeout=timeout))})
+
+
+def split_sections(text: str, pattern: regex.Pattern, timeout: Optional[float] = None) -> List["TextNode"]:
+    """Splits the text at the start of every match, so the sections join back into the text."""
+    return split_at(text, section_starts(text, pattern, timeout))
+
+
+def split_at(text: str, starts: List[int]) -> List["TextNode"]:
+    """Splits the text into sections at the sorted offsets from `section_starts`."""
+    return [text_node(text=text[start:end]) for start, end in zip(starts, starts[1:] + [len(text)]) if start < end]
+
+
+class RegexSectionChunker(FunctionChunker):
+    """
+    A `FunctionChunker` which first splits the text into sections at the matches of a regex from `generate_regex`.
+    Sections which are too long are split again with `splitting_function`, and short ones are combined as usual.
+
+    Regexes are compiled once and cached in memory, and in `regex_cache` if given, by the `layout_fingerprint` of the
+    document. A regex is only used if it splits the text into at least `min_sections` sections, none of which holds
+    more than `max_section_fraction` of the text. Otherwise the generator is called, up to `max_attempts` times, and
+    if no regex works the text is split with `splitting_function` alone. A regex which takes longer than
+    `regex_timeout` seconds to find the sections is not used.
+    """
+
+    def __init__(
+        self,
+        min_length_tokens: int,
+        max_length_tokens: int,
+        generate_regex: RegexGenerator,
+        splitting_function: Union[Awaitable[List["TextNode"]], Callable[[str], List["TextNode"]]],
+        regex_cache: Optional[DiskCache] = None,
+        sample_chars: int = 5000,
+        min_sections: int = 2,
+        max_section_fraction: float = 0.9,
+        max_attempts: int = 2,
+        regex_timeout: float = DEFAULT_REGEX_TIMEOUT_SECONDS,
+        **kwargs: Any,
+    ):
+        super().__init__(min_length_tokens, max_length_tokens, splitting_function, **kwargs)
+        self.generate_regex = generate_regex
+        self.regex_cache = regex_cache
+        self.sample_chars = sample_chars
+        self.min_sections = min_sections
+        self.max_section_fraction = max_section_fraction
+        self.max_attempts = max_attempts
+        self.regex_timeout = regex_timeout
+        self._patterns: Dict[str, regex.Pattern] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the lock cannot be pickled, e.g. when the chunker is sent to worker processes
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def split(self, text: str) -> List["TextNode"]:
+        with self.observer.span("layout_fingerprint"):
+            fingerprint = layout_fingerprint(text)
+        pattern = self.cached_regex(fingerprint)
+        starts = self.valid_starts(pattern, text) if pattern is not None else None
+        if starts is not None:
+            self.observer.count("section_regex_cache_hits")
+            return split_at(text, starts)
+        for _ in range(self.max_attempts):
+            with self.observer.span("generate_regex"):
+                generated = self.generate_regex(text[: self.sample_chars])
+            if inspect.isawaitable(generated):
+                # never awaited, closing it avoids a warning about that
+                if inspect.iscoroutine(generated):
+                    generated.close()
+                raise TypeError("generate_regex returned an awaitable, use achunk or achunk_spans with an async regex generator")
+            pattern = self._compile(generated)  # type: ignore[arg-type]
+            starts = self.valid_starts(pattern, text) if pattern is not None else None
+            if pattern is not None and starts is not None:
+                self._store(fingerprint, pattern)
+                return split_at(text, starts)
+        self._log_fall_back()
+        return self.splitting_function(text)  # type: ignore
+
+    async def asplit(self, text: str) -> List["TextNode"]:
+        with self.observer.span("layout_fingerprint"):
+            fingerprint = layout_fingerprint(text)
+        pattern = self.cached_regex(fingerprint)
+        starts = self.valid_starts(pattern, text) if pattern is not None else None
+        if starts is not None:
+            self.observer.count("section_regex_cache_hits")
+            return split_at(text, starts)
+        for _ in range(self.max_attempts):
+            with self.observer.span("generate_regex"):
+                generated = self.generate_regex(text[: self.sample_chars])
+                if inspect.isawaitable(generated):
+                    generated = await generated
+            pattern = self._compile(generated)  # type: ignore
+            starts = self.valid_starts(pattern, text) if pattern is not None else None
+            if pattern is not None and starts is not None:
+                self._store(fingerprint, pattern)
+                return split_at(text, starts)
+        self._log_fall_back()
+        return await self.splitting_function(text)  # type: ignore
+
+    def cached_regex(self, fingerprint: str) -> Optional[regex.Pattern]:
+        """The compiled regex cached for the layout, from memory or else from the regex cache."""
+        with self._lock:
+            pattern = self._patterns.get(fingerprint)
+        if pattern is None and self.regex_cache is not None:
+            cached = self.regex_cache.get_json(self._cache_key(fingerprint))
+            if cached is not None:
+                pattern = self._compile(cached)
+            if pattern is not None:
+                with self._lock:
+                    self._patterns[fingerprint] = pattern
+        return pattern
+
+    def is_valid(self, pattern: regex.Pattern, text: str) -> bool:
+        """
+        Whether the regex splits the text into enough sections, without leaving most of it in one section, within
+        `regex_timeout` seconds.
+        """
+        return self.valid_starts(pattern, text) is not None
+
+    def valid_starts(self, pattern: regex.Pattern, text: str) -> Optional[List[int]]:
+        """The section starts of a valid regex, as in `is_valid`, so the text is split without matching it again."""
+        with self.observer.span("validate_regex"):
+            try:
+                starts = section_starts(text, pattern, self.regex_timeout)
+            except TimeoutError:
+                logger.warning("Section regex %r took longer than %ss on a document of %d characters", pattern.pattern, self.regex_timeout, len(text))
+                self.observer.count("section_regex_timeouts")
+                return None
+        longest = max(end - start for start, end in zip(starts, starts[1:] + [len(text)]))
+        if len(starts) < self.min_sections or longest > self.max_section_fraction * len(text):
+            self.observer.count("section_regex_rejected")
+            return None
+        return starts
+
+    def _store(self, fingerprint: str, pattern: regex.Pattern):
+        self.observer.count("section_regex_generated")
+        with self._lock:
+            self._patterns[fingerprint] = pattern
+        if self.regex_cache is not None:
+            self.regex_cache.set_json(self._cache_key(fingerprint), pattern.pattern)
+
+    def _log_fall_back(self):
+        logger.warning("No regex split the text into sections in %d attempts, splitting it with the splitting function", self.max_attempts)
+
+    def _compile(self, pattern: str) -> Optional[regex.Pattern]:
+        try:
+            # section titles are at the start of lines
+            return regex.compile(pattern, regex.MULTILINE)
+        except (regex.error, TypeError):
+            logger.warning("Ignoring invalid section regex %r", pattern)
+            return None
+
+    def _cache_key(self, fingerprint: str) -> str:
+        return make_key("section_regex", fingerprint)
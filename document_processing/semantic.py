@@ -0,0 +1,125 @@
+import re
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# a sentence ends after closing punctuation (and any closing quotes or brackets) followed by whitespace, or at a blank line
+SENTENCE_END_PATTERN = re.compile(r"""[.!?]+["'”’)\]]*\s+|\n\s*\n\s*""")
+
+Embedder = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+def split_sentences(text: str) -> List[str]:
+    """Splits text into sentences, keeping the whitespace after each sentence so that joining them gives back the text."""
+    sentences = []
+    start = 0
+    for match in SENTENCE_END_PATTERN.finditer(text):
+        sentences.append(text[start : match.end()])
+        start = match.end()
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+
+def build_sentence_groups(sentences: List[str], buffer_size: int) -> List[str]:
+    """Combines each sentence with the `buffer_size` sentences before and after it."""
+    return ["".join(sentences[max(i - buffer_size, 0) : i + buffer_size + 1]) for i in range(len(sentences))]
+
+
+def adjacent_cosine_distances(embeddings: np.ndarray) -> np.ndarray:
+    """Cosine distance between every row of the embedding matrix and the row after it."""
+    if len(embeddings) < 2:
+        return np.zeros(0)
+    norms = np.linalg.norm(embeddings, axis=1)
+    dot_products = np.einsum("ij,ij->i", embeddings[:-1], embeddings[1:])
+    norm_products = norms[:-1] * norms[1:]
+    similarities = np.divide(dot_products, norm_products, out=np.zeros_like(dot_products), where=norm_products > 0)
+    return 1 - similarities
+
+
+def find_breakpoints(distances: np.ndarray, breakpoint_percentile_threshold: float) -> np.ndarray:
+    """Indices of the sentences after which a new chunk starts, where the distance to the next group is above the percentile."""
+    if len(distances) == 0:
+        return np.zeros(0, dtype=int)
+    threshold = np.percentile(distances, breakpoint_percentile_threshold)
+    return np.flatnonzero(distances > threshold)
+
+
+def sentence_ranges(n_sentences: int, breakpoints: np.ndarray) -> List[Tuple[int, int]]:
+    """Turns breakpoints into [start, end) ranges of sentence indices."""
+    ends = [int(index) + 1 for index in breakpoints] + [n_sentences]
+    starts = [0] + ends[:-1]
+    return [(start, end) for start, end in zip(starts, ends) if end > start]
+
+
+def enforce_max_tokens(
+    sentences: List[str],
+    ranges: List[Tuple[int, int]],
+    distances: np.ndarray,
+    count_tokens: Callable[[str], int],
+    max_length_tokens: int,
+) -> List[Tuple[int, int]]:
+    """
+    Splits any range of sentences with more than `max_length_tokens` tokens at its largest semantic distance,
+    repeating until every range fits or is a single sentence.
+    """
+    result = []
+    stack = list(reversed(ranges))
+    while stack:
+        start, end = stack.pop()
+        if end - start == 1 or count_tokens("".join(sentences[start:end])) <= max_length_tokens:
+            result.append((start, end))
+            continue
+        split_at = start + int(np.argmax(distances[start : end - 1])) + 1
+        stack.append((split_at, end))
+        stack.append((start, split_at))
+    return result
+
+
+def split_long_sentences(sentences: List[str], count_tokens: Callable[[str], int], max_length_tokens: int) -> List[str]:
+    """Breaks sentences with more than `max_length_tokens` tokens up at whitespace so no single sentence is too long."""
+    result = []
+    for sentence in sentences:
+        if count_tokens(sentence) <= max_length_tokens:
+            result.append(sentence)
+            continue
+        piece = ""
+        for word in re.findall(r"\S+\s*|\s+", sentence):
+            if piece and count_tokens(piece + word) > max_length_tokens:
+                result.append(piece)
+                piece = ""
+            piece += word
+            while count_tokens(piece) > max_length_tokens:
+                # a single word which is too long on its own, e.g. a long url or table row without spaces
+                cut = _longest_prefix_within(piece, count_tokens, max_length_tokens)
+                result.append(piece[:cut])
+                piece = piece[cut:]
+        if piece:
+            result.append(piece)
+    return result
+
+
+def _longest_prefix_within(text: str, count_tokens: Callable[[str], int], max_length_tokens: int) -> int:
+    low, high = 1, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= max_length_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def semantic_ranges(
+    sentences: List[str],
+    embeddings: np.ndarray,
+    breakpoint_percentile_threshold: float,
+    count_tokens: Optional[Callable[[str], int]] = None,
+    max_length_tokens: Optional[int] = None,
+) -> List[Tuple[int, int]]:
+    """Finds the sentence ranges of the chunks given the embeddings of the sentence groups."""
+    distances = adjacent_cosine_distances(embeddings)
+    ranges = sentence_ranges(len(sentences), find_breakpoints(distances, breakpoint_percentile_threshold))
+    if max_length_tokens is not None and count_tokens is not None:
+        ranges = enforce_max_tokens(sentences, ranges, distances, count_tokens, max_length_tokens)
+    return ranges
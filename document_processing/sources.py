@@ -0,0 +1,128 @@
+"""
+The inputs the file processors accept: a path, or the document itself in memory as bytes, a bytearray, a memoryview,
+a memory-mapped file or a binary file-like object, e.g. a download from an object store. In-memory documents are read
+through views of their buffer rather than copies, and open files are memory-mapped, so they never need to be written
+to a temporary file first.
+"""
+
+import io
+import mmap
+import os
+import zipfile
+from typing import IO, Optional, Tuple, Union
+
+DocumentSource = Union[str, os.PathLike, bytes, bytearray, memoryview, mmap.mmap, IO[bytes]]
+
+# where the PDF header may start, some writers put a few bytes before it
+PDF_HEADER_SEARCH_BYTES = 1024
+ZIP_SIGNATURE = b"PK\x03\x04"
+# the part of an OOXML package which holds the main document, for each file type
+OOXML_PARTS = {"docx": "word/document.xml", "xlsx": "xl/workbook.xml", "pptx": "ppt/presentation.xml"}
+
+
+def is_path(source: DocumentSource) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+
+def is_seekable(source: DocumentSource) -> bool:
+    """Whether the source can be read more than once. Paths and buffers always can, file-like objects only if they seek."""
+    if is_path(source) or not hasattr(source, "read"):
+        return True
+    seekable = getattr(source, "seekable", None)
+    return bool(seekable()) if seekable is not None else False
+
+
+def as_buffer(source: DocumentSource) -> Union[bytes, memoryview]:
+    """
+    The contents of an in-memory source without copying them. Open files are memory-mapped and other file-like objects
+    without a buffer are read once.
+    """
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview, mmap.mmap)):
+        return memoryview(source).cast("B")
+    if isinstance(source, io.BytesIO):
+        return source.getbuffer()
+    if hasattr(source, "read"):
+        try:
+            return memoryview(mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ))  # type: ignore[union-attr]
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            # not a regular file, e.g. a network stream, or an empty file which cannot be mapped
+            position = source.tell() if is_seekable(source) else None  # type: ignore[union-attr]
+            content = source.read()  # type: ignore[union-attr]
+            if position is not None:
+                source.seek(position)  # type: ignore[union-attr]
+            return content
+    raise ValueError(f"expected a path, bytes, a buffer or a binary file-like object, got '{type(source)}'")
+
+
+class BufferReader(io.RawIOBase):
+    """A seekable binary file over a buffer, which reads from the buffer without copying all of it first."""
+
+    def __init__(self, buffer: Union[bytes, memoryview]):
+        self._buffer = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        # the position can be past the end after a seek
+        n_bytes = max(0, min(len(target), len(self._buffer) - self._position))
+        target[:n_bytes] = self._buffer[self._position : self._position + n_bytes]
+        self._position += n_bytes
+        return n_bytes
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._buffer)
+        self._position = max(offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+def open_binary(source: DocumentSource) -> IO[bytes]:
+    """A binary file to read the source from, which the caller closes."""
+    if is_path(source):
+        return open(source, "rb")  # type: ignore[arg-type]
+    return io.BufferedReader(BufferReader(as_buffer(source)))
+
+
+def detect_file_type(source: DocumentSource) -> Optional[str]:
+    """
+    Detects the file type from the first bytes of the document, e.g. "pdf" or "docx", or None if it is not known.
+    ZIP files are told apart by the main part of the OOXML package. A stream which cannot seek is used up, use
+    `sniff_file_type` to keep its contents.
+    """
+    with open_binary(source) as f:
+        header = f.read(PDF_HEADER_SEARCH_BYTES)
+        if b"%PDF-" in header:
+            return "pdf"
+        if not header.startswith(ZIP_SIGNATURE):
+            return None
+        try:
+            with zipfile.ZipFile(f) as package:
+                names = set(package.namelist())
+        except zipfile.BadZipFile:
+            return None
+    for file_type, part in OOXML_PARTS.items():
+        if part in names:
+            return file_type
+    return "zip"
+
+
+def sniff_file_type(source: DocumentSource) -> Tuple[Optional[str], DocumentSource]:
+    """
+    Detects the file type like `detect_file_type`, together with the source to read the document from afterwards. That
+    is the source itself, unless it is a stream which cannot seek, which is read into a buffer once.
+    """
+    if not is_seekable(source):
+        source = as_buffer(source)
+    return detect_file_type(source), source
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import tiktoken
+
+from document_processing.nodes import text_node
+
+if TYPE_CHECKING:
+    from llama_index.core.schema import TextNode
+
+# how the overlap taken from neighbouring chunks is measured
+OVERLAP_MODES = ("words", "tokens")
+
+
+class TokenOffsets:
+    """
+    The character offset where every token of a document starts. Built once per document, it lets the first or
+    last few tokens of any part of the document be found by bisecting, without encoding that part again.
+    """
+
+    __slots__ = ("text", "offsets")
+
+    def __init__(self, text: str, encoding: tiktoken.Encoding):
+        self.text = text
+        _, offsets = encoding.decode_with_offsets(encoding.encode_ordinary(text))
+        self.offsets = array("q", offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def tokens_start(self, start: int, end: int, n_tokens: int) -> int:
+        """Offset where the last `n_tokens` tokens of `text[start:end]` start."""
+        first = bisect_left(self.offsets, end) - n_tokens
+        if first < 0:
+            return start
+        return max(start, self.offsets[first])
+
+    def tokens_end(self, start: int, end: int, n_tokens: int) -> int:
+        """Offset just after the first `n_tokens` tokens of `text[start:end]`."""
+        # a token running over the start of the range counts as its first token
+        after = max(bisect_right(self.offsets, start) - 1, 0) + n_tokens
+        if after >= len(self.offsets):
+            return end
+        return min(end, self.offsets[after])
+
+
+class ChunkSpans:
+    """
+    Chunks of one document stored as [start, end) character offsets into the document text instead of as copies
+    of it. The text is only sliced out when a chunk is needed, e.g. to count its tokens, and when the chunks are
+    turned into `TextNode`s, which then carry the offsets of their chunk in the document.
+    """
+
+    __slots__ = ("text", "starts", "ends")
+
+    def __init__(self, text: str, starts: Iterable[int] = (), ends: Iterable[int] = ()):
+        self.text = text
+        self.starts = array("q", starts)
+        self.ends = array("q", ends)
+        if len(self.starts) != len(self.ends):
+            raise ValueError(f"got {len(self.starts)} starts but {len(self.ends)} ends")
+
+    @classmethod
+    def from_nodes(cls, text: str, nodes: Sequence[TextNode], start: int = 0, end: Optional[int] = None) -> "ChunkSpans":
+        """
+        Finds the offsets of the nodes produced by splitting `text[start:end]`. The text of every node must appear in
+        the text in order, text the splitter dropped between them (e.g. separators) is left out of the spans.
+        """
+        if end is None:
+            end = len(text)
+        spans = cls(text)
+        position = start
+        for node in nodes:
+            node_start = text.find(node.text, position, end)
+            if node_start == -1:
+                raise ValueError(f"chunk text {node.text[:40]!r} not found in the document after offset {position}")
+            position = node_start + len(node.text)
+            spans.append(node_start, position)
+        return spans
+
+    @classmethod
+    def from_pieces(cls, text: str, pieces: Iterable[str], ranges: Iterable[Tuple[int, int]]) -> "ChunkSpans":
+        """Spans of the `ranges` of consecutive `pieces`, e.g. sentences, which join back together into `text`."""
+        offsets = [0]
+        for piece in pieces:
+            offsets.append(offsets[-1] + len(piece))
+        spans = cls(text)
+        for first, last in ranges:
+            spans.append(offsets[first], offsets[last])
+        return spans
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return zip(self.starts, self.ends)
+
+    def append(self, start: int, end: int):
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def extend(self, other: "ChunkSpans"):
+        self.starts.extend(other.starts)
+        self.ends.extend(other.ends)
+
+    def chunk_text(self, i: int) -> str:
+        return self.text[self.starts[i] : self.ends[i]]
+
+    def texts(self) -> Iterator[str]:
+        for start, end in self:
+            yield self.text[start:end]
+
+    def text_with_context(self, i: int, num_overlap: int, token_offsets: Optional[TokenOffsets] = None) -> str:
+        """
+        The text of chunk `i` with the last `num_overlap` words of the previous chunk and the first words of the next
+        chunk around it, the same as `BaseChunker.add_context`. Given the `token_offsets` of the text, the overlap
+        is `num_overlap` tokens instead of words.
+        """
+        text = self.chunk_text(i)
+        if not num_overlap:
+            return text
+        if i > 0:
+            previous_start, previous_end = self.starts[i - 1], self.ends[i - 1]
+            if token_offsets is None:
+                context_start = words_start(self.text, previous_start, previous_end, num_overlap)
+            else:
+                context_start = token_offsets.tokens_start(previous_start, previous_end, num_overlap)
+            text = f"{self.text[context_start:previous_end]}\n\n{text}"
+        if i < len(self) - 1:
+            next_start, next_end = self.starts[i + 1], self.ends[i + 1]
+            if token_offsets is None:
+                context_end = words_end(self.text, next_start, next_end, num_overlap)
+            else:
+                context_end = token_offsets.tokens_end(next_start, next_end, num_overlap)
+            text = f"{text}\n\n{self.text[next_start:context_end]}"
+        return text
+
+    def to_nodes(self, num_overlap: int = 0, token_offsets: Optional[TokenOffsets] = None) -> List[TextNode]:
+        """Materialises the chunks as `TextNode`s, with `start_char_idx` and `end_char_idx` set to the chunk's offsets."""
+        return [
+            text_node(text=self.text_with_context(i, num_overlap, token_offsets), start_char_idx=start, end_char_idx=end)
+            for i, (start, end) in enumerate(self)
+        ]
+
+
+def words_start(text: str, start: int, end: int, n_words: int) -> int:
+    """Offset of the last `n_words` space separated words of `text[start:end]`, only looking at the words it needs."""
+    if n_words <= 0:
+        return end
+    position = end
+    for _ in range(n_words):
+        position = text.rfind(" ", start, position)
+        if position == -1:
+            return start
+    return position + 1
+
+
+def words_end(text: str, start: int, end: int, n_words: int) -> int:
+    """Offset just after the first `n_words` space separated words of `text[start:end]`."""
+    if n_words <= 0:
+        return start
+    position = start - 1
+    for _ in range(n_words):
+        position = text.find(" ", position + 1, end)
+        if position == -1:
+            return end
+    return position
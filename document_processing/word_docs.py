@@ -1,4 +1,5 @@
-from typing import Optional
+import os
+from typing import IO, Iterator, Optional, Union
 
 from docx import Document
 from docx.oxml.table import CT_Tbl as table_type
@@ -6,28 +7,57 @@ from docx.oxml.text.paragraph import CT_P as paragraph_type
 from docx.table import Table
 
 from document_processing.base import BaseFileProcessor
+from document_processing.cache import cached_extraction
+from document_processing.docx_xml import DocxBlock, iter_docx_blocks
+from document_processing.instrumentation import timed
+from document_processing.sources import BufferReader, is_path
 
 
 class WordDocXFileProcessor(BaseFileProcessor):
 
     def _get_doc(self):
-        if isinstance(self.file_name, str):
-            return Document(self.file_name)
-        else:
-            raise ValueError(f"file_name must be a string, got '{type(self.file_name)}'")
+        return Document(self._source())
 
+    def _source(self) -> Union[str, IO[bytes]]:
+        if is_path(self.file_name):
+            return os.fspath(self.file_name)  # type: ignore[arg-type]
+        return BufferReader(self.content())
+
+    def iter_blocks(self, target_column: Optional[int] = None) -> Iterator[DocxBlock]:
+        """Yields the text of each paragraph and table in the document body one at a time."""
+        return self._count_blocks(iter_docx_blocks(self._source(), target_column))
+
+    def _count_blocks(self, blocks: Iterator[DocxBlock]) -> Iterator[DocxBlock]:
+        for block in blocks:
+            self.observer.count("tables" if block.kind == "table" else "paragraphs")
+            yield block
+
+    def iter_units(self) -> Iterator[str]:
+        """Yields the text of each paragraph and table, as it appears in `extract_text`."""
+        for block in self.iter_blocks():
+            yield "\n" + block.text
+
+    @timed()
+    @cached_extraction()
     def extract_text(self, target_column: Optional[int] = None) -> str:
         """
         Takes a Word file and extracts the text from it to a string.
         """
+        return "".join("\n" + block.text for block in self.iter_blocks(target_column))
+
+    def extract_text_python_docx(self, target_column: Optional[int] = None) -> str:
+        """
+        Extracts the same text as `extract_text` by walking the python-docx object model, which is a lot slower
+        on documents with many tables.
+        """
         doc = self._get_doc()
         full_text = ""
-        tables = doc.tables
+        tables = iter(doc.tables)
         for element in doc.element.body:
             if isinstance(element, paragraph_type):
                 full_text += "\n" + element.text
             elif isinstance(element, table_type):
-                full_text += "\n" + self.extract_from_table(tables.pop(0), target_column)
+                full_text += "\n" + self.extract_from_table(next(tables), target_column)
         return full_text
 
     def extract_from_table(self, table: Table, target_column: Optional[int]) -> str:
@@ -0,0 +1,53 @@
+import io
+import mmap
+from contextlib import ExitStack
+from pathlib import Path
+
+import pymupdf  # type: ignore
+import pytest
+import tiktoken
+
+# an encoding which needs no download, every byte is a token and words are merged into a single token
+WORDS = ["apples", "bunch", "test", "Goodbye", "sentence"]
+WORD_ENCODING = tiktoken.Encoding(
+    "test_words",
+    pat_str=r" ?\w+|[^\w]",
+    mergeable_ranks={
+        **{bytes([i]): i for i in range(256)},
+        **{word.encode(): 256 + i for i, word in enumerate(WORDS)},
+        **{f" {word}".encode(): 256 + len(WORDS) + i for i, word in enumerate(WORDS)},
+    },
+    special_tokens={},
+)
+
+TEXT = "How many apples in a bunch? This is a test. Goodbye. One more sentence to finish the text off."
+
+SOURCE_KINDS = ["bytes", "bytearray", "memoryview", "bytes_io", "file", "mmap"]
+
+
+def source_of_kind(kind: str, path: str, stack: ExitStack):
+    """The document at the path in memory in one of the ways processors accept, closed with the stack."""
+    data = Path(path).read_bytes()
+    if kind == "bytes":
+        return data
+    if kind == "bytearray":
+        return bytearray(data)
+    if kind == "memoryview":
+        return memoryview(data)
+    if kind == "bytes_io":
+        return io.BytesIO(data)
+    f = stack.enter_context(open(path, "rb"))
+    if kind == "file":
+        return f
+    return stack.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    doc = pymupdf.open()
+    for i in range(5):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i}\nSome text on page {i}.")
+    path = tmp_path / "test.pdf"
+    doc.save(path)
+    return str(path)
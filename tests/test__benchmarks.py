@@ -0,0 +1,52 @@
+import pytest
+
+from benchmarks.run import BenchmarkResult, compare
+from benchmarks.synthetic import (
+    VOCABULARY,
+    SyntheticConfig,
+    local_encoding,
+    make_paragraphs,
+    write_docx,
+    write_pdf,
+)
+from document_processing.docx_xml import iter_docx_blocks
+from document_processing.pdfs import PdfProcessor
+
+CONFIG = SyntheticConfig(pages=3, paragraphs_per_page=2, words_per_paragraph=20, tables=2, table_rows=3, table_columns=3)
+
+
+def test__synthetic_documents(tmp_path):
+    assert make_paragraphs(CONFIG) == make_paragraphs(CONFIG)
+    write_pdf(str(tmp_path / "doc.pdf"), CONFIG)
+    write_docx(str(tmp_path / "doc.docx"), CONFIG)
+
+    pdf = PdfProcessor(str(tmp_path / "doc.pdf"), None)
+    assert pdf.page_count() == 3
+    assert make_paragraphs(CONFIG)[0][0].split()[0] in pdf.extract_text()
+    with pdf._get_doc() as doc:
+        assert sum(len(page.find_tables().tables) for page in doc) == 2
+    assert [block.kind for block in iter_docx_blocks(str(tmp_path / "doc.docx"))].count("table") == 2
+
+
+def test__local_encoding_counts_vocabulary_words_as_single_tokens():
+    text = " ".join(make_paragraphs(CONFIG)[0])
+    tokens = local_encoding().encode_ordinary(text)
+    assert local_encoding().decode(tokens) == text
+    assert len(local_encoding().encode_ordinary(f" {VOCABULARY[-1]}")) == 1
+    # one token per word and one per full stop
+    assert len(tokens) == len(text.split()) + text.count(".")
+
+
+@pytest.mark.parametrize(
+    "seconds,peak_memory_bytes,n_regressions",
+    [
+        (1.0, 100, 0),
+        (1.1, 110, 0),
+        (1.5, 100, 1),
+        (1.5, 200, 2),
+    ],
+)
+def test__compare(seconds: float, peak_memory_bytes: int, n_regressions: int):
+    baseline = {"results": [{"name": "stage", "seconds": 1.0, "peak_memory_bytes": 100}]}
+    results = [BenchmarkResult("stage", seconds, seconds, 1, {}, peak_memory_bytes), BenchmarkResult("new_stage", 5.0, 5.0, 1)]
+    assert len(compare(results, baseline, tolerance=0.2)) == n_regressions
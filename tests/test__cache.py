@@ -0,0 +1,127 @@
+import os
+import time
+from typing import List
+
+import pytest
+from llama_index.core.schema import TextNode
+
+from document_processing.base import BaseChunker
+from document_processing.cache import DiskCache
+from document_processing.chunking import FunctionChunker
+from document_processing.embeddings import TokenCounter
+from document_processing.pdfs import PdfProcessor
+from document_processing.process_folder import _extract
+from tests.conftest import WORD_ENCODING
+
+
+class CountingChunker(BaseChunker):
+    cache_ignore = ("calls",)
+
+    def __init__(self):
+        self.calls: List[str] = []
+
+    def chunk(self, text, num_words_overlap: int) -> List[TextNode]:
+        self.calls.append(text)
+        return [TextNode(text=t, metadata={"n": i}) for i, t in enumerate(text.split("\n")) if t]
+
+    def achunk(self, text: str, num_words_overlap: int):
+        raise NotImplementedError
+
+
+def test__disk_cache_round_trip(tmp_path):
+    cache = DiskCache(tmp_path / "cache")
+    assert cache.get("abc") is None
+    cache.set("abc", b"value")
+    assert cache.get("abc") == b"value"
+    cache.set_json("def", {"a": [1, 2]})
+    assert cache.get_json("def") == {"a": [1, 2]}
+
+
+def test__disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(tmp_path / "cache", max_size_bytes=25)
+    cache.set("aa", b"0" * 10)
+    cache.set("bb", b"1" * 10)
+    # make "aa" the oldest entry before touching it again
+    os.utime(cache._path("aa"), (time.time() - 10, time.time() - 10))
+    os.utime(cache._path("bb"), (time.time() - 5, time.time() - 5))
+    assert cache.get("aa") is not None
+    cache.set("cc", b"2" * 10)
+    assert "aa" in cache
+    assert "bb" not in cache
+    assert "cc" in cache
+
+
+def test__disk_cache_size_is_shared_between_processes(tmp_path):
+    # two caches on the same directory stand in for two worker processes
+    first = DiskCache(tmp_path / "cache", max_size_bytes=25)
+    second = DiskCache(tmp_path / "cache", max_size_bytes=25)
+    first.set("aa", b"0" * 10)
+    second.set("bb", b"1" * 10)
+    os.utime(first._path("aa"), (time.time() - 10, time.time() - 10))
+    first.set("cc", b"2" * 10)
+    assert "aa" not in second
+    assert first._entries_size() <= 25
+
+
+def test__extract_text_cache_hit_skips_parsing(pdf_path, tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path / "cache")
+    expected = PdfProcessor(pdf_path, chunker=None).extract_text()
+    assert PdfProcessor(pdf_path, chunker=None, cache=cache).extract_text() == expected
+
+    processor = PdfProcessor(pdf_path, chunker=None, cache=cache)
+    monkeypatch.setattr(processor, "_get_doc", lambda: pytest.fail("document should not be opened on a cache hit"))
+    assert processor.extract_text() == expected
+    assert processor.extract_text(parallel=True) == expected
+
+
+def test__page_count_is_cached_with_the_extraction(pdf_path, tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path / "cache")
+    assert _extract(PdfProcessor(pdf_path, chunker=None, cache=cache))[1] == 5
+
+    processor = PdfProcessor(pdf_path, chunker=None, cache=cache)
+    monkeypatch.setattr(processor, "_get_doc", lambda: pytest.fail("document should not be opened on a cache hit"))
+    assert _extract(processor) == (PdfProcessor(pdf_path, chunker=None).extract_text(), 5)
+
+
+def test__extract_text_cache_keyed_by_arguments(pdf_path, tmp_path):
+    processor = PdfProcessor(pdf_path, chunker=None, cache=DiskCache(tmp_path / "cache"))
+    assert processor.extract_text() != processor.extract_text(1)
+    assert processor.extract_text(1) == PdfProcessor(pdf_path, chunker=None).extract_text(1)
+
+
+def test__chunk_cache(tmp_path):
+    chunker = CountingChunker()
+    processor = PdfProcessor("unused.pdf", chunker=chunker, cache=DiskCache(tmp_path / "cache"))
+    first = processor.chunk("line one\nline two", num_words_overlap=0)
+    second = processor.chunk("line one\nline two", num_words_overlap=0)
+    assert len(chunker.calls) == 1
+    assert [node.text for node in first] == [node.text for node in second]
+    assert [node.metadata for node in first] == [node.metadata for node in second]
+    processor.chunk("line one\nline two", num_words_overlap=2)
+    assert len(chunker.calls) == 2
+
+
+def split_lines(text: str) -> List[TextNode]:
+    return [TextNode(text=t) for t in text.split("\n") if t]
+
+
+def test__chunker_cache_config_identifies_splitting_function():
+    def chunker(splitting_function, **kwargs) -> FunctionChunker:
+        return FunctionChunker(1, 100, splitting_function, token_counter=TokenCounter("test_words", encoding=WORD_ENCODING), **kwargs)
+
+    assert chunker(split_lines).cache_config()["splitting_function"] == f"{split_lines.__module__}.split_lines"
+    assert chunker(split_lines).cache_config() != chunker(split_lines, packing="greedy").cache_config()
+    # lambdas all have the same name, so chunks made with them are not cached
+    assert chunker(lambda text: split_lines(text)).cache_config() is None
+    with_identity = chunker(lambda text: split_lines(text))
+    with_identity.cache_identity = "lines-v1"
+    assert with_identity.cache_config()["cache_identity"] == "lines-v1"
+
+
+def test__chunk_cache_skipped_without_identity(tmp_path):
+    chunker = CountingChunker()
+    chunker.splitter = lambda text: text.split("\n")
+    processor = PdfProcessor("unused.pdf", chunker=chunker, cache=DiskCache(tmp_path / "cache"))
+    processor.chunk("line one\nline two", num_words_overlap=0)
+    processor.chunk("line one\nline two", num_words_overlap=0)
+    assert len(chunker.calls) == 2
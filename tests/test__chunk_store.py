@@ -0,0 +1,78 @@
+import pytest
+
+from document_processing import chunk_store
+from document_processing.chunk_store import ChunkStore
+from document_processing.chunking import ChunkMeta, Chunks
+
+
+def chunks(texts, numbers, langs) -> Chunks:
+    return Chunks(chunks=texts, metas=[ChunkMeta(chunk_number=n, length=len(t), lang=lang) for t, n, lang in zip(texts, numbers, langs)])
+
+
+DOCUMENT = chunks(["ghi", "abc", "", "déf ✓", "jkl"], [3, 0, 2, 2, 4], ["en", "en", "unknown", "fr", "en"])
+
+
+def test__round_trip(tmp_path):
+    with ChunkStore.from_chunks(tmp_path / "store", DOCUMENT) as store:
+        assert len(store) == 5
+        assert store.to_chunks() == DOCUMENT
+        assert store[3] == ("déf ✓", DOCUMENT.metas[3])
+        assert store[-1] == ("jkl", DOCUMENT.metas[4])
+        assert store.ordered_texts() == DOCUMENT.order_chunks() == ["abc", "", "déf ✓", "ghi", "jkl"]
+        assert [text for text, _ in store.iter_ordered()] == DOCUMENT.order_chunks()
+        assert store.to_chunks(ordered=True).chunks == DOCUMENT.order_chunks()
+        with pytest.raises(IndexError):
+            store[5]
+
+    # opening the directory again reads the same chunks
+    with ChunkStore(tmp_path / "store") as store:
+        assert list(store) == list(zip(DOCUMENT.chunks, DOCUMENT.metas))
+
+
+def test__open_does_not_create_a_store(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ChunkStore(tmp_path / "store")
+    assert not (tmp_path / "store").exists()
+    with pytest.raises(FileNotFoundError):
+        ChunkStore(tmp_path)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test__from_chunks_does_not_append_to_a_store(tmp_path):
+    ChunkStore.from_chunks(tmp_path, chunks(["b", "a"], [1, 0], ["en", "en"])).close()
+    with pytest.raises(FileExistsError):
+        ChunkStore.from_chunks(tmp_path, chunks(["b", "a"], [1, 0], ["en", "en"]))
+    with ChunkStore(tmp_path) as store:
+        assert store.to_chunks() == chunks(["b", "a"], [1, 0], ["en", "en"])
+
+
+def test__append(tmp_path):
+    with ChunkStore(tmp_path, create=True) as store:
+        assert len(store) == 0 and store.ordered_texts() == []
+        store.extend(DOCUMENT.chunks[:2], DOCUMENT.metas[:2])
+        store.append(DOCUMENT.chunks[2], DOCUMENT.metas[2])
+        store.extend(DOCUMENT.chunks[3:], DOCUMENT.metas[3:])
+        assert store.to_chunks() == DOCUMENT
+        with pytest.raises(ValueError):
+            store.extend(["a"], [])
+
+
+def test__unfinished_append_is_dropped(tmp_path):
+    ChunkStore.from_chunks(tmp_path, chunks(["abc"], [0], ["en"])).close()
+    # an append which wrote some of the files but not the header
+    with open(tmp_path / "text.bin", "ab") as f:
+        f.write(b"partial")
+    with open(tmp_path / "ends.bin", "ab") as f:
+        f.write(b"\x01")
+
+    with ChunkStore(tmp_path) as store:
+        assert store.to_chunks() == chunks(["abc"], [0], ["en"])
+        store.append("def", ChunkMeta(chunk_number=1, length=3, lang="en"))
+        assert store.to_chunks() == chunks(["abc", "def"], [0, 1], ["en", "en"])
+
+
+def test__extend_writes_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunk_store, "EXTEND_BATCH_CHUNKS", 2)
+    with ChunkStore.from_chunks(tmp_path, DOCUMENT) as store:
+        assert store.to_chunks() == DOCUMENT
+        assert store.ordered_texts() == DOCUMENT.order_chunks()
@@ -1,10 +1,15 @@
+import asyncio
+import random
 import re
 from typing import List
 
 import pytest
 from llama_index.core.schema import TextNode
 
+from document_processing.base import BaseChunker
 from document_processing.chunking import ChunkMeta, Chunks, FunctionChunker
+from document_processing.embeddings import TokenCounter
+from tests.conftest import WORD_ENCODING
 
 
 def splitter(text: str):
@@ -142,3 +147,140 @@ def test__extract_context_from_chunk(text, n_spaces, from_start, expected):
     func_chunk = FunctionChunker(1, 10, splitter, chat_model="gpt-4o")
     context = func_chunk.extract_context_from_chunk(text, n_spaces, from_start=from_start)
     assert context == expected
+
+
+def test__async_split_large_chunks_down_runs_concurrently():
+    running = 0
+    max_running = 0
+
+    async def async_splitter(text: str):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return splitter(text)
+
+    func_chunk = FunctionChunker(1, 20, async_splitter, token_counter=TokenCounter("test_words", encoding=WORD_ENCODING), max_concurrency=2)
+    chunks = [TextNode(text="How many apples in a bunch? This is a test. Goodbye.")] * 5 + [TextNode(text="a test.")]
+    new_chunks = asyncio.run(func_chunk.async_split_large_chunks_down(chunks))
+    assert [chunk.text for chunk in new_chunks] == ["How many apples in a bunch", " This is a test", " Goodbye"] * 5 + ["a test."]
+    assert max_running == 2
+
+
+def test__achunk_many_keeps_order_and_limits_concurrency():
+    class SleepingChunker(BaseChunker):
+        def __init__(self):
+            self.running = 0
+            self.most_running = 0
+
+        def chunk(self, text: str, num_words_overlap: int) -> List[TextNode]:
+            raise NotImplementedError
+
+        async def achunk(self, text: str, num_words_overlap: int) -> List[TextNode]:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+            # later documents finish first
+            await asyncio.sleep(0.001 * (10 - int(text)))
+            self.running -= 1
+            return [TextNode(text=text)]
+
+    chunker = SleepingChunker()
+    texts = [str(i) for i in range(10)]
+    results = asyncio.run(chunker.achunk_many(texts, 0, max_concurrency=3))
+    assert [[node.text for node in nodes] for nodes in results] == [[text] for text in texts]
+    assert chunker.most_running == 3
+
+
+def test__async_ensure_chunks_small_enough_stops_after_max_attempts():
+    n_calls = 0
+
+    async def async_no_op_splitter(text: str):
+        nonlocal n_calls
+        n_calls += 1
+        return [TextNode(text=text)]
+
+    func_chunk = FunctionChunker(1, 2, async_no_op_splitter, token_counter=TokenCounter("test_words", encoding=WORD_ENCODING))
+    chunks = asyncio.run(func_chunk.async_ensure_chunks_small_enough([TextNode(text="How many apples in a bunch")], max_attempts_to_split=3))
+    assert [chunk.text for chunk in chunks] == ["How many apples in a bunch"]
+    assert n_calls == 3
+
+
+def stream_pages(n_pages: int) -> List[str]:
+    return ["".join(f"Paragraph {i} of page {page} has a few words in it.\n" for i in range(3)) for page in range(n_pages)]
+
+
+STREAM_WORDS = ["the", "a", "of", "apples", "bunch", "test", "sentence", "Goodbye", "results", "method", "page"]
+
+
+def random_pages(rng: random.Random) -> List[str]:
+    """Pages of paragraphs from a single word to a few hundred characters long, so chunks span several windows."""
+    return [
+        "".join(" ".join(rng.choice(STREAM_WORDS) for _ in range(rng.choice([1, 2, 3, 8, 20, 60]))) + "\n" for _ in range(rng.randint(1, 8)))
+        for _ in range(rng.randint(3, 15))
+    ]
+
+
+@pytest.mark.parametrize("packing", [None, "greedy"])
+@pytest.mark.parametrize("seed", range(25))
+def test__chunk_stream_across_windows(packing, seed: int):
+    rng = random.Random(seed)
+    pages = random_pages(rng)
+    text = "".join(pages)
+    num_words_overlap = rng.choice([0, 3])
+    chunker = FunctionChunker(
+        rng.choice([5, 20, 40]),
+        rng.choice([60, 100, 200]),
+        lambda text: [TextNode(text=t) for t in text.split("\n") if t],
+        token_counter=TokenCounter("test_words", encoding=WORD_ENCODING),
+        use_spans=True,
+        packing=packing,
+    )
+    nodes = list(chunker.chunk_stream(iter(pages), num_words_overlap, window_chars=rng.choice([50, 200, 1000])))
+    assert [node.metadata["chunk_number"] for node in nodes] == list(range(len(nodes)))
+    # the chunks cover the text, leaving out only the line breaks the paragraphs were split at
+    bounds = [0] + [index for node in nodes for index in (node.start_char_idx, node.end_char_idx)] + [len(text)]
+    assert bounds == sorted(bounds)
+    assert all(not text[end:start].strip() for end, start in zip(bounds[::2], bounds[1::2]))
+    if packing == "greedy":
+        expected = chunker.chunk(text, num_words_overlap)
+        assert [node.text for node in nodes] == [node.text for node in expected]
+        assert [(node.start_char_idx, node.end_char_idx) for node in nodes] == [(node.start_char_idx, node.end_char_idx) for node in expected]
+        assert [node.metadata for node in nodes] == [node.metadata for node in expected]
+    else:
+        # merging depends on the whole document, so the boundaries can differ from `chunk`, but no chunk is left short
+        assert all(chunker.count_tokens(text[node.start_char_idx : node.end_char_idx]) >= chunker.min_length for node in nodes[:-1])
+
+
+def test__chunk_stream_yields_before_the_end():
+    consumed = []
+
+    def segments():
+        for page in stream_pages(20):
+            consumed.append(page)
+            yield page
+
+    chunker = FunctionChunker(
+        1, 200, lambda text: [TextNode(text=t) for t in text.split("\n") if t], token_counter=TokenCounter("test_words", encoding=WORD_ENCODING)
+    )
+    next(chunker.chunk_stream(segments(), 2, window_chars=300))
+    assert 0 < len(consumed) < 5
+
+
+def test__chunk_stream_does_not_rechunk_a_window_without_breaks():
+    class CountingChunker(FunctionChunker):
+        n_calls = 0
+
+        def chunk_spans(self, text: str):
+            self.n_calls += 1
+            return super().chunk_spans(text)
+
+    # 64 segments of a single paragraph, so no window finishes a chunk before the end
+    segments = ["word " * 20] * 64
+    chunker = CountingChunker(
+        1, 10_000, lambda text: [TextNode(text=t) for t in text.split("\n") if t], token_counter=TokenCounter("test_words", encoding=WORD_ENCODING)
+    )
+    nodes = list(chunker.chunk_stream(iter(segments), 0, window_chars=100))
+    assert [node.text for node in nodes] == ["".join(segments)]
+    # chunked at 100, 200, 400, ... characters and once more at the end, rather than after every segment
+    assert chunker.n_calls <= 8
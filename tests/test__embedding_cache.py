@@ -0,0 +1,63 @@
+import asyncio
+import pickle
+from typing import List
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from document_processing.cache import DiskCache
+from document_processing.embedding_cache import CachedEmbedding
+from document_processing.local_embeddings import HashingEmbedding
+
+
+class CountingEmbedding(HashingEmbedding):
+    _batch_sizes: List[int] = PrivateAttr(default_factory=list)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self._batch_sizes.append(len(texts))
+        return super()._get_text_embeddings(texts)
+
+    @property
+    def batch_sizes(self) -> List[int]:
+        return self._batch_sizes
+
+
+def test__hashing_embedding_is_deterministic():
+    model = HashingEmbedding(embed_dim=64)
+    assert model.get_text_embedding("The same text") == HashingEmbedding(embed_dim=64).get_text_embedding("The same text")
+    assert model.get_text_embedding("The same text") != model.get_text_embedding("Different words")
+    assert model.similarity(model.get_text_embedding("apples and pears"), model.get_text_embedding("apples and pears")) > 0.99
+
+
+def test__cached_embedding_only_embeds_missing_texts():
+    inner = CountingEmbedding(embed_dim=16)
+    model = CachedEmbedding(inner, embed_batch_size=2)
+    texts = ["header", "disclaimer", "header", "body one", "body two"]
+
+    embeddings = model.get_text_embedding_batch(texts)
+    assert embeddings == [inner._embed(text) for text in texts]
+    # batches of two, "header" is only embedded once
+    assert inner.batch_sizes == [2, 1, 1]
+
+    model.get_text_embedding_batch(["disclaimer", "header", "body three"])
+    assert inner.batch_sizes == [2, 1, 1, 1]
+    assert model.stats.misses == 5
+
+
+def test__cached_embedding_persists_on_disk(tmp_path):
+    texts = ["header", "disclaimer"]
+    first = CachedEmbedding(HashingEmbedding(embed_dim=16), cache=DiskCache(tmp_path))
+    expected = first.get_text_embedding_batch(texts)
+
+    inner = CountingEmbedding(embed_dim=16)
+    second = CachedEmbedding(inner, cache=DiskCache(tmp_path))
+    assert second.get_text_embedding_batch(texts) == expected
+    assert inner.batch_sizes == []
+    assert second.stats.disk_hits == 2
+
+
+def test__cached_embedding_async_and_pickle():
+    model = CachedEmbedding(HashingEmbedding(embed_dim=16))
+    embeddings = asyncio.run(model.aget_text_embedding_batch(["a b", "c d"]))
+    assert embeddings == model.get_text_embedding_batch(["a b", "c d"])
+    assert model.stats.memory_hits == 2
+    assert pickle.loads(pickle.dumps(model)).get_text_embedding("a b") == embeddings[0]
@@ -0,0 +1,86 @@
+import pytest
+import tiktoken
+
+from document_processing.embeddings import TokenCounter, get_encoding
+from tests.conftest import WORD_ENCODING
+
+# runs of two and three spaces are single tokens, so splitting whitespace differently changes the count
+SPACES_ENCODING = tiktoken.Encoding(
+    "test_spaces",
+    pat_str=r"""[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n/]*|\s*[\r\n]+|\s+(?!\S)|\s+""",
+    mergeable_ranks={**{bytes([i]): i for i in range(256)}, b"  ": 256, b"   ": 257},
+    special_tokens={},
+)
+
+
+PIECES = [
+    ["This is ", "a test", "."],
+    ["How many apples in a bunch? ", "This is ", "a test.", " Goodbye."],
+    ["Section 1", ".2 ", "Introduction\n", "\n  ", "The results", "'s table  ", "  ", "1234", "5678"],
+    ["", "word", "", "s and more words"],
+]
+
+
+def assert_incremental_count_matches(counter: TokenCounter, pieces):
+    running = counter.incremental()
+    text = ""
+    for piece in pieces:
+        running.append(piece)
+        text += piece
+        assert running.count == len(counter.encoding.encode_ordinary(text))
+    assert len(running) == len(text)
+
+
+@pytest.mark.parametrize("pieces", PIECES)
+@pytest.mark.parametrize("encoding", [WORD_ENCODING, SPACES_ENCODING])
+def test__incremental_count_matches_full_count(pieces, encoding: tiktoken.Encoding):
+    assert_incremental_count_matches(TokenCounter(encoding.name, encoding=encoding), pieces)
+
+
+def test__incremental_count_matches_full_count_of_a_real_model():
+    try:
+        get_encoding("gpt-4o")
+    except Exception as error:
+        pytest.skip(f"the gpt-4o encoding could not be loaded: {error}")
+    for pieces in PIECES:
+        assert_incremental_count_matches(TokenCounter("gpt-4o"), pieces)
+
+
+@pytest.mark.parametrize(
+    "pieces",
+    [
+        ["1a", "..231", "   23\n", "", " "],
+        ["a ", " ", "  b", "   ", "c\n  ", " d"],
+        ["no", "spaces", "at", "all"],
+    ],
+)
+def test__incremental_count_matches_full_count_across_whitespace(pieces):
+    running = TokenCounter("test_spaces", encoding=SPACES_ENCODING).incremental()
+    text = ""
+    for piece in pieces:
+        running.append(piece)
+        text += piece
+        assert running.count == len(SPACES_ENCODING.encode_ordinary(text))
+
+
+def test__token_counter_memoizes_counts():
+    counter = TokenCounter("test_words", encoding=WORD_ENCODING)
+    first = counter.count("This is a test")
+    second = counter.count("This is a test")
+    assert first == second
+    assert counter.stats.hits == 1
+    assert counter.stats.misses == 1
+
+
+def test__token_counter_evicts_least_recently_used():
+    counter = TokenCounter("test_words", max_cache_size=2, encoding=WORD_ENCODING)
+    counter.count("a")
+    counter.count("b")
+    counter.count("a")
+    counter.count("c")
+    counter.count("a")
+    counter.count("b")
+    stats = counter.stats
+    assert stats.size == 2
+    assert stats.evictions == 2
+    assert stats.hits == 2
@@ -0,0 +1,130 @@
+import io
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+from document_processing.factory import (
+    FileProcessorRegistry,
+    file_processor_factory,
+    sniff_file_processor,
+)
+from document_processing.pdfs import PdfProcessor
+from document_processing.sources import BufferReader, detect_file_type
+from document_processing.word_docs import WordDocXFileProcessor
+
+
+@pytest.mark.parametrize(
+    "file_path,expected",
+    [
+        ("folder/file.pdf", PdfProcessor),
+        ("file.PDF", PdfProcessor),
+        ("file.docx", WordDocXFileProcessor),
+    ],
+)
+def test__file_processor_factory(file_path, expected):
+    assert file_processor_factory(file_path) is expected
+
+
+def test__registry_imports_processors_on_first_lookup():
+    registry = FileProcessorRegistry()
+    registry.register(".Txt", "document_processing.pdfs:PdfProcessor")
+    registry.register("doc", WordDocXFileProcessor)
+    assert registry._processors["txt"] == "document_processing.pdfs:PdfProcessor"
+    assert registry["txt"] is PdfProcessor
+    assert registry._processors["txt"] is PdfProcessor
+    assert registry["doc"] is WordDocXFileProcessor
+    with pytest.raises(KeyError):
+        registry["xlsx"]
+
+
+@pytest.mark.parametrize("module", ["document_processing.factory", "document_processing.chunking", "document_processing.process_folder"])
+def test__import_does_not_load_backends(module):
+    code = f"import sys, {module}; print(sorted(name for name in ('llama_index.core', 'pymupdf', 'docx') if name in sys.modules))"
+    output = subprocess.run([sys.executable, "-W", "ignore", "-c", code], capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+
+def zip_bytes(*names: str) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as package:
+        for name in names:
+            package.writestr(name, "<xml/>")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    "content,expected",
+    [
+        (b"%PDF-1.7\n%...", "pdf"),
+        (b"\xef\xbb\xbf junk %PDF-1.4\n", "pdf"),
+        (zip_bytes("[Content_Types].xml", "word/document.xml"), "docx"),
+        (zip_bytes("[Content_Types].xml", "xl/workbook.xml"), "xlsx"),
+        (zip_bytes("notes.txt"), "zip"),
+        (b"PK\x03\x04 but not a zip", None),
+        (b"plain text", None),
+    ],
+)
+def test__detect_file_type(content: bytes, expected):
+    assert detect_file_type(content) == expected
+    assert detect_file_type(io.BytesIO(content)) == expected
+
+
+@pytest.mark.parametrize(
+    "content,expected",
+    [
+        (b"%PDF-1.7\n", PdfProcessor),
+        (zip_bytes("word/document.xml"), WordDocXFileProcessor),
+    ],
+)
+def test__file_processor_factory_sniffs_content(tmp_path, content: bytes, expected):
+    assert file_processor_factory(content) is expected
+    assert file_processor_factory(memoryview(content)) is expected
+    # a path with the wrong extension
+    path = tmp_path / "download.bin"
+    path.write_bytes(content)
+    assert file_processor_factory(str(path), sniff=True) is expected
+
+
+def test__file_processor_factory_rejects_unknown_content():
+    with pytest.raises(ValueError):
+        file_processor_factory(zip_bytes("xl/workbook.xml"))
+
+
+class Stream(io.RawIOBase):
+    """A stream which can only be read once, like a network response."""
+
+    def __init__(self, content: bytes):
+        self._content = io.BytesIO(content)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        return self._content.readinto(target)
+
+
+def test__sniffing_a_stream_keeps_its_contents():
+    pymupdf = pytest.importorskip("pymupdf")
+    doc = pymupdf.open()
+    doc.new_page().insert_text((72, 72), "Some text in a stream")
+    content = doc.tobytes()
+
+    with pytest.raises(ValueError):
+        file_processor_factory(Stream(content))
+    processor_class, source = sniff_file_processor(Stream(content))
+    assert processor_class is PdfProcessor
+    assert "Some text in a stream" in processor_class(source, chunker=None).extract_text()
+    # sources which can be read again are given back as they are
+    stream = io.BytesIO(content)
+    assert sniff_file_processor(stream) == (PdfProcessor, stream)
+    assert sniff_file_processor("file.docx") == (WordDocXFileProcessor, "file.docx")
+
+
+def test__buffer_reader_reads_nothing_past_the_end():
+    reader = BufferReader(b"abc")
+    reader.seek(10)
+    assert reader.read(4) == b""
+    reader.seek(-1, io.SEEK_END)
+    assert reader.read() == b"c"
@@ -0,0 +1,136 @@
+import functools
+import random
+import re
+from typing import Iterator, List, Optional
+
+import pytest
+from llama_index.core.schema import TextNode
+
+from document_processing.base import BaseFileProcessor
+from document_processing.chunking import FunctionChunker
+from document_processing.embeddings import TokenCounter
+from document_processing.incremental import Manifest, process_incrementally
+from tests.conftest import WORD_ENCODING
+
+
+class PagesProcessor(BaseFileProcessor):
+    def __init__(self, pages: List[str], chunker: FunctionChunker):
+        super().__init__("pages", chunker)
+        self.pages = pages
+
+    def iter_units(self) -> Iterator[str]:
+        return iter(self.pages)
+
+    def extract_text(self) -> str:
+        return "".join(self.pages)
+
+
+def paragraphs(text: str) -> List[TextNode]:
+    return [TextNode(text=t) for t in re.split(r"\n", text) if t]
+
+
+def chunker(min_length_tokens: int = 10, max_length: int = 200, **kwargs) -> FunctionChunker:
+    return FunctionChunker(
+        min_length_tokens, max_length, paragraphs, token_counter=TokenCounter("test_words", encoding=WORD_ENCODING), use_spans=True, **kwargs
+    )
+
+
+def page(number: int, revision: int = 0) -> str:
+    return "".join(f"Paragraph {i} of page {number}, revision {revision}, with some more words in it.\n" for i in range(3))
+
+
+PAGES = [page(number) for number in range(10)]
+
+
+def full_chunks(pages: List[str], num_words_overlap: int) -> List[str]:
+    return [node.text for node in chunker().chunk("".join(pages), num_words_overlap)]
+
+
+@pytest.mark.parametrize(
+    "new_pages",
+    [
+        PAGES,
+        PAGES[:4] + [page(4, revision=1)] + PAGES[5:],
+        PAGES[:3] + [page(20)] + PAGES[3:],
+        PAGES[:3] + PAGES[5:],
+        [page(0, revision=1)] + PAGES[1:] + [page(10)],
+    ],
+)
+@pytest.mark.parametrize("num_words_overlap", [0, 3])
+def test__incremental_matches_chunking_everything(new_pages: List[str], num_words_overlap: int):
+    first = process_incrementally(PagesProcessor(PAGES, chunker()), num_words_overlap)
+    assert [node.text for node in first.nodes] == full_chunks(PAGES, num_words_overlap)
+    assert first.diff.added == [node.id_ for node in first.nodes] and not first.diff.unchanged
+
+    result = process_incrementally(PagesProcessor(new_pages, chunker()), num_words_overlap, first.manifest)
+    assert [node.text for node in result.nodes] == full_chunks(new_pages, num_words_overlap)
+    text = "".join(new_pages)
+    assert [text[node.start_char_idx : node.end_char_idx] for node in result.nodes] == [
+        text[chunk.start : chunk.end] for chunk in result.manifest.chunks
+    ]
+    assert sorted(result.diff.unchanged + result.diff.added) == sorted(node.id_ for node in result.nodes)
+    assert set(result.diff.removed).isdisjoint(node.id_ for node in result.nodes)
+    if new_pages == PAGES:
+        assert result.rechunked_chars == 0 and not result.diff.added and not result.diff.removed
+    else:
+        # only the changed pages and the chunks next to them are chunked again, the last revision changes two pages
+        assert 0 < result.rechunked_chars <= 2 * 3 * len(PAGES[0])
+        assert len(result.diff.unchanged) >= len(result.nodes) - 9
+
+
+RANDOM_WORDS = "the a of apples bunch test sentence Goodbye results method data page table".split()
+
+
+def random_page(rng: random.Random) -> str:
+    return "".join(" ".join(rng.choices(RANDOM_WORDS, k=rng.choice([1, 2, 3, 8, 20, 40]))) + "\n" for _ in range(rng.randint(1, 6)))
+
+
+def random_revision(rng: random.Random, pages: List[str]) -> List[str]:
+    pages = list(pages)
+    i = rng.randrange(len(pages))
+    kind = rng.choice(["edit", "insert", "delete"])
+    if kind == "edit":
+        pages[i] = random_page(rng)
+    elif kind == "insert":
+        pages.insert(i, random_page(rng))
+    elif len(pages) > 1:
+        del pages[i]
+    return pages
+
+
+@pytest.mark.parametrize("packing", [None, "greedy", "optimal"])
+def test__incremental_mostly_matches_chunking_everything(packing: Optional[str]):
+    rng = random.Random(0)
+    mismatches = 0
+    for _ in range(40):
+        pages = [random_page(rng) for _ in range(rng.randint(3, 12))]
+        min_length, max_length, num_words_overlap = rng.choice([5, 20, 40]), rng.choice([60, 100, 200]), rng.choice([0, 3])
+        random_chunker = functools.partial(chunker, min_length, max_length=max_length, packing=packing)
+        first = process_incrementally(PagesProcessor(pages, random_chunker()), num_words_overlap)
+        new_pages = random_revision(rng, pages)
+        result = process_incrementally(PagesProcessor(new_pages, random_chunker()), num_words_overlap, first.manifest)
+        expected = [node.text for node in random_chunker().chunk("".join(new_pages), num_words_overlap)]
+        mismatches += [node.text for node in result.nodes] != expected
+
+        # whatever the boundaries, the chunks are slices of the text in order and cover all of it but whitespace
+        text = "".join(new_pages)
+        chunks = result.manifest.chunks
+        assert [text[node.start_char_idx : node.end_char_idx] for node in result.nodes] == [text[chunk.start : chunk.end] for chunk in chunks]
+        assert not text[: chunks[0].start].strip() and not text[chunks[-1].end :].strip()
+        assert all(
+            chunk.start < chunk.end <= next_chunk.start and not text[chunk.end : next_chunk.start].strip()
+            for chunk, next_chunk in zip(chunks, chunks[1:])
+        )
+    # the chunks at the edges of every chunked region are checked, the ones inside it can come out differently
+    assert mismatches <= (1 if packing != "optimal" else 6)
+
+
+def test__changed_chunker_settings_chunk_everything(tmp_path):
+    first = process_incrementally(PagesProcessor(PAGES, chunker()), 0)
+    first.manifest.save(tmp_path / "manifest.json")
+    previous = Manifest.load(tmp_path / "manifest.json")
+    assert previous == first.manifest
+
+    result = process_incrementally(PagesProcessor(PAGES, chunker(min_length_tokens=100)), 0, previous)
+    assert result.rechunked_chars == len("".join(PAGES))
+    assert len(result.nodes) < len(first.nodes)
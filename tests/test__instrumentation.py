@@ -0,0 +1,65 @@
+import re
+
+import numpy as np
+import pymupdf
+import pytest
+import tiktoken
+from llama_index.core.schema import TextNode
+
+from document_processing.chunking import FunctionChunker
+from document_processing.embeddings import TokenCounter
+from document_processing.instrumentation import (
+    NULL_OBSERVER,
+    MetricsAggregator,
+    percentile,
+)
+from document_processing.pdfs import PdfProcessor
+
+BYTE_ENCODING = tiktoken.Encoding("test_bytes", pat_str=r"\S+|\s+", mergeable_ranks={bytes([i]): i for i in range(256)}, special_tokens={})
+
+
+def splitter(text: str):
+    return [TextNode(text=t) for t in re.split(r"(?<=\.)", text) if t]
+
+
+@pytest.mark.parametrize("values", [[1.0], [3.0, 1.0], [5.0, 1.0, 4.0, 2.0, 3.0], list(map(float, range(101)))])
+@pytest.mark.parametrize("q", [0, 50, 90, 99, 100])
+def test__percentile_matches_numpy(values, q):
+    assert percentile(sorted(values), q) == pytest.approx(np.percentile(values, q))
+
+
+def test__null_observer_does_nothing():
+    assert not NULL_OBSERVER.enabled
+    assert NULL_OBSERVER.span("stage") is NULL_OBSERVER.span("other stage")
+    NULL_OBSERVER.count("counter")
+
+
+def test__aggregator_collects_spans_and_counters(tmp_path):
+    for name, n_pages in (("a.pdf", 2), ("b.pdf", 3)):
+        doc = pymupdf.open()
+        for _ in range(n_pages):
+            doc.new_page().insert_text((50, 50), "One sentence here. Another one. And a last sentence.")
+        doc.save(str(tmp_path / name))
+
+    observer = MetricsAggregator()
+    chunker = FunctionChunker(10, 30, splitter, token_counter=TokenCounter("test_bytes", encoding=BYTE_ENCODING), observer=observer)
+    for name in ("a.pdf", "b.pdf"):
+        processor = PdfProcessor(str(tmp_path / name), chunker, observer=observer)
+        processor.chunk(processor.extract_text(), 2)
+
+    documents = observer.documents()
+    assert documents[str(tmp_path / "a.pdf")].counters["pages"] == 2
+    assert documents[str(tmp_path / "b.pdf")].counters["pages"] == 3
+    assert set(documents[str(tmp_path / "a.pdf")].seconds) == {
+        "extract_text",
+        "chunk",
+        "split",
+        "ensure_chunks_small_enough",
+        "ensure_chunks_large_enough",
+        "add_context",
+        "language_detection",
+    }
+    assert observer.counters()["chunks"] > 0
+    assert observer.counters()["tokens_counted"] > 0
+    assert observer.stage_stats()["chunk"].count == 2
+    assert observer.document_stats()["extract_text"].count == 2
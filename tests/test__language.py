@@ -0,0 +1,45 @@
+import pytest
+
+from document_processing.language import LanguageDetector
+
+ENGLISH = "The quick brown fox jumps over the lazy dog while the farmer watches from the field."
+GERMAN = "Der schnelle braune Fuchs springt über den faulen Hund, während der Bauer vom Feld aus zusieht."
+FRENCH = "Le renard brun rapide saute par-dessus le chien paresseux pendant que le fermier regarde depuis le champ."
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        (ENGLISH, "en"),
+        (GERMAN, "de"),
+        (FRENCH, "fr"),
+        ("1234 5678 90", "unknown"),
+        ("", "unknown"),
+    ],
+)
+def test__detect(text: str, expected: str):
+    assert LanguageDetector().detect(text) == expected
+
+
+def test__detect_is_deterministic_and_cached():
+    texts = ["ok", "la la", "yes no", ENGLISH[:20]] * 5
+    detector = LanguageDetector()
+    languages = detector.detect_many(texts)
+    assert LanguageDetector().detect_many(texts) == languages
+    assert len(detector._cache) == 4
+
+
+def test__detect_only_uses_the_sample():
+    detector = LanguageDetector(sample_chars=len(ENGLISH))
+    assert detector.detect(ENGLISH + GERMAN * 20) == "en"
+
+
+def test__per_document_inherits_the_document_language():
+    chunks = [ENGLISH, ENGLISH, "Ok. Hi.", "12 34", GERMAN, ENGLISH]
+    languages = LanguageDetector(per_document=True).detect_many(chunks)
+    assert languages == ["en", "en", "en", "en", "de", "en"]
+
+
+def test__parallel_detection_matches_serial():
+    texts = [f"{text} {i}" for i in range(50) for text in (ENGLISH, GERMAN, FRENCH)]
+    assert LanguageDetector(max_workers=2).detect_many(texts) == LanguageDetector().detect_many(texts)
@@ -0,0 +1,82 @@
+import random
+import re
+
+import pytest
+from llama_index.core.schema import TextNode
+
+from document_processing.chunking import FunctionChunker
+from document_processing.embeddings import TokenCounter
+from document_processing.packing import pack, pack_greedy, pack_optimal
+from tests.conftest import TEXT, WORD_ENCODING
+
+
+@pytest.mark.parametrize(
+    "token_counts,min_tokens,max_tokens,expected_ranges,expected_undersized",
+    [
+        ([], 5, 10, [], []),
+        ([3], 5, 10, [(0, 1)], [0]),
+        ([4, 4, 4, 4], 5, 10, [(0, 2), (2, 4)], []),
+        # the short last chunk is merged into the previous one
+        ([6, 2], 5, 10, [(0, 2)], []),
+        # or takes pieces from it when they do not fit together
+        ([3, 3, 3, 2], 5, 10, [(0, 2), (2, 4)], []),
+        # a short first chunk is merged forwards
+        ([2, 9, 8], 5, 10, [(0, 1), (1, 2), (2, 3)], [0]),
+        ([2, 8, 9], 5, 10, [(0, 2), (2, 3)], []),
+    ],
+)
+def test__pack_greedy(token_counts, min_tokens, max_tokens, expected_ranges, expected_undersized):
+    packing = pack_greedy(token_counts, min_tokens, max_tokens)
+    assert packing.ranges == expected_ranges
+    assert packing.undersized == expected_undersized
+    assert packing.token_counts == [sum(token_counts[first:last]) for first, last in expected_ranges]
+
+
+@pytest.mark.parametrize("mode", ["greedy", "optimal"])
+def test__pack_reports_oversized_pieces(mode: str):
+    packing = pack([4, 12, 4, 4], 5, 10, mode)
+    assert packing.oversized == [1]
+    assert (1, 2) in packing.ranges
+
+
+def test__pack_optimal_evens_out_sizes():
+    # greedy fills the first chunk and leaves little for the second
+    assert pack_greedy([3, 3, 3, 3, 1], 2, 10).token_counts == [9, 4]
+    assert pack_optimal([3, 3, 3, 3, 1], 2, 10).token_counts == [6, 7]
+
+
+@pytest.mark.parametrize("mode", ["greedy", "optimal"])
+def test__pack_is_bounded(mode: str):
+    rng = random.Random(0)
+    for _ in range(200):
+        min_tokens = rng.randint(1, 20)
+        max_tokens = min_tokens + rng.randint(0, 40)
+        token_counts = [rng.randint(0, max_tokens + 5) for _ in range(rng.randint(0, 30))]
+        packing = pack(token_counts, min_tokens, max_tokens, mode)
+        assert [i for first, last in packing.ranges for i in range(first, last)] == list(range(len(token_counts)))
+        for (first, last), size in zip(packing.ranges, packing.token_counts):
+            assert size <= max_tokens or (last - first == 1 and first in packing.oversized)
+        assert pack(token_counts, min_tokens, max_tokens, mode) == packing
+
+
+def test__pack_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        pack([1, 2], 1, 2, "best")
+    with pytest.raises(ValueError):
+        FunctionChunker(1, 2, lambda text: [], packing="best")
+
+
+@pytest.mark.parametrize("use_spans", [False, True])
+@pytest.mark.parametrize("packing", ["greedy", "optimal"])
+def test__function_chunker_packing(use_spans: bool, packing: str):
+    def splitter(text: str):
+        return [TextNode(text=t) for t in re.split(r"(?<=[.?]) ", text) if t]
+
+    token_counter = TokenCounter("test_words", encoding=WORD_ENCODING)
+    chunker = FunctionChunker(10, 35, splitter, token_counter=token_counter, use_spans=use_spans, packing=packing)
+    nodes = chunker.chunk(TEXT, 0)
+    assert len(nodes) > 1
+    for node in nodes:
+        assert 10 <= token_counter.count(node.text) <= 35
+    if use_spans:
+        assert [TEXT[node.start_char_idx : node.end_char_idx] for node in nodes] == [node.text for node in nodes]
@@ -0,0 +1,68 @@
+from contextlib import ExitStack
+
+import pymupdf  # type: ignore
+import pytest
+
+from document_processing.pdfs import PdfProcessor
+from tests.conftest import SOURCE_KINDS, source_of_kind
+
+
+def test__extract_text_matches_page_by_page_text(pdf_path):
+    expected = "".join(page.get_text() for page in pymupdf.open(pdf_path))
+    assert PdfProcessor(pdf_path, chunker=None).extract_text() == expected
+
+
+def test__iter_pages_offsets(pdf_path):
+    processor = PdfProcessor(pdf_path, chunker=None)
+    text = processor.extract_text()
+    pages = list(processor.iter_pages())
+    assert [page.page_number for page in pages] == [0, 1, 2, 3, 4]
+    for page in pages:
+        assert text[page.start : page.end] == page.text
+
+
+def test__iter_pages_range(pdf_path):
+    processor = PdfProcessor(pdf_path, chunker=None)
+    pages = list(processor.iter_pages(start_page=1, end_page=3))
+    assert [page.page_number for page in pages] == [1, 2]
+    assert pages[0].start == 0
+    assert processor.extract_text(1, 3) == "".join(page.text for page in pages)
+
+
+def test__extract_text_from_bytes(pdf_path):
+    with open(pdf_path, "rb") as f:
+        data = f.read()
+    assert PdfProcessor(data, chunker=None).extract_text() == PdfProcessor(pdf_path, chunker=None).extract_text()
+
+
+@pytest.mark.parametrize("kind", SOURCE_KINDS)
+def test__extract_text_from_memory(pdf_path, kind: str):
+    expected = PdfProcessor(pdf_path, chunker=None)
+    with ExitStack() as stack:
+        processor = PdfProcessor(source_of_kind(kind, pdf_path, stack), chunker=None)
+        assert processor.extract_text() == expected.extract_text()
+        assert [page.text for page in processor.iter_pages()] == [page.text for page in expected.iter_pages()]
+        assert processor.content_hash() == expected.content_hash()
+        # the processor holds a view of the buffer, which has to be released before a memory map can be closed
+        del processor
+
+
+@pytest.mark.parametrize("as_bytes", [False, True])
+def test__parallel_extraction_matches_serial(tmp_path, as_bytes):
+    doc = pymupdf.open()
+    for i in range(60):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Chapter {i}", fontsize=20)
+        page.insert_text((72, 120), f"Body text of page {i}.", fontsize=11)
+    path = tmp_path / "large.pdf"
+    doc.save(path)
+    source = path.read_bytes() if as_bytes else str(path)
+
+    processor = PdfProcessor(source, chunker=None)
+    assert processor.extract_text(parallel=True, max_workers=2, pages_per_shard=8) == processor.extract_text()
+    assert processor.extract_text_llm(parallel=True, max_workers=2, pages_per_shard=8) == processor.extract_text_llm()
+
+
+def test__units_join_into_text(pdf_path):
+    processor = PdfProcessor(pdf_path, chunker=None)
+    assert "".join(processor.iter_units()) == processor.extract_text()
@@ -0,0 +1,73 @@
+import os
+from typing import List
+
+import pymupdf  # type: ignore
+from llama_index.core.schema import TextNode
+
+from document_processing.base import BaseChunker
+from document_processing.process_folder import BatchProcessing
+
+
+class ParagraphChunker(BaseChunker):
+    def chunk(self, text, num_words_overlap: int) -> List[TextNode]:
+        return self.add_context([TextNode(text=t) for t in text.split("\n") if t], num_words_overlap)
+
+    def achunk(self, text: str, num_words_overlap: int):
+        raise NotImplementedError
+
+
+class CrashingChunker(ParagraphChunker):
+    def chunk(self, text, num_words_overlap: int) -> List[TextNode]:
+        if "crash" in text:
+            os._exit(1)
+        return super().chunk(text, num_words_overlap)
+
+
+def write_pdf(path, n_pages: int, text: str = "Some text"):
+    doc = pymupdf.open()
+    for i in range(n_pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"{text} on page {i}")
+    doc.save(path)
+
+
+def test__batch_processing_isolates_errors(tmp_path):
+    write_pdf(tmp_path / "a.pdf", 2)
+    write_pdf(tmp_path / "b.pdf", 3)
+    (tmp_path / "broken.pdf").write_bytes(b"not a pdf")
+
+    batch = BatchProcessing(str(tmp_path), "*.pdf", ParagraphChunker(), max_workers=2, max_in_flight=2)
+    results = {result.path.name: result for result in batch.run()}
+
+    assert results["a.pdf"].ok and len(results["a.pdf"].chunks) == 2
+    assert results["b.pdf"].ok and results["b.pdf"].n_pages == 3
+    assert not results["broken.pdf"].ok
+    assert batch.stats.n_files == 3
+    assert batch.stats.n_failed == 1
+    assert batch.stats.n_pages == 5
+    assert batch.stats.n_chunks == 5
+
+
+def test__batch_processing_survives_worker_crash(tmp_path):
+    write_pdf(tmp_path / "a.pdf", 1)
+    write_pdf(tmp_path / "b.pdf", 1, text="crash")
+    write_pdf(tmp_path / "c.pdf", 1)
+
+    batch = BatchProcessing(str(tmp_path), "*.pdf", CrashingChunker(), max_workers=1, max_in_flight=1)
+    results = {result.path.name: result for result in batch.run()}
+
+    assert results["a.pdf"].ok
+    assert not results["b.pdf"].ok
+    assert results["c.pdf"].ok
+
+
+def test__batch_processing_only_fails_the_crashing_file(tmp_path):
+    for name in "abcdefgh":
+        write_pdf(tmp_path / f"{name}.pdf", 1, text="crash" if name == "c" else "Some text")
+
+    batch = BatchProcessing(str(tmp_path), "*.pdf", CrashingChunker(), max_workers=4)
+    results = {result.path.name: result for result in batch.run()}
+
+    assert len(results) == 8
+    assert [name for name, result in sorted(results.items()) if not result.ok] == ["c.pdf"]
+    assert batch.stats.n_failed == 1
@@ -0,0 +1,161 @@
+import asyncio
+import re
+import warnings
+from typing import List
+
+import pytest
+from llama_index.core.schema import TextNode
+
+from document_processing import sections as sections_module
+from document_processing.cache import DiskCache
+from document_processing.embeddings import TokenCounter
+from document_processing.sections import (
+    RegexSectionChunker,
+    layout_fingerprint,
+    line_shape,
+)
+from tests.conftest import WORD_ENCODING
+
+
+def document(titles: List[str], paragraphs: int = 2) -> str:
+    body = "\n".join(f"This is paragraph {i} of the section, which is long enough to not look like a title." for i in range(paragraphs))
+    return "\n".join(f"{title}\n{body}" for title in titles)
+
+
+CHAPTERS = document(["Chapter 1: Introduction", "Chapter 2: Method", "Chapter 3: Results"])
+OTHER_CHAPTERS = document(["Chapter 1: Background", "Chapter 2: Data", "Chapter 3: Analysis", "Chapter 4: Discussion"], paragraphs=3)
+NUMBERED = document(["1.1 Scope", "1.2 Terms", "2.1 Rules"])
+
+
+class StandInGenerator:
+    """Stands in for the LLM, returning the given regexes in turn and counting the calls."""
+
+    def __init__(self, *patterns: str):
+        self.patterns = list(patterns)
+        self.calls = 0
+
+    def __call__(self, sample: str) -> str:
+        self.calls += 1
+        return self.patterns[min(self.calls, len(self.patterns)) - 1]
+
+
+def paragraphs(text: str) -> List[TextNode]:
+    return [TextNode(text=t) for t in re.split(r"(?<=\n)", text) if t]
+
+
+def section_chunker(generator, **kwargs) -> RegexSectionChunker:
+    return RegexSectionChunker(1, 1000, generator, paragraphs, token_counter=TokenCounter("test_words", encoding=WORD_ENCODING), **kwargs)
+
+
+@pytest.mark.parametrize(
+    "line,expected",
+    [
+        ("Chapter 12: Results of the study", "Aa 9: Aa"),
+        ("CHAPTER IV", "A R"),
+        ("1.2 Scope", "9.9 Aa"),
+        ("# Heading", "# Aa"),
+    ],
+)
+def test__line_shape(line: str, expected: str):
+    assert line_shape(line) == expected
+
+
+def test__layout_fingerprint_is_shared_by_template():
+    assert layout_fingerprint(CHAPTERS) == layout_fingerprint(OTHER_CHAPTERS)
+    assert layout_fingerprint(CHAPTERS) != layout_fingerprint(NUMBERED)
+
+
+def test__regex_is_generated_once_per_layout():
+    generator = StandInGenerator(r"^Chapter \d+")
+    chunker = section_chunker(generator)
+    sections = chunker.split(CHAPTERS)
+    assert [section.text.splitlines()[0] for section in sections] == ["Chapter 1: Introduction", "Chapter 2: Method", "Chapter 3: Results"]
+    assert "".join(section.text for section in sections) == CHAPTERS
+    assert len(chunker.split(OTHER_CHAPTERS)) == 4
+    assert generator.calls == 1
+
+
+def test__regex_cache_persists_across_chunkers(tmp_path):
+    cache = DiskCache(tmp_path)
+    section_chunker(StandInGenerator(r"^Chapter \d+"), regex_cache=cache).split(CHAPTERS)
+
+    generator = StandInGenerator(r"^Never")
+    assert len(section_chunker(generator, regex_cache=cache).split(OTHER_CHAPTERS)) == 4
+    assert generator.calls == 0
+
+
+@pytest.mark.parametrize(
+    "patterns,expected_calls",
+    [
+        # invalid, then matching nothing, then a regex which works
+        ((r"^Kapitel (", r"^Appendix", r"^Kapitel \d+"), 3),
+        ((r"^Kapitel \d+",), 1),
+    ],
+)
+def test__generator_is_called_again_when_validation_fails(patterns, expected_calls: int):
+    chunker = section_chunker(StandInGenerator(r"^Chapter \d+"), max_attempts=3)
+    chunker.split(CHAPTERS)
+    # same layout as CHAPTERS, but the cached regex does not match its titles
+    german = CHAPTERS.replace("Chapter", "Kapitel")
+    assert layout_fingerprint(german) == layout_fingerprint(CHAPTERS)
+    chunker.generate_regex = generator = StandInGenerator(*patterns)
+    assert len(chunker.split(german)) == 3
+    assert generator.calls == expected_calls
+    # the regex which worked replaces the cached one
+    assert len(chunker.split(german)) == 3
+    assert generator.calls == expected_calls
+
+
+def test__falls_back_to_splitting_function():
+    generator = StandInGenerator(r"^Appendix")
+    chunker = section_chunker(generator, max_attempts=2)
+    assert [node.text for node in chunker.split(CHAPTERS)] == [node.text for node in paragraphs(CHAPTERS)]
+    assert generator.calls == 2
+
+
+def test__async_generator():
+    async def generate(sample: str) -> str:
+        return r"^\d\.\d"
+
+    sections = asyncio.run(section_chunker(generate).asplit(NUMBERED))
+    assert [section.text.splitlines()[0] for section in sections] == ["1.1 Scope", "1.2 Terms", "2.1 Rules"]
+
+    # the sync path cannot await the generator
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        with pytest.raises(TypeError):
+            section_chunker(generate).split(NUMBERED)
+
+
+def test__regex_which_backtracks_catastrophically_is_rejected(caplog):
+    generator = StandInGenerator(r"^(\w|\w\w)+$", r"^\d\.\d")
+    chunker = section_chunker(generator, regex_timeout=0.1)
+    sections = chunker.split(NUMBERED + "\n" + "a" * 60 + "!\n")
+    assert [section.text.splitlines()[0] for section in sections] == ["1.1 Scope", "1.2 Terms", "2.1 Rules"]
+    assert generator.calls == 2
+    assert "^\\d\\.\\d" in [pattern.pattern for pattern in chunker._patterns.values()]
+    assert "took longer than 0.1s" in caplog.text
+
+
+@pytest.mark.parametrize("is_async", [False, True])
+def test__regex_is_only_run_under_the_timeout(monkeypatch, is_async: bool):
+    timeouts = []
+    section_starts = sections_module.section_starts
+
+    def recording_section_starts(text, pattern, timeout=None):
+        timeouts.append(timeout)
+        return section_starts(text, pattern, timeout)
+
+    monkeypatch.setattr(sections_module, "section_starts", recording_section_starts)
+    chunker = section_chunker(StandInGenerator(r"^Chapter \d+"), regex_timeout=0.5)
+    for _ in range(2):
+        # generated, then cached
+        sections = asyncio.run(chunker.asplit(CHAPTERS)) if is_async else chunker.split(CHAPTERS)
+        assert "".join(section.text for section in sections) == CHAPTERS
+    assert timeouts == [0.5, 0.5]
+
+
+def test__chunk_keeps_sections_together():
+    chunker = section_chunker(StandInGenerator(r"^Chapter \d+"), use_spans=True)
+    nodes = chunker.chunk(CHAPTERS, 0)
+    assert [node.text.splitlines()[0] for node in nodes] == ["Chapter 1: Introduction", "Chapter 2: Method", "Chapter 3: Results"]
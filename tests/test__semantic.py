@@ -0,0 +1,88 @@
+import asyncio
+
+import numpy as np
+import pytest
+from llama_index.core.node_parser import SemanticSplitterNodeParser
+from llama_index.core.schema import Document
+
+from document_processing.chunking import SemanticChunker
+from document_processing.embeddings import TokenCounter
+from document_processing.local_embeddings import HashingEmbedding
+from document_processing.semantic import (
+    adjacent_cosine_distances,
+    build_sentence_groups,
+    split_sentences,
+)
+from tests.conftest import WORD_ENCODING
+
+TOPICS = [
+    "Apples and pears are fruit. Fruit juice is made from apples. Pears grow on trees. ",
+    "The engine drives the car. A car has four wheels. Wheels turn on the road. ",
+    "The patient received a dose. The trial measured the dose response. Each patient was monitored. ",
+]
+TEXT = "".join(TOPICS * 3)
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("One. Two! Three? Four", ["One. ", "Two! ", "Three? ", "Four"]),
+        ('He said "stop." Then left.\n\nNew paragraph', ['He said "stop." ', "Then left.\n\n", "New paragraph"]),
+        ("No punctuation at all", ["No punctuation at all"]),
+        ("", []),
+    ],
+)
+def test__split_sentences(text, expected):
+    assert split_sentences(text) == expected
+
+
+def test__build_sentence_groups():
+    assert build_sentence_groups(["a", "b", "c", "d"], 1) == ["ab", "abc", "bcd", "cd"]
+
+
+def test__adjacent_cosine_distances():
+    embeddings = np.array([[1.0, 0.0], [0.0, 1.0], [0.0, 2.0], [0.0, 0.0]])
+    assert np.allclose(adjacent_cosine_distances(embeddings), [1.0, 0.0, 1.0])
+
+
+def test__semantic_chunker_matches_llama_index_splitter():
+    embed_model = HashingEmbedding(embed_dim=64)
+    parser = SemanticSplitterNodeParser(buffer_size=1, breakpoint_percentile_threshold=80, embed_model=embed_model, sentence_splitter=split_sentences)
+    expected = [node.text for node in parser.get_nodes_from_documents([Document(text=TEXT)])]
+
+    chunker = SemanticChunker(embed_model, buffer_size=1, breakpoint_percentile_threshold=80)
+    assert [node.text for node in chunker.chunk(TEXT, 0)] == expected
+    assert [node.text for node in asyncio.run(chunker.achunk(TEXT, 0))] == expected
+
+
+def test__semantic_chunker_accepts_embedding_function():
+    embed_model = HashingEmbedding(embed_dim=64)
+    chunker = SemanticChunker(embed_model, buffer_size=1, breakpoint_percentile_threshold=80)
+    function_chunker = SemanticChunker(
+        lambda texts: [embed_model.get_text_embedding(text) for text in texts], buffer_size=1, breakpoint_percentile_threshold=80
+    )
+    assert [node.text for node in function_chunker.chunk(TEXT, 0)] == [node.text for node in chunker.chunk(TEXT, 0)]
+
+
+def test__semantic_chunker_max_length_tokens():
+    chunker = SemanticChunker(
+        HashingEmbedding(embed_dim=64),
+        buffer_size=1,
+        breakpoint_percentile_threshold=95,
+        max_length_tokens=20,
+        token_counter=TokenCounter("test_words", encoding=WORD_ENCODING),
+    )
+    nodes = chunker.chunk(TEXT + "x" * 500, 0)
+    assert all(chunker.token_counter.count(node.text) <= 20 for node in nodes)
+    assert "".join(node.text for node in nodes) == TEXT + "x" * 500
+
+
+@pytest.mark.parametrize("window_chars", [50, 100_000])
+def test__semantic_chunker_stream(window_chars: int):
+    chunker = SemanticChunker(HashingEmbedding(embed_dim=64), buffer_size=1, breakpoint_percentile_threshold=80)
+    segments = [TEXT[i : i + 40] for i in range(0, len(TEXT), 40)]
+    nodes = list(chunker.chunk_stream(iter(segments), 0, window_chars=window_chars))
+    assert "".join(node.text for node in nodes) == TEXT
+    assert all(TEXT[node.start_char_idx : node.end_char_idx] == node.text for node in nodes)
+    if window_chars > len(TEXT):
+        assert [node.text for node in nodes] == [node.text for node in chunker.chunk(TEXT, 0)]
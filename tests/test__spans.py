@@ -0,0 +1,70 @@
+import re
+
+import pytest
+from llama_index.core.schema import TextNode
+
+from document_processing.chunking import FunctionChunker
+from document_processing.embeddings import TokenCounter
+from document_processing.spans import ChunkSpans, TokenOffsets
+from tests.conftest import TEXT, WORD_ENCODING
+
+
+def splitter(text: str):
+    return [TextNode(text=t) for t in re.split(r"\.|\?|!", text) if t]
+
+
+@pytest.mark.parametrize("num_words_overlap", [0, 1, 2, 5, 50])
+def test__spans_context_matches_add_context(num_words_overlap: int):
+    nodes = [TextNode(text=t) for t in re.split(r"(?<=[.?])", TEXT) if t]
+    spans = ChunkSpans.from_nodes(TEXT, nodes)
+    chunker = FunctionChunker(1, 100, splitter)
+
+    expected = [node.text for node in chunker.add_context(nodes, num_words_overlap)]
+    assert [node.text for node in spans.to_nodes(num_words_overlap)] == expected
+
+
+def test__spans_from_nodes_skips_dropped_text():
+    spans = ChunkSpans.from_nodes(TEXT, splitter(TEXT))
+    assert list(spans.texts()) == [node.text for node in splitter(TEXT)]
+    assert [(node.start_char_idx, node.end_char_idx) for node in spans.to_nodes()] == list(spans)
+
+
+def test__spans_from_nodes_rejects_text_not_in_document():
+    with pytest.raises(ValueError):
+        ChunkSpans.from_nodes(TEXT, [TextNode(text="Goodbye"), TextNode(text="apples")])
+
+
+def test__function_chunker_spans_point_into_text():
+    chunker = FunctionChunker(5, 10, splitter, token_counter=TokenCounter("test_words", encoding=WORD_ENCODING), use_spans=True)
+    nodes = chunker.chunk(TEXT, 2)
+    assert [node.metadata["chunk_number"] for node in nodes] == list(range(len(nodes)))
+    for node in chunker.chunk(TEXT, 0):
+        assert node.text == TEXT[node.start_char_idx : node.end_char_idx]
+
+
+@pytest.mark.parametrize(
+    "start,end,n_tokens,expected_start,expected_end",
+    [
+        (0, 10, 2, "y a", "Ho"),
+        (0, 26, 3, " a bunch", "How"),
+        # tokens running over the edges of the range are cut off at the edge
+        (10, 26, 1, " bunch", "pples"),
+        (12, 26, 2, "a bunch", "les "),
+        (0, 26, 100, "How many apples in a bunch", "How many apples in a bunch"),
+    ],
+)
+def test__token_offsets(start: int, end: int, n_tokens: int, expected_start: str, expected_end: str):
+    token_offsets = TokenOffsets(TEXT, WORD_ENCODING)
+    assert TEXT[token_offsets.tokens_start(start, end, n_tokens) : end] == expected_start
+    assert TEXT[start : token_offsets.tokens_end(start, end, n_tokens)] == expected_end
+
+
+def test__token_overlap_is_the_same_for_spans_and_nodes():
+    token_counter = TokenCounter("test_words", encoding=WORD_ENCODING)
+    chunker = FunctionChunker(1, 100, splitter, token_counter=token_counter, overlap_mode="tokens")
+    nodes = [TextNode(text=t) for t in re.split(r"(?<=[.?])", TEXT) if t]
+
+    token_offsets = chunker.token_offsets(TEXT)
+    expected = [node.text for node in ChunkSpans.from_nodes(TEXT, nodes).to_nodes(2, token_offsets)]
+    assert [node.text for node in chunker.add_context(nodes, 2)] == expected
+    assert expected[1] == " bunch?\n\n This is a test.\n\n Goodbye."
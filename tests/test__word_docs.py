@@ -0,0 +1,104 @@
+from contextlib import ExitStack
+
+import docx
+import pytest
+from docx.enum.text import WD_BREAK
+from docx.oxml import parse_xml
+
+from document_processing.word_docs import WordDocXFileProcessor
+from tests.conftest import SOURCE_KINDS, source_of_kind
+
+W_NAMESPACE = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+
+def add_paragraphs(doc):
+    doc.add_paragraph("A plain paragraph.")
+    paragraph = doc.add_paragraph("Tab\tseparated")
+    run = paragraph.add_run(" line")
+    run.add_break()
+    run.add_text("after break")
+    run.add_break(WD_BREAK.PAGE)
+    paragraph.add_run("end")
+    doc.add_paragraph("")._p.addnext(
+        parse_xml(
+            f"<w:p {W_NAMESPACE}><w:r><w:t xml:space='preserve'>see </w:t></w:r>"
+            "<w:hyperlink><w:r><w:t>the link</w:t></w:r></w:hyperlink>"
+            "<w:r><w:noBreakHyphen/><w:cr/><w:ptab/></w:r>"
+            "<w:ins><w:r><w:t>inserted text is skipped</w:t></w:r></w:ins></w:p>"
+        )
+    )
+
+
+def add_tables(doc):
+    table = doc.add_table(rows=4, cols=3)
+    for i, row in enumerate(table.rows):
+        for j, cell in enumerate(row.cells):
+            cell.text = f"r{i}c{j}"
+    table.cell(0, 0).merge(table.cell(0, 1))
+    table.cell(1, 2).merge(table.cell(3, 2))
+    table.cell(2, 0).add_paragraph("second paragraph")
+    table.cell(2, 1).add_table(rows=1, cols=1).cell(0, 0).text = "nested"
+
+    doc.add_paragraph("Between tables")
+    single_column = doc.add_table(rows=2, cols=1)
+    single_column.cell(0, 0).text = "only"
+    single_column.cell(1, 0).text = "column"
+
+    ragged = doc.add_table(rows=2, cols=3)
+    ragged.cell(0, 0).text = "header"
+    row = ragged.rows[1]._tr
+    row.remove(row.tc_lst[0])
+    row.insert(0, parse_xml(f"<w:trPr {W_NAMESPACE}><w:gridBefore w:val='1'/></w:trPr>"))
+
+
+@pytest.fixture
+def docx_path(tmp_path):
+    doc = docx.Document()
+    add_paragraphs(doc)
+    add_tables(doc)
+    doc.add_paragraph("Last paragraph")
+    path = tmp_path / "test.docx"
+    doc.save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("target_column", [None, 1])
+def test__xml_extraction_matches_python_docx(docx_path, target_column):
+    processor = WordDocXFileProcessor(docx_path, chunker=None)
+    assert processor.extract_text(target_column) == processor.extract_text_python_docx(target_column)
+
+
+def test__xml_extraction_content(docx_path):
+    text = WordDocXFileProcessor(docx_path, chunker=None).extract_text()
+    assert "\nTab\tseparated line\nafter breakend\n" in text
+    assert "see the link-\n\t" in text
+    assert "inserted text" not in text
+    # horizontally merged cells repeat for every column they span, vertically merged cells for every row
+    assert "| r0c0\nr0c1 | r0c0\nr0c1 | r0c2 |\n| --- | --- | --- |\n" in text
+    assert "| r2c0\nsecond paragraph | r2c1\n | r1c2\nr2c2\nr3c2 |\n| r3c0 | r3c1 | r1c2\nr2c2\nr3c2 |" in text
+    assert "| header |  |  |\n| --- | --- | --- |\n|  |  |\n" in text
+    assert "nested" not in text
+
+
+def test__iter_blocks(docx_path):
+    blocks = list(WordDocXFileProcessor(docx_path, chunker=None).iter_blocks())
+    assert [block.kind for block in blocks].count("table") == 3
+    assert blocks[0].text == "A plain paragraph."
+    assert blocks[-1].text == "Last paragraph"
+
+
+def test__units_join_into_text(docx_path):
+    processor = WordDocXFileProcessor(docx_path, chunker=None)
+    assert "".join(processor.iter_units()) == processor.extract_text()
+
+
+@pytest.mark.parametrize("kind", SOURCE_KINDS)
+def test__extract_text_from_memory(docx_path, kind: str):
+    expected = WordDocXFileProcessor(docx_path, chunker=None)
+    with ExitStack() as stack:
+        processor = WordDocXFileProcessor(source_of_kind(kind, docx_path, stack), chunker=None)
+        assert processor.extract_text() == expected.extract_text()
+        assert processor.extract_text_python_docx() == expected.extract_text_python_docx()
+        assert processor.content_hash() == expected.content_hash()
+        # the processor holds a view of the buffer, which has to be released before a memory map can be closed
+        del processor